@@ -22,11 +22,24 @@ class Config(BaseConfig):
 
     ACCESS_TOKEN_EXPIRE: int = Field(env='ACCESS_TOKEN_EXPIRE', default=3600)
     RESET_TOKEN_EXPIRE: int = Field(env='ACCESS_TOKEN_EXPIRE', default=60*60*24*3)  # 3 days
+    ACCESS_TOKEN_CACHE_MAX_ENTRIES: int = Field(env='ACCESS_TOKEN_CACHE_MAX_ENTRIES', default=10000)  # verified tokens kept per process, 0 disables
+    REFRESH_TOKEN_EXPIRE: int = Field(env='REFRESH_TOKEN_EXPIRE', default=60*60*24*14)  # seconds a session may sit unused, 14 days
+    REFRESH_SESSION_MAX_AGE: int = Field(env='REFRESH_SESSION_MAX_AGE', default=60*60*24*90)  # seconds from login until a password is required again, 90 days
+    REVOKED_TOKEN_FILTER_CAPACITY: int = Field(env='REVOKED_TOKEN_FILTER_CAPACITY', default=100000)  # revocations the in-memory Bloom filter is sized for
+    REVOKED_TOKEN_FILTER_ERROR_RATE: float = Field(env='REVOKED_TOKEN_FILTER_ERROR_RATE', default=0.001)  # share of valid tokens confirmed against the database
+    REVOKED_TOKEN_REFRESH_SECONDS: float = Field(env='REVOKED_TOKEN_REFRESH_SECONDS', default=5)  # how soon a revocation made by another process applies
 
     MIME_TYPE: str = 'application/json'
 
     SECRET_KEY: str = Field(env='SECRET_KEY', default=None)
     SECURITY_PASSWORD_SALT: str = Field(env='SECURITY_PASSWORD_SALT', default=None)
+    METRICS_TOKEN: str = Field(env='METRICS_TOKEN', default='')  # sent as X-Metrics-Token to read /metrics/, empty disables it
+
+    # Password hashes run in a pool of worker processes; see common.helpers.password_hasher
+    PASSWORD_HASH_METHOD: str = Field(env='PASSWORD_HASH_METHOD', default='scrypt:32768:8:1')  # werkzeug method; existing hashes are upgraded at login
+    PASSWORD_HASH_WORKERS: int = Field(env='PASSWORD_HASH_WORKERS', default=2)  # processes per worker, 0 hashes on the request thread
+    PASSWORD_HASH_MAX_PENDING: int = Field(env='PASSWORD_HASH_MAX_PENDING', default=16)  # queued hashes before answering 503
+    PASSWORD_HASH_TIMEOUT: float = Field(env='PASSWORD_HASH_TIMEOUT', default=10.0)  # seconds
 
     VUE_APP_URI: str = Field(env='VUE_APP_URI', default=None)
 
@@ -36,11 +49,45 @@ class Config(BaseConfig):
     POSTGRES_PASSWORD: str = Field(env='POSTGRES_PASSWORD')
     POSTGRES_DB: str = Field(env='POSTGRES_DB')
 
+    # Connection pool shared by every repository in the process
+    POSTGRES_POOL_MIN_CONNECTIONS: int = Field(env='POSTGRES_POOL_MIN_CONNECTIONS', default=1)
+    POSTGRES_POOL_MAX_CONNECTIONS: int = Field(env='POSTGRES_POOL_MAX_CONNECTIONS', default=10)
+    POSTGRES_POOL_CHECKOUT_TIMEOUT: float = Field(env='POSTGRES_POOL_CHECKOUT_TIMEOUT', default=10.0)
+    POSTGRES_POOL_HEALTH_CHECK_INTERVAL: float = Field(env='POSTGRES_POOL_HEALTH_CHECK_INTERVAL', default=30.0)  # seconds idle before a ping
+
+    CACHE_BACKEND: str = Field(env='CACHE_BACKEND', default='memory')  # see common.helpers.cache.CACHE_BACKENDS
+    TODO_LIST_CACHE_TTL: float = Field(env='TODO_LIST_CACHE_TTL', default=30.0)  # seconds, 0 disables the cache
+    TODO_LIST_CACHE_MAX_ENTRIES: int = Field(env='TODO_LIST_CACHE_MAX_ENTRIES', default=10000)
+    # Per-process, so a role change reaches other workers only after the TTL
+    ORGANIZATION_MEMBERSHIP_CACHE_TTL: float = Field(env='ORGANIZATION_MEMBERSHIP_CACHE_TTL', default=30.0)  # seconds, 0 disables the cache
+    ORGANIZATION_MEMBERSHIP_CACHE_MAX_ENTRIES: int = Field(env='ORGANIZATION_MEMBERSHIP_CACHE_MAX_ENTRIES', default=10000)
+    # Bounds how long another worker trusts memberships embedded in access tokens after a role change
+    MEMBERSHIP_VERSION_CACHE_TTL: float = Field(env='MEMBERSHIP_VERSION_CACHE_TTL', default=5.0)  # seconds, 0 checks every request
+    MEMBERSHIP_VERSION_CACHE_MAX_ENTRIES: int = Field(env='MEMBERSHIP_VERSION_CACHE_MAX_ENTRIES', default=10000)
+
+    # Seconds of changes GET /todo/changes re-sends before each watermark. Must exceed the time between
+    # stamping changed_on and committing, plus the 1s truncation of changed_on on model saves.
+    TODO_SYNC_OVERLAP_SECONDS: float = Field(env='TODO_SYNC_OVERLAP_SECONDS', default=2.0)
+
+    TODO_EXPORT_BATCH_SIZE: int = Field(env='TODO_EXPORT_BATCH_SIZE', default=1000)  # rows fetched per server-side cursor round trip
+
+    # Server-sent todo change events (GET /todo/events), served from one LISTEN connection per worker
+    TODO_EVENTS_HEARTBEAT_SECONDS: float = Field(env='TODO_EVENTS_HEARTBEAT_SECONDS', default=15.0)
+    TODO_EVENTS_CLIENT_BUFFER: int = Field(env='TODO_EVENTS_CLIENT_BUFFER', default=100)  # events queued per client before it must resync
+    TODO_EVENTS_MAX_CLIENTS: int = Field(env='TODO_EVENTS_MAX_CLIENTS', default=16)  # per worker; each open stream holds a WAITRESS_THREADS thread
+
     RABBITMQ_HOST: str = Field(env='RABBITMQ_HOST')
     RABBITMQ_PORT: int = Field(env='RABBITMQ_PORT')
     RABBITMQ_VIRTUAL_HOST: str = Field(env='RABBITMQ_VIRTUAL_HOST', default='/')
     RABBITMQ_USER: str = Field(env='RABBITMQ_USER')
     RABBITMQ_PASSWORD: str = Field(env='RABBITMQ_PASSWORD')
+    RABBITMQ_HEARTBEAT_SECONDS: int = Field(env='RABBITMQ_HEARTBEAT_SECONDS', default=30)
+    RABBITMQ_BLOCKED_CONNECTION_TIMEOUT: float = Field(env='RABBITMQ_BLOCKED_CONNECTION_TIMEOUT', default=30.0)  # seconds a broker under resource alarm may stall a publisher connection
+    RABBITMQ_PUBLISHER_CONNECTIONS: int = Field(env='RABBITMQ_PUBLISHER_CONNECTIONS', default=2)  # per process
+    RABBITMQ_PUBLISH_BUFFER_SIZE: int = Field(env='RABBITMQ_PUBLISH_BUFFER_SIZE', default=10000)  # messages waiting for the broker before publishing fails
+    RABBITMQ_PUBLISH_BATCH_SIZE: int = Field(env='RABBITMQ_PUBLISH_BATCH_SIZE', default=100)
+    RABBITMQ_PUBLISH_MAX_ATTEMPTS: int = Field(env='RABBITMQ_PUBLISH_MAX_ATTEMPTS', default=5)
+    RABBITMQ_PUBLISH_RETRY_MAX_SECONDS: float = Field(env='RABBITMQ_PUBLISH_RETRY_MAX_SECONDS', default=30.0)
 
     AUTH_JWT_SECRET: str = Field(env='AUTH_JWT_SECRET')
 
@@ -48,10 +95,33 @@ class Config(BaseConfig):
 
     QUEUE_NAME_PREFIX: str = Field(env='QUEUE_NAME_PREFIX', default='')
     EMAIL_SERVICE_PROCESSOR_QUEUE_NAME: str = Field(env='EmailServiceProcessor_QUEUE_NAME', default='email-transmitter')
+
+    # Email outbox relay (flask/email_outbox_relay.py)
+    EMAIL_OUTBOX_BATCH_SIZE: int = Field(env='EMAIL_OUTBOX_BATCH_SIZE', default=50)  # emails claimed per round
+    EMAIL_OUTBOX_POLL_SECONDS: float = Field(env='EMAIL_OUTBOX_POLL_SECONDS', default=10.0)  # idle wait when no NOTIFY arrives
+    EMAIL_OUTBOX_LEASE_SECONDS: float = Field(env='EMAIL_OUTBOX_LEASE_SECONDS', default=300.0)  # before a claimed email may be claimed again
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = Field(env='EMAIL_OUTBOX_MAX_ATTEMPTS', default=10)
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: float = Field(env='EMAIL_OUTBOX_RETRY_BASE_SECONDS', default=15.0)  # doubled per attempt
+    EMAIL_OUTBOX_RETRY_MAX_SECONDS: float = Field(env='EMAIL_OUTBOX_RETRY_MAX_SECONDS', default=3600.0)
+
+    # Email transmitter consumer (flask/email_transmitter.py)
+    EMAIL_TRANSMITTER_CONFIG_PATH: str = Field(env='EMAIL_TRANSMITTER_CONFIG_PATH', default='')  # services/email_transmitter/config.json when empty
+    EMAIL_TRANSMITTER_PREFETCH: int = Field(env='EMAIL_TRANSMITTER_PREFETCH', default=200)  # unacknowledged messages, at least WORKERS * BATCH_SIZE
+    EMAIL_TRANSMITTER_WORKERS: int = Field(env='EMAIL_TRANSMITTER_WORKERS', default=4)  # batches sent at once
+    EMAIL_TRANSMITTER_BATCH_SIZE: int = Field(env='EMAIL_TRANSMITTER_BATCH_SIZE', default=50)  # messages per Mailjet call
+    EMAIL_TRANSMITTER_BATCH_WAIT_SECONDS: float = Field(env='EMAIL_TRANSMITTER_BATCH_WAIT_SECONDS', default=0.2)  # for a batch to fill
+    EMAIL_TRANSMITTER_MAX_ATTEMPTS: int = Field(env='EMAIL_TRANSMITTER_MAX_ATTEMPTS', default=5)
+    EMAIL_TRANSMITTER_RETRY_BASE_SECONDS: float = Field(env='EMAIL_TRANSMITTER_RETRY_BASE_SECONDS', default=5.0)  # doubled per attempt
+    EMAIL_TRANSMITTER_SHUTDOWN_TIMEOUT: float = Field(env='EMAIL_TRANSMITTER_SHUTDOWN_TIMEOUT', default=30.0)  # seconds
     
     # Mailjet configuration
     MAILJET_API_KEY: str = Field(env='MAILJET_API_KEY', default=None)
     MAILJET_API_SECRET: str = Field(env='MAILJET_API_SECRET', default=None)
+    MAILJET_API_URL: str = Field(env='MAILJET_API_URL', default='https://api.mailjet.com/v3.1')
+    MAILJET_CONNECT_TIMEOUT: float = Field(env='MAILJET_CONNECT_TIMEOUT', default=3.0)  # seconds
+    MAILJET_READ_TIMEOUT: float = Field(env='MAILJET_READ_TIMEOUT', default=10.0)  # seconds
+    MAILJET_POOL_SIZE: int = Field(env='MAILJET_POOL_SIZE', default=10)  # kept-alive connections per process
+    MAILJET_BATCH_SIZE: int = Field(env='MAILJET_BATCH_SIZE', default=50)  # messages per send call, at most 50
 
     @property
     def DEFAULT_USER_PASSWORD(self):
@@ -1,10 +1,23 @@
+import copy
+import hashlib
 import time
+from typing import Dict, Optional
+
 import jwt
+from rococo.models.versioned_model import get_uuid_hex
+
 from common.models import LoginMethod
 from common.app_config import config
+from common.helpers.cache import get_cache
 
+ACCESS_TOKEN_CACHE = 'access_token'
+# Larger membership lists are left out of the token; organization_required then checks the database.
+MAX_TOKEN_ORGANIZATIONS = 50
 
-def generate_access_token(login_method: LoginMethod, person=None, email=None):
+
+def generate_access_token(login_method: LoginMethod, person=None, email=None,
+                          memberships: Optional[Dict[str, str]] = None, membership_version: Optional[int] = None,
+                          jti: Optional[str] = None, expiry: Optional[float] = None):
     """
     Generate JWT token with embedded user data to avoid database calls during authentication.
 
@@ -12,8 +25,13 @@ def generate_access_token(login_method: LoginMethod, person=None, email=None):
         login_method: LoginMethod instance
         person: Person instance (optional, will be fetched if not provided)
         email: Email instance (optional, will be fetched if not provided)
+        memberships: {organization_id: role} of the person (optional)
+        membership_version: the person's membership version the memberships were read at
+        jti: unique id of the token, to revoke it by (optional, generated if not provided)
+        expiry: Unix time the token expires at (optional, ACCESS_TOKEN_EXPIRE seconds from now if not provided)
     """
-    expiry = time.time() + int(config.ACCESS_TOKEN_EXPIRE)
+    if expiry is None:
+        expiry = time.time() + int(config.ACCESS_TOKEN_EXPIRE)
 
     # If person or email not provided, we'll need to fetch them
     # This should ideally be passed from the calling code to avoid extra DB calls
@@ -21,6 +39,7 @@ def generate_access_token(login_method: LoginMethod, person=None, email=None):
         'email_id': login_method.email_id,
         'person_id': login_method.person_id,
         'exp': expiry,
+        'jti': jti or get_uuid_hex(),
     }
 
     # Add person data if available
@@ -39,28 +58,87 @@ def generate_access_token(login_method: LoginMethod, person=None, email=None):
             'email_entity_id': email.entity_id,
         })
 
+    # Add organization memberships, trusted by organization_required while the version is current
+    if memberships is not None and membership_version is not None and len(memberships) <= MAX_TOKEN_ORGANIZATIONS:
+        payload.update({
+            'organizations': memberships,
+            'membership_version': membership_version,
+        })
+
     token = jwt.encode(payload, config.AUTH_JWT_SECRET, algorithm='HS256')
     return token, expiry
 
 
-def parse_access_token(access_token: str):
+class VerifiedToken:
     """
-    Parse and validate JWT token, returning decoded payload if valid.
+    Claims of an access token whose signature and expiry were checked, with the Person and
+    Email models built from them on first use. Cached per token and shared between requests,
+    so the claims must not be modified; `person()` and `email()` return private copies.
     """
+    __slots__ = ('claims', '_person', '_email')
+
+    def __init__(self, claims: dict):
+        self.claims = claims
+        self._person = None
+        self._email = None
+
+    def person(self):
+        if self._person is None:
+            self._person = create_person_from_token(self.claims)
+        return copy.copy(self._person)
+
+    def email(self):
+        if self._email is None:
+            self._email = create_email_from_token(self.claims)
+        return copy.copy(self._email)
+
+
+def _access_token_cache():
+    max_entries = config.ACCESS_TOKEN_CACHE_MAX_ENTRIES
+    return get_cache(ACCESS_TOKEN_CACHE, max_entries) if max_entries > 0 else None
+
+
+def verify_access_token(access_token: str) -> Optional[VerifiedToken]:
+    """
+    Verify a JWT access token, returning its VerifiedToken or None when invalid or expired.
+
+    Tokens that pass are cached under a hash of the token until they expire, so repeated
+    requests with the same token skip the HMAC check and JSON decoding.
+    """
+    cache = _access_token_cache()
+    if cache is not None:
+        key = hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+        verified = cache.get(key)
+        if verified is not None and time.time() <= verified.claims['exp']:
+            return verified
+
     try:
         decoded_token = jwt.decode(
             access_token,
             config.AUTH_JWT_SECRET,
             algorithms=['HS256']
         )
-        exp_time = decoded_token['exp']
-        if time.time() <= exp_time:
-            return decoded_token
-    except jwt.ExpiredSignatureError:
+    except jwt.InvalidTokenError:  # includes ExpiredSignatureError
         return None
-    except jwt.InvalidTokenError:
+
+    remaining = decoded_token['exp'] - time.time()
+    if remaining < 0:
         return None
 
+    verified = VerifiedToken(decoded_token)
+    if cache is not None:
+        cache.set(key, verified, ttl=remaining)
+    return verified
+
+
+def parse_access_token(access_token: str):
+    """
+    Parse and validate JWT token, returning decoded payload if valid.
+    The payload may be shared with other requests and must not be modified.
+    """
+    verified = verify_access_token(access_token)
+    return verified.claims if verified else None
+
 
 def create_person_from_token(token_data):
     """
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from common.app_config import config
+
+
+class CacheBackend:
+    """
+    Interface of a key-value cache store.
+
+    Keys are strings and values must be treated as immutable by callers. `ttl` is in seconds;
+    None falls back to the backend's default TTL, and a default of None means no expiry.
+    Implementations must be safe to share between threads.
+    """
+
+    def __init__(self, name: str, max_entries: int, default_ttl: Optional[float] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None when missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """
+    Process-local cache bounded to `max_entries`, evicting the least recently used entry first.
+    Expired entries are dropped when they are read or reach the LRU end.
+    """
+
+    def __init__(self, name: str, max_entries: int, default_ttl: Optional[float] = None):
+        super().__init__(name, max_entries, default_ttl)
+        self._entries = OrderedDict()  # key -> (expires_at or None, value), least recently used first
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                _, (oldest_expires_at, _) = self._entries.popitem(last=False)
+                if oldest_expires_at is not None and oldest_expires_at <= time.monotonic():
+                    self._expirations += 1
+                else:
+                    self._evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "default_ttl": self.default_ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+# Backends selectable with the CACHE_BACKEND setting; a shared store registers its class here.
+CACHE_BACKENDS = {
+    "memory": InMemoryCache,
+}
+
+_caches: Dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, max_entries: int, default_ttl: Optional[float] = None) -> CacheBackend:
+    """
+    Return the process-wide cache called `name`, creating it with the configured backend on first use.
+    """
+    cache = _caches.get(name)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        if name not in _caches:
+            backend = CACHE_BACKENDS.get(config.CACHE_BACKEND)
+            if backend is None:
+                raise ValueError(f"Unknown CACHE_BACKEND {config.CACHE_BACKEND!r}; "
+                                 f"expected one of: {', '.join(CACHE_BACKENDS)}")
+            _caches[name] = backend(name, max_entries, default_ttl)
+        return _caches[name]
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics of every cache created in this process, by name."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
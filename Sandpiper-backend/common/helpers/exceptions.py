@@ -7,3 +7,7 @@ class InputValidationError(Exception):
 
 class APIException(Exception):
     pass
+
+
+class ServiceUnavailableError(Exception):
+    pass
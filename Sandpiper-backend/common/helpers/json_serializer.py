@@ -0,0 +1,87 @@
+import json
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+from typing import Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used instead
+    orjson = None
+
+from common.models.todo_row import TodoRow
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize obj to compact JSON bytes, with datetimes as ISO 8601 strings.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+
+def _encode_str(value) -> str:
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+
+def _encode_non_null_str(value) -> str:
+    return encode_basestring_ascii(value or '')
+
+
+def _encode_bool(value) -> str:
+    return 'null' if value is None else ('true' if value else 'false')
+
+
+def _encode_datetime(value) -> str:
+    return 'null' if value is None else f'"{value.isoformat()}"'
+
+
+# JSON object layout of a todo row, compiled once. Field order follows TodoRow (the `todo` column
+# order) and the encoders reproduce Todo.as_dict, e.g. a missing title or description becomes "".
+_TODO_ROW_ENCODERS = {
+    'entity_id': _encode_str,
+    'version': _encode_str,
+    'previous_version': _encode_str,
+    'active': _encode_bool,
+    'changed_by_id': _encode_str,
+    'changed_on': _encode_datetime,
+    'person_id': _encode_str,
+    'title': _encode_non_null_str,
+    'description': _encode_non_null_str,
+    'is_completed': _encode_bool,
+    'due_date': _encode_datetime,
+}
+_TODO_ROW_TEMPLATE = '{' + ','.join(f'"{name}":%s' for name in TodoRow._fields) + '}'
+_TODO_ROW_ENCODER_LIST = tuple(_TODO_ROW_ENCODERS[name] for name in TodoRow._fields)
+_TITLE, _DESCRIPTION = TodoRow._fields.index('title'), TodoRow._fields.index('description')
+
+
+def _todo_row_to_orjson_dict(row: tuple) -> dict:
+    todo = dict(zip(TodoRow._fields, row))
+    if row[_TITLE] is None:
+        todo['title'] = ''
+    if row[_DESCRIPTION] is None:
+        todo['description'] = ''
+    return todo
+
+
+def dumps_todo_rows(rows: Iterable[tuple]) -> bytes:
+    """
+    Serialize todo rows (TodoRow or plain cursor tuples in `todo` column order) to a JSON array.
+
+    The output has the same fields and values as serializing `Todo.as_dict()` for each row,
+    without building a model or an intermediate dict per row.
+    """
+    if orjson is not None:
+        return orjson.dumps([_todo_row_to_orjson_dict(row) for row in rows])
+
+    template, encoders = _TODO_ROW_TEMPLATE, _TODO_ROW_ENCODER_LIST
+    return ('[' + ','.join(
+        template % tuple([encode(value) for encode, value in zip(encoders, row)]) for row in rows
+    ) + ']').encode()
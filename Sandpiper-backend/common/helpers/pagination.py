@@ -0,0 +1,62 @@
+import json
+from datetime import datetime
+
+from common.helpers.exceptions import InputValidationError
+from common.helpers.string_utils import urlsafe_base64_encode, urlsafe_base64_decode
+
+
+def encode_cursor(changed_on: datetime, entity_id: str) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque, URL-safe cursor.
+    """
+    payload = json.dumps([changed_on.isoformat(), entity_id], separators=(',', ':'))
+    return urlsafe_base64_encode(payload.encode('utf-8'))
+
+
+def decode_cursor(cursor: str):
+    """
+    Decode a cursor produced by `encode_cursor` back into its (changed_on, entity_id) sort key.
+    """
+    try:
+        changed_on, entity_id = json.loads(urlsafe_base64_decode(cursor))
+        return datetime.fromisoformat(changed_on), str(entity_id)
+    except (ValueError, TypeError):
+        raise InputValidationError("Invalid pagination cursor.")
+
+
+def encode_watermark(since: datetime) -> str:
+    """
+    Encode a delta-sync watermark: changes made at or after `since` have not been synced yet.
+    """
+    return urlsafe_base64_encode(json.dumps([since.isoformat()]).encode('utf-8'))
+
+
+def decode_watermark(watermark: str) -> datetime:
+    """
+    Decode a watermark produced by `encode_watermark`.
+    """
+    try:
+        since, = json.loads(urlsafe_base64_decode(watermark))
+        return datetime.fromisoformat(since)
+    except (ValueError, TypeError):
+        raise InputValidationError("Invalid sync watermark.")
+
+
+def encode_changes_cursor(changed_on: datetime, entity_id: str, watermark: datetime, include_deleted: bool) -> str:
+    """
+    Encode the position of a delta sync that spans several pages, with the state it carries to the last page.
+    """
+    payload = json.dumps([changed_on.isoformat(), entity_id, watermark.isoformat(), include_deleted],
+                         separators=(',', ':'))
+    return urlsafe_base64_encode(payload.encode('utf-8'))
+
+
+def decode_changes_cursor(cursor: str):
+    """
+    Decode a cursor produced by `encode_changes_cursor` into (changed_on, entity_id, watermark, include_deleted).
+    """
+    try:
+        changed_on, entity_id, watermark, include_deleted = json.loads(urlsafe_base64_decode(cursor))
+        return datetime.fromisoformat(changed_on), str(entity_id), datetime.fromisoformat(watermark), bool(include_deleted)
+    except (ValueError, TypeError):
+        raise InputValidationError("Invalid pagination cursor.")
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from common.app_config import config
+from common.app_logger import logger
+from common.helpers.exceptions import ServiceUnavailableError
+
+# Parameters werkzeug uses for a bare "scrypt" method
+_SCRYPT_DEFAULTS = "scrypt:32768:8:1"
+
+
+def _normalize_method(method: str) -> str:
+    return _SCRYPT_DEFAULTS if method == "scrypt" else method
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification in a pool of worker processes.
+
+    Memory-hard hashes (scrypt) would otherwise hold a request thread and the GIL for tens of
+    milliseconds each, stalling every other request of the worker during a login storm. At most
+    `max_workers` hashes run at once and `max_pending` more may wait; beyond that, and when a
+    hash does not finish within `timeout` seconds, ServiceUnavailableError is raised so the
+    caller answers 503 instead of queueing without bound. With `max_workers` 0 hashes run on
+    the calling thread, still bounded by `max_pending`.
+    """
+
+    def __init__(self, method: str, max_workers: int, max_pending: int, timeout: float):
+        self.method = _normalize_method(method)
+        self.max_workers = max(0, max_workers)
+        self.max_pending = max(0, max_pending)
+        self.timeout = timeout
+
+        self._slots = threading.BoundedSemaphore(max(1, self.max_workers + self.max_pending))
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._in_flight = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: forking a threaded server process can copy held locks.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ServiceUnavailableError("Too many password operations in progress, try again shortly.")
+        with self._lock:
+            self._in_flight += 1
+
+        if not self.max_workers:
+            try:
+                return function(*args)
+            finally:
+                self._release()
+                with self._lock:
+                    self._completed += 1
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(function, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self._release()
+            self._reset_executor(executor)
+            raise ServiceUnavailableError("Password hashing is temporarily unavailable.")
+        # The slot is held until the worker is done, even when the caller stops waiting.
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise ServiceUnavailableError("Password hashing timed out, try again shortly.")
+        except BrokenProcessPool:
+            logger.warning("Password hashing worker died, restarting the pool")
+            self._reset_executor(executor)
+            raise ServiceUnavailableError("Password hashing is temporarily unavailable.")
+
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method and parameters."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a hash produced by `hash`, with whatever parameters it was made with."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a stored hash was made with other parameters than the configured ones."""
+        return _normalize_method(password_hash.split("$", 1)[0]) != self.method
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "method": self.method,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+            }
+
+
+_hasher = None
+_hasher_pid = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """
+    Return the process-wide password hasher, creating it on first use.
+    A forked child gets its own worker pool instead of sharing the parent's.
+    """
+    global _hasher, _hasher_pid
+
+    pid = os.getpid()
+    if _hasher is not None and _hasher_pid == pid:
+        return _hasher
+
+    with _hasher_lock:
+        if _hasher is None or _hasher_pid != pid:
+            _hasher = PasswordHasher(
+                method=config.PASSWORD_HASH_METHOD,
+                max_workers=config.PASSWORD_HASH_WORKERS,
+                max_pending=config.PASSWORD_HASH_MAX_PENDING,
+                timeout=config.PASSWORD_HASH_TIMEOUT,
+            )
+            _hasher_pid = pid
+    return _hasher
+
+
+def get_password_hasher_stats() -> Optional[dict]:
+    """Statistics of the process-wide password hasher, or None when this process has not created it."""
+    instance = _hasher
+    if instance is None or _hasher_pid != os.getpid():
+        return None
+    return instance.stats()
@@ -1,4 +1,5 @@
 import base64
+import hashlib
 from binascii import Error as BinasciiError
 from datetime import datetime, date, time
 from decimal import Decimal
@@ -74,3 +75,10 @@ def force_bytes(s, encoding='utf-8', strings_only=False, errors='strict'):
     if isinstance(s, memoryview):
         return bytes(s)
     return str(s).encode(encoding, errors)
+
+
+def make_etag(*parts) -> str:
+    """
+    Build an opaque entity tag from the values that identify a version of a resource.
+    """
+    return hashlib.blake2b('\x1f'.join(map(str, parts)).encode('utf-8'), digest_size=16).hexdigest()
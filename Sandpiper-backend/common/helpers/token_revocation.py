@@ -0,0 +1,232 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from common.app_config import config
+from common.app_logger import logger
+from common.helpers.cache import InMemoryCache
+
+# Revocations committed this long after the database clock was read are still picked up by the next poll.
+POLL_OVERLAP = timedelta(seconds=5)
+
+
+def _to_epoch(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class BloomFilter:
+    """
+    Set of strings answering membership with no false negatives and about `error_rate`
+    false positives while it holds at most `capacity` keys.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _probe(self, key: str):
+        """First bit position of `key` and the stride to each next one (double hashing)."""
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=16).digest(), 'little')
+        size = self.size
+        return (digest >> 64) % size, (digest & 0xFFFFFFFFFFFFFFFF) % size or 1
+
+    def add(self, key: str):
+        position, step = self._probe(key)
+        size, bits = self.size, self._bits
+        for _ in range(self.hash_count):
+            bits[position >> 3] |= 1 << (position & 7)
+            position += step
+            if position >= size:
+                position -= size
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        position, step = self._probe(key)
+        size, bits = self.size, self._bits
+        for _ in range(self.hash_count):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+            if position >= size:
+                position -= size
+        return True
+
+
+class TokenRevocationList:
+    """
+    Per-process view of the revoked_token table, so the authentication decorators can check
+    the jti of every request without a query.
+
+    Every live revocation is loaded into a Bloom filter on first use; the table is then polled
+    for rows revoked since the last poll every `refresh_interval` seconds, by whichever request
+    comes first. A jti that misses the filter is not revoked. A hit is settled by the exact set
+    of revocations known to this process (polled, made here or confirmed before), and otherwise
+    confirmed against the database once; false positives are remembered so they cost one query.
+    Revocations made in another process take effect here within `refresh_interval` seconds.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, refresh_interval: float, max_false_positives: int = 10000):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+
+        self._bloom: Optional[BloomFilter] = None  # None until loaded: every jti is confirmed against the database
+        self._revoked: Dict[str, float] = {}  # jti -> expiry, revocations known to be real
+        self._false_positives = InMemoryCache('revoked_token_false_positives', max_false_positives)
+        self._read_at: Optional[datetime] = None  # database time of the last load or poll
+        self._next_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+        # Guards changes to _revoked and _bloom; database reads happen outside it
+        self._lock = threading.Lock()
+
+        self._loads = 0
+        self._polls = 0
+        self._confirmations = 0
+        self._refresh_errors = 0
+
+    @staticmethod
+    def _service():
+        from common.services.login_method import LoginMethodService
+        return LoginMethodService(config)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Whether the access token with this jti was revoked. Tokens without one predate revocation."""
+        if not jti:
+            return False
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+
+        bloom = self._bloom
+        if bloom is not None and jti not in bloom:
+            return False
+        if jti in self._revoked:
+            return True
+        if self._false_positives.get(jti):
+            return False
+
+        self._confirmations += 1
+        expires_at = self._service().get_revoked_token_expiry(jti)
+        if expires_at is None:
+            self._false_positives.set(jti, True)
+            return False
+        with self._lock:
+            self._revoked[jti] = _to_epoch(expires_at)
+        return True
+
+    def add(self, jti: str, expires_at: datetime):
+        """Record a revocation this process just stored, so it applies here without waiting for a poll."""
+        with self._lock:
+            self._revoked[jti] = _to_epoch(expires_at)
+            if self._bloom is not None:
+                self._bloom.add(jti)
+        self._false_positives.delete(jti)
+
+    def refresh(self):
+        """
+        Poll for new revocations, or load all of them when nothing is loaded yet or the filter is
+        over capacity. Returns without waiting when another thread is already refreshing.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self._next_refresh:
+                return
+            bloom = self._bloom
+            if bloom is None or bloom.count > bloom.capacity:
+                self._load()
+            else:
+                self._poll(bloom)
+        except Exception as e:
+            self._refresh_errors += 1
+            logger.warning(f"Could not refresh revoked access tokens: {e}")
+        finally:
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            self._refresh_lock.release()
+
+    def _load(self):
+        rows, read_at = self._service().get_revoked_tokens()
+        # Expired revocations are dropped by rebuilding, so leave room for what arrives until the next one
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for jti, _ in rows:
+            bloom.add(jti)
+        with self._lock:
+            now = time.time()
+            revoked = {jti: expiry for jti, expiry in self._revoked.items() if expiry > now}
+            # Revocations added here after the rows were read are not among them
+            for jti in revoked:
+                if jti not in bloom:
+                    bloom.add(jti)
+            self._revoked = revoked
+            self._bloom = bloom
+        self._read_at = read_at
+        self._loads += 1
+
+    def _poll(self, bloom: BloomFilter):
+        rows, read_at = self._service().get_revoked_tokens(self._read_at - POLL_OVERLAP)
+        with self._lock:
+            revoked = self._revoked
+            for jti, expires_at in rows:
+                if jti not in revoked:
+                    bloom.add(jti)
+                    revoked[jti] = _to_epoch(expires_at)
+            now = time.time()
+            for jti in [jti for jti, expiry in revoked.items() if expiry <= now]:
+                del revoked[jti]
+        self._read_at = read_at
+        self._polls += 1
+
+    def stats(self) -> dict:
+        bloom = self._bloom
+        return {
+            "loaded": bloom is not None,
+            "filter_entries": bloom.count if bloom else 0,
+            "filter_capacity": bloom.capacity if bloom else 0,
+            "filter_bytes": len(bloom._bits) if bloom else 0,
+            "known_revoked": len(self._revoked),
+            "loads": self._loads,
+            "polls": self._polls,
+            "confirmations": self._confirmations,
+            "refresh_errors": self._refresh_errors,
+        }
+
+
+_revocation_list = None
+_revocation_list_pid = None
+_revocation_list_lock = threading.Lock()
+
+
+def get_token_revocation_list() -> TokenRevocationList:
+    """
+    Return the process-wide token revocation list, creating it on first use.
+    A forked child loads its own copy instead of sharing the parent's.
+    """
+    global _revocation_list, _revocation_list_pid
+
+    pid = os.getpid()
+    if _revocation_list is not None and _revocation_list_pid == pid:
+        return _revocation_list
+
+    with _revocation_list_lock:
+        if _revocation_list is None or _revocation_list_pid != pid:
+            _revocation_list = TokenRevocationList(
+                capacity=config.REVOKED_TOKEN_FILTER_CAPACITY,
+                error_rate=config.REVOKED_TOKEN_FILTER_ERROR_RATE,
+                refresh_interval=config.REVOKED_TOKEN_REFRESH_SECONDS,
+            )
+            _revocation_list_pid = pid
+    return _revocation_list
+
+
+def get_token_revocation_stats() -> Optional[dict]:
+    """Statistics of the process-wide token revocation list, or None when this process has not created it."""
+    instance = _revocation_list
+    if instance is None or _revocation_list_pid != os.getpid():
+        return None
+    return instance.stats()
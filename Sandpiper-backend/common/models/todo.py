@@ -36,14 +36,19 @@ class Todo(VersionedModel):
         self.is_completed = is_completed
         self.due_date = due_date
 
-    def validate(self):
-        """Validate the todo model before saving"""
-        if not self.person_id:
+    @staticmethod
+    def validate_fields(person_id: Optional[str], title: Optional[str]) -> bool:
+        """Validate todo field values without building a model, e.g. for bulk loads"""
+        if not person_id:
             raise ValueError("person_id is required")
-        if not self.title:
+        if not title:
             raise ValueError("title is required")
         return True
 
+    def validate(self):
+        """Validate the todo model before saving"""
+        return self.validate_fields(self.person_id, self.title)
+
     def as_dict(self, convert_datetime_to_iso_string=True, convert_uuids=False, export_properties=None):
         """
         Convert the Todo object to a dictionary.
@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+
+class TodoRow(NamedTuple):
+    """
+    Read-only todo as fetched from the database.
+
+    A slotted tuple in `todo` column order, built straight from a cursor row, for list and
+    read endpoints where a full `Todo` model is too expensive. `as_dict` matches `Todo.as_dict`.
+    """
+    entity_id: str
+    version: str
+    previous_version: Optional[str]
+    active: bool
+    changed_by_id: Optional[str]
+    changed_on: Optional[datetime]
+    person_id: str
+    title: str
+    description: Optional[str]
+    is_completed: bool
+    due_date: Optional[datetime]
+
+    def as_dict(self) -> dict:
+        return {
+            "entity_id": self.entity_id,
+            "version": self.version,
+            "previous_version": self.previous_version,
+            "active": self.active,
+            "changed_by_id": self.changed_by_id,
+            "changed_on": self.changed_on.isoformat() if self.changed_on else None,
+            "person_id": self.person_id,
+            "title": self.title or "",
+            "description": self.description or "",
+            "is_completed": self.is_completed,
+            "due_date": self.due_date.isoformat() if self.due_date else None,
+        }
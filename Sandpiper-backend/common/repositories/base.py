@@ -1,7 +1,16 @@
+import json
+import re
+from contextlib import contextmanager
+
+from rococo.repositories.base_repository import BaseRepository as RococoBaseRepository
 from rococo.repositories.postgresql import PostgreSQLRepository
 from rococo.data.postgresql import PostgreSQLAdapter
 from rococo.messaging.base import MessageAdapter
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+from common.repositories.connection_pool import get_connection_pool
+from common.repositories.identity_map import get_identity_map
+from common.repositories.unit_of_work import get_current_unit_of_work
 
 
 class BaseRepository(PostgreSQLRepository):
@@ -11,10 +20,101 @@ class BaseRepository(PostgreSQLRepository):
         super().__init_subclass__(**kwargs)
         if cls.MODEL is None:
             raise TypeError(f"Subclasses of {cls.__name__} must define the MODEL attribute.")
+        # Named the way PostgreSQLRepository names it, once per class
+        cls.TABLE_NAME = re.sub(r'(?<!^)(?=[A-Z])', '_', cls.MODEL.__name__).lower()
 
     def __init__(
             self, db_adapter: PostgreSQLAdapter, message_adapter: Optional[MessageAdapter], 
             queue_name: str, user_id: str = None
     ):
-        # Pass MODEL as the model to the BaseRepository
-        super().__init__(db_adapter, self.MODEL, message_adapter, queue_name, user_id=user_id)
+        # Pass MODEL as the model to the BaseRepository. PostgreSQLRepository.__init__ is skipped: besides
+        # naming the table it builds a throwaway MODEL instance, which costs milliseconds per repository.
+        RococoBaseRepository.__init__(self, db_adapter, self.MODEL, message_adapter, queue_name, user_id=user_id)
+        self.table_name = self.TABLE_NAME
+
+    @contextmanager
+    def _get_cursor(self, autocommit: bool = False):
+        """Get a cursor on a connection borrowed from the shared pool"""
+        with get_connection_pool().connection() as conn:
+            if autocommit:
+                conn.autocommit = True  # the pool switches it back off on return
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Get a cursor whose statements are committed together, or rolled back on error.
+        Inside a unit of work they join its transaction instead.
+        """
+        unit_of_work = get_current_unit_of_work()
+        if unit_of_work is not None:
+            yield unit_of_work.cursor
+            return
+
+        with get_connection_pool().connection() as conn:
+            with conn:
+                with conn.cursor() as cursor:
+                    yield cursor
+
+    def _write(self, query: str, values: tuple = ()):
+        """Run a statement that returns nothing; inside a unit of work it is sent with the other writes."""
+        unit_of_work = get_current_unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.queue_statement(query, values)
+            return
+
+        with self._transaction() as cursor:
+            cursor.execute(query, values)
+
+    def get_one(self, conditions: Dict[str, Any] = None, fetch_related: List[str] = None):
+        """
+        Get one active entity. Within a request, an entity read before with the same conditions
+        is returned again without a query; see IdentityMap.
+        """
+        identity_map = get_identity_map() if conditions and not fetch_related else None
+        if identity_map is not None:
+            instance = identity_map.get(self.table_name, conditions)
+            if instance is not None:
+                return instance
+
+        instance = super().get_one(conditions, fetch_related=fetch_related)
+        if identity_map is not None and instance is not None:
+            identity_map.add(self.table_name, conditions, instance)
+        return instance
+
+    def _update_identity_map(self, instance, key: Optional[str] = None):
+        """
+        Record a write of `instance` in the request's identity map, under `key` instead of the
+        table name for entities kept in another shape (e.g. TodoRow). Writes queued in a unit of
+        work are not visible to reads yet, so their entities are forgotten instead.
+        """
+        identity_map = get_identity_map()
+        if identity_map is None:
+            return
+        key = key or self.table_name
+        if get_current_unit_of_work() is not None:
+            identity_map.evict(key, instance.entity_id)
+        else:
+            identity_map.update(key, instance, active=bool(instance.active))
+
+    def save(self, instance, send_message: bool = False):
+        unit_of_work = get_current_unit_of_work()
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            # Forgotten first, so an instance changed by a save that fails is not handed out again
+            identity_map.evict(self.table_name, instance.entity_id)
+        if unit_of_work is None:
+            instance = super().save(instance, send_message=send_message)
+            self._update_identity_map(instance)
+            return instance
+
+        data = self._process_data_before_save(instance)
+        unit_of_work.queue_save(self.table_name, instance.entity_id, self.adapter.get_save_query(self.table_name, data))
+        if send_message:
+            message = json.dumps(instance.as_dict(convert_datetime_to_iso_string=True))
+            unit_of_work.after_commit(lambda: self.message_adapter.send_message(self.queue_name, message))
+        return instance
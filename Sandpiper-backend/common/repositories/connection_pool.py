@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+from common.app_config import config
+from common.app_logger import logger
+from common.helpers.exceptions import ServiceUnavailableError
+
+
+class ConnectionPool:
+    """
+    Thread-safe, size-bounded pool of psycopg2 connections.
+
+    A single instance is shared by every repository in the process (see `get_connection_pool`).
+    Idle connections are health checked on checkout and transparently replaced when the
+    server went away (restart, failover), so callers always receive a usable connection.
+    """
+
+    def __init__(self, min_size: int, max_size: int, checkout_timeout: float,
+                 health_check_interval: float, **connect_kwargs):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Condition()
+        self._idle = []  # list of (connection, returned_at) tuples, most recently returned last
+        self._size = 0  # open connections, idle + in use
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._checkout_timeouts = 0
+        self._reconnects = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+        self._closed = False
+
+        for _ in range(self.min_size):
+            try:
+                conn = self._connect()
+            except psycopg2.Error as e:
+                logger.warning(f"Could not pre-open database connection: {e}")
+                break
+            with self._lock:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def getconn(self):
+        """
+        Check a connection out of the pool, blocking up to `checkout_timeout` seconds when all are in use.
+        """
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.checkout_timeout
+
+        with self._lock:
+            if self._closed:
+                raise ServiceUnavailableError("Database connection pool is closed.")
+
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._lock.wait(remaining):
+                        if not self._idle and self._size >= self.max_size:
+                            self._checkout_timeouts += 1
+                            raise ServiceUnavailableError("Timed out waiting for a database connection.")
+            finally:
+                self._waiting -= 1
+
+            if self._idle:
+                conn, idle_since = self._idle.pop()
+            else:
+                conn, idle_since = None, None
+                self._size += 1  # reserve the slot before connecting outside the lock
+
+        try:
+            if conn is not None and not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                with self._lock:
+                    self._reconnects += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """
+        Return a connection to the pool, rolling back any open transaction and
+        restoring the default (non-autocommit) mode.
+        Broken connections are closed and their slot is freed for a fresh one.
+        """
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            else:
+                try:
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    if conn.autocommit:
+                        conn.autocommit = False
+                except psycopg2.Error:
+                    discard = True
+        else:
+            discard = True
+
+        with self._lock:
+            if discard or self._closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks a connection out and always gives it back.
+        The transaction is left to the caller; anything uncommitted is rolled back on return.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "checkout_timeouts": self._checkout_timeouts,
+                "reconnects": self._reconnects,
+                "checkout_latency_avg_ms": (
+                    round(self._checkout_time_total / self._checkouts * 1000, 3) if self._checkouts else 0.0
+                ),
+                "checkout_latency_max_ms": round(self._checkout_time_max * 1000, 3),
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._lock.notify_all()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+    A forked child gets its own pool instead of sharing the parent's sockets.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(
+                min_size=config.POSTGRES_POOL_MIN_CONNECTIONS,
+                max_size=config.POSTGRES_POOL_MAX_CONNECTIONS,
+                checkout_timeout=config.POSTGRES_POOL_CHECKOUT_TIMEOUT,
+                health_check_interval=config.POSTGRES_POOL_HEALTH_CHECK_INTERVAL,
+                host=config.POSTGRES_HOST,
+                port=int(config.POSTGRES_PORT),
+                user=config.POSTGRES_USER,
+                password=config.POSTGRES_PASSWORD,
+                database=config.POSTGRES_DB,
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def get_connection_pool_stats() -> Optional[dict]:
+    """Statistics of the process-wide connection pool, or None when this process has not created it."""
+    instance = _pool
+    if instance is None or _pool_pid != os.getpid():
+        return None
+    return instance.stats()
@@ -1,6 +1,68 @@
+import json
+from typing import Any, Dict, List, Tuple
+
 from common.repositories.base import BaseRepository
 from common.models.email import Email
 
+# Channel notified when an email is added to the outbox; delivered when the transaction commits
+EMAIL_OUTBOX_CHANNEL = 'email_outbox'
+
 
 class EmailRepository(BaseRepository):
     MODEL = Email
+
+    def add_to_outbox(self, event: str, message: Dict[str, Any]):
+        """
+        Add an email to the outbox, to be sent by the email outbox relay once the transaction commits.
+        Inside a unit of work it is written with the unit's other writes.
+        """
+        self._write("""
+            INSERT INTO email_outbox (event, message, created_on, available_at)
+            VALUES (%s, %s::jsonb, now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc');
+            SELECT pg_notify(%s, '')
+        """, (event, json.dumps(message), EMAIL_OUTBOX_CHANNEL))
+
+    def claim_outbox_emails(self, limit: int, lease_seconds: float) -> List[Tuple[int, str, Dict[str, Any], int]]:
+        """
+        Claim up to `limit` emails that are due, oldest first, and count an attempt for each.
+        A claimed email is not due again for `lease_seconds`, so several relays never send it
+        twice at once, and one whose relay died is retried after that.
+        Returns (id, event, message, attempts) tuples.
+        """
+        with self._transaction() as cursor:
+            cursor.execute("""
+                UPDATE email_outbox AS o SET
+                    attempts = o.attempts + 1,
+                    available_at = now() AT TIME ZONE 'utc' + %s * interval '1 second'
+                FROM (
+                    SELECT id FROM email_outbox
+                    WHERE failed_on IS NULL AND available_at <= now() AT TIME ZONE 'utc'
+                    ORDER BY available_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) AS due
+                WHERE o.id = due.id
+                RETURNING o.id, o.event, o.message, o.attempts
+            """, (lease_seconds, limit))
+            return sorted(cursor.fetchall())
+
+    def delete_outbox_emails(self, ids: List[int]):
+        """Remove sent emails from the outbox."""
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM email_outbox WHERE id = ANY(%s)", (ids,))
+
+    def retry_outbox_email(self, email_id: int, delay_seconds: float, error: str):
+        """Make an email that could not be sent due again in `delay_seconds`."""
+        with self._transaction() as cursor:
+            cursor.execute("""
+                UPDATE email_outbox
+                SET available_at = now() AT TIME ZONE 'utc' + %s * interval '1 second', last_error = %s
+                WHERE id = %s
+            """, (delay_seconds, error, email_id))
+
+    def fail_outbox_email(self, email_id: int, error: str):
+        """Give up on an email; it stays in the outbox with its last error but is not tried again."""
+        with self._transaction() as cursor:
+            cursor.execute("""
+                UPDATE email_outbox SET failed_on = now() AT TIME ZONE 'utc', last_error = %s WHERE id = %s
+            """, (error, email_id))
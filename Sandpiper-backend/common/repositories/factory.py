@@ -1,33 +1,15 @@
+import json
+import threading
+
+from pika import BasicProperties
+from pika.spec import PERSISTENT_DELIVERY_MODE, TRANSIENT_DELIVERY_MODE
+
 from common.repositories import *
+from common.repositories.connection_pool import get_connection_pool
 from enum import Enum, auto
 from rococo.data.postgresql import PostgreSQLAdapter
-from rococo.messaging.rabbitmq import RabbitMqConnection
-from typing import Optional
-from common.app_logger import logger
-
-
-def get_flask_pooled_db():
-    """
-    Determine if a Flask app context is available and the flask app context has `pooled_db` extension available
-
-    Returns:
-        object: The pooled_db extension if available otherwise None.
-    """
-    try:
-        # Attempt to import Flask and access the current app's context
-        from flask import current_app, has_app_context
-
-        # Check if Flask app context is available and the `pooled_db` extension is registered
-        if has_app_context():
-            pooled_db = current_app.extensions.get("pooled_db")
-            if pooled_db:
-                return pooled_db
-    except (ImportError, AttributeError):
-        # ImportError: Flask is not installed
-        # AttributeError: `pooled_db` extension is not available
-        pass
-
-    return None
+from rococo.messaging import MessageAdapter
+from common.tasks.message_publisher import get_message_publisher
 
 
 class MessageAdapterType(str, Enum):
@@ -39,15 +21,76 @@ class MessageAdapterType(str, Enum):
 
 
 def get_connection_resolver():
-    pooled_db = get_flask_pooled_db()
-    if pooled_db:
-        return pooled_db.get_connection
+    pool = get_connection_pool()
+    return lambda *args, **kwargs: pool.getconn()
 
 
 def get_connection_closer():
-    pooled_db = get_flask_pooled_db()
-    if pooled_db:
-        return lambda *args, **kwargs: None  # No-op; let Pooled DB handle closing of connection on request teardown.
+    pool = get_connection_pool()
+
+    def close_connection(adapter):
+        # Hand the connection back to the shared pool instead of closing it.
+        if adapter._cursor is not None:
+            adapter._cursor.close()
+            adapter._cursor = None
+
+        if adapter._connection is not None:
+            pool.putconn(adapter._connection)
+            adapter._connection = None
+
+    return close_connection
+
+
+class PooledPostgreSQLAdapter(PostgreSQLAdapter):
+    """
+    PostgreSQLAdapter that borrows its connection from the shared pool and may be entered again
+    while in use, so every repository on a thread can share one instance: the connection is
+    checked out by the outermost `with` and returned when it ends.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str, database: str):
+        super().__init__(host, port, user, password, database,
+                         connection_resolver=get_connection_resolver(), connection_closer=get_connection_closer())
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            super().__enter__()
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0:
+            super().__exit__(exc_type, exc_value, traceback)
+
+
+class PublisherMessageAdapter(MessageAdapter):
+    """
+    Message adapter handed to repositories that publishes through the process-wide MessagePublisher,
+    so saving with `send_message` neither opens a broker connection nor waits for the broker.
+    """
+
+    def send_message(self, queue_name: str, message: dict, persistent: bool = True):
+        # Serialized and left undeclared as RabbitMqConnection.send_message does
+        delivery_mode = PERSISTENT_DELIVERY_MODE if persistent else TRANSIENT_DELIVERY_MODE
+        get_message_publisher().publish(
+            queue_name, json.dumps(message).encode(), properties=BasicProperties(delivery_mode=delivery_mode),
+            declare=False
+        )
+
+    def consume_messages(self, queue_name: str, callback_function: callable = None):
+        raise NotImplementedError("Repositories only publish; consumers open their own connection.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+# Adapters shared by the repositories of each thread (see RepositoryFactory.get_repository)
+_thread_adapters = threading.local()
 
 
 class RepoType(Enum):
@@ -86,23 +129,23 @@ class RepositoryFactory:
         password = self.config.POSTGRES_PASSWORD
         database = self.config.POSTGRES_DB
 
-        return PostgreSQLAdapter(host, port, user, password, database, connection_resolver=get_connection_resolver(), connection_closer=get_connection_closer())
-
-    def _get_rabbitmq_connection(self):
-        return RabbitMqConnection(
-            host=self.config.RABBITMQ_HOST,
-            port=int(self.config.RABBITMQ_PORT),
-            username=self.config.RABBITMQ_USER,
-            password=self.config.RABBITMQ_PASSWORD,
-            virtual_host=self.config.RABBITMQ_VIRTUAL_HOST
-        )
+        return PooledPostgreSQLAdapter(host, port, user, password, database)
 
     def get_adapter(self):
-        return self._get_rabbitmq_connection()
+        return PublisherMessageAdapter()
+
+    def _get_thread_adapters(self):
+        """
+        The database and message adapters of the calling thread, created on its first repository.
+        Neither holds a connection until it is used.
+        """
+        adapters = getattr(_thread_adapters, 'adapters', None)
+        if adapters is None:
+            adapters = _thread_adapters.adapters = (self.get_db_connection(), self.get_adapter())
+        return adapters
 
     def get_repository(self, repo_type: RepoType, person_id=None, message_queue_name: str = ""):
-        adapter = self.get_db_connection()
-        message_adapter = self.get_adapter()
+        adapter, message_adapter = self._get_thread_adapters()
         repo_class = self._repositories.get(repo_type)
 
         if person_id is None:
@@ -113,7 +156,6 @@ class RepositoryFactory:
                 pass
 
         if repo_class:
-            import threading
             return repo_class(adapter, message_adapter, message_queue_name, person_id)
 
         raise ValueError(f"No repository found with the name '{repo_type}'")
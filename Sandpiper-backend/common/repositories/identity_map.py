@@ -0,0 +1,81 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class IdentityMap:
+    """
+    Entities read during one request, so that reading the same one again costs no query.
+
+    Entities are kept by (table, entity_id); a lookup by other conditions, e.g. an email address,
+    remembers which entity it found. Writes replace the kept entity, or forget it when it was
+    deactivated. Lookups that found nothing are not remembered, so rows created later in the
+    request are still found. `hits` counts the queries that were saved.
+    """
+
+    def __init__(self):
+        self._entities: Dict[Tuple[str, str], Any] = {}
+        self._lookups: Dict[Tuple[str, Hashable], str] = {}  # (table, conditions) -> entity_id
+        self.hits = 0
+
+    @staticmethod
+    def _lookup_key(table: str, conditions: Dict[str, Any]) -> Optional[Tuple[str, Hashable]]:
+        try:
+            key = (table, tuple(sorted(conditions.items())))
+            hash(key)
+        except TypeError:
+            return None  # conditions with lists or other unhashable values are not cached
+        return key
+
+    def get(self, table: str, conditions: Dict[str, Any]):
+        """The entity an earlier lookup with these conditions found, or None."""
+        if list(conditions) == ['entity_id']:
+            entity = self._entities.get((table, str(conditions['entity_id'])))
+        else:
+            key = self._lookup_key(table, conditions)
+            entity_id = self._lookups.get(key) if key else None
+            entity = self._entities.get((table, entity_id)) if entity_id else None
+        if entity is not None:
+            self.hits += 1
+        return entity
+
+    def add(self, table: str, conditions: Dict[str, Any], entity):
+        """Remember the entity a lookup with these conditions found."""
+        entity_id = str(entity.entity_id)
+        self._entities[(table, entity_id)] = entity
+        if list(conditions) != ['entity_id']:
+            key = self._lookup_key(table, conditions)
+            if key:
+                self._lookups[key] = entity_id
+
+    def update(self, table: str, entity, active: bool = True):
+        """
+        Record a write of the entity. Lookups by other conditions are forgotten, since the
+        write may have changed the values they matched on.
+        """
+        entity_id = str(entity.entity_id)
+        for key in [key for key, found_id in self._lookups.items() if found_id == entity_id and key[0] == table]:
+            del self._lookups[key]
+        if active:
+            self._entities[(table, entity_id)] = entity
+        else:
+            self._entities.pop((table, entity_id), None)
+
+    def evict(self, table: str, entity_id: str):
+        """Forget an entity, e.g. after a write whose result is not at hand."""
+        entity_id = str(entity_id)
+        self._entities.pop((table, entity_id), None)
+        for key in [key for key, found_id in self._lookups.items() if found_id == entity_id and key[0] == table]:
+            del self._lookups[key]
+
+
+def get_identity_map() -> Optional[IdentityMap]:
+    """The identity map of the current Flask request, or None outside of one (e.g. in tasks)."""
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return None
+    if not has_request_context():
+        return None
+    identity_map = g.get('identity_map')
+    if identity_map is None:
+        identity_map = g.identity_map = IdentityMap()
+    return identity_map
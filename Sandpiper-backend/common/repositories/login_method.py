@@ -1,6 +1,212 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
 from common.repositories.base import BaseRepository
-from common.models.login_method import LoginMethod
+from common.models.email import Email
+from common.models.login_method import LoginMethod, LoginMethodType
+from common.models.person import Person
+
+# Columns of the models loaded together by get_login_identity_by_email
+_IDENTITY_MODELS = (
+    ('e', Email, Email.fields()),
+    ('lm', LoginMethod, [name for name in LoginMethod.fields() if name != 'raw_password']),
+    ('p', Person, Person.fields()),
+)
 
 
 class LoginMethodRepository(BaseRepository):
     MODEL = LoginMethod
+
+    def get_login_identity_by_email(self, email_address: str) -> Optional[
+            Tuple[Email, Optional[LoginMethod], Optional[Person], int, Dict[str, str]]]:
+        """
+        Everything a password login needs, in one statement: the active email with this address,
+        its email-password login method and person, and the person's membership version and
+        roles as {organization_id: role}. Returns None when the email is not registered; the
+        login method and person are None when missing.
+        """
+        columns = ", ".join(
+            f'{alias}."{name}" AS "{alias}__{name}"' for alias, _, names in _IDENTITY_MODELS for name in names
+        )
+        query = f"""
+            SELECT {columns},
+                   coalesce(v.version, 0) AS membership_version, por.organization_id, por.role
+            FROM (
+                SELECT * FROM email WHERE email = %(email)s AND active LIMIT 1
+            ) AS e
+            LEFT JOIN login_method AS lm
+                ON lm.email_id = e.entity_id AND lm.method_type = %(method_type)s AND lm.active
+            LEFT JOIN person AS p ON p.entity_id = lm.person_id AND p.active
+            LEFT JOIN person_membership_version AS v ON v.person_id = p.entity_id
+            LEFT JOIN (
+                person_organization_role AS por
+                JOIN organization AS o ON o.entity_id = por.organization_id AND o.active
+            ) ON por.person_id = p.entity_id AND por.active
+        """
+        params = {'email': email_address, 'method_type': LoginMethodType.EMAIL_PASSWORD}
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+
+        if not results:
+            return None
+        row = results[0]
+        email, login_method, person = (
+            model.from_dict({name: row[f'{alias}__{name}'] for name in names})
+            if row[f'{alias}__entity_id'] is not None else None
+            for alias, model, names in _IDENTITY_MODELS
+        )
+        memberships = {row['organization_id']: row['role'] for row in results if row['organization_id']}
+        return email, login_method, person, row['membership_version'], memberships
+
+    def create_refresh_token(self, token_hash: str, family_id: str, login_method: LoginMethod,
+                             now: datetime, expires_at: datetime, session_expires_at: datetime,
+                             access_jti: str, access_expires_at: datetime):
+        """
+        Store a refresh token that starts a new session, dropping the person's expired tokens.
+        `access_jti` identifies the access token issued with it, revoked when the session is.
+        """
+        with self._transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM refresh_token WHERE person_id = %s AND expires_at < %s",
+                (login_method.person_id, now)
+            )
+            cursor.execute("""
+                INSERT INTO refresh_token (token_hash, family_id, login_method_id, person_id, email_id,
+                                           created_on, expires_at, session_expires_at, access_jti, access_expires_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (token_hash, family_id, login_method.entity_id, login_method.person_id, login_method.email_id,
+                  now, expires_at, session_expires_at, access_jti, access_expires_at))
+
+    def rotate_refresh_token(self, token_hash: str, new_token_hash: str, now: datetime, expires_at: datetime,
+                             access_jti: str, access_expires_at: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Spend a live refresh token and store its successor in the same session, in one statement.
+        `access_jti` identifies the access token issued with the successor.
+
+        The successor expires at `expires_at` or when the session does, whichever is first.
+        Returns what a new access token needs: the ids, person and email fields, the successor's
+        expiry and the person's memberships as {organization_id: role} with their version.
+        Returns None when the token is unknown, spent, revoked or expired.
+        """
+        query = """
+            WITH used AS (
+                UPDATE refresh_token SET used_on = %(now)s
+                WHERE token_hash = %(token_hash)s AND used_on IS NULL AND NOT revoked AND expires_at > %(now)s
+                RETURNING family_id, login_method_id, person_id, email_id, session_expires_at
+            ),
+            issued AS (
+                INSERT INTO refresh_token (token_hash, family_id, login_method_id, person_id, email_id,
+                                           created_on, expires_at, session_expires_at, access_jti, access_expires_at)
+                SELECT %(new_token_hash)s, family_id, login_method_id, person_id, email_id,
+                       %(now)s, least(%(expires_at)s, session_expires_at), session_expires_at,
+                       %(access_jti)s, %(access_expires_at)s
+                FROM used
+                RETURNING expires_at
+            )
+            SELECT issued.expires_at, used.login_method_id, used.person_id, used.email_id,
+                   p.first_name, p.last_name, e.email, e.is_verified,
+                   coalesce(v.version, 0) AS membership_version, por.organization_id, por.role
+            FROM used
+            CROSS JOIN issued
+            JOIN person AS p ON p.entity_id = used.person_id AND p.active
+            JOIN email AS e ON e.entity_id = used.email_id AND e.active
+            LEFT JOIN person_membership_version AS v ON v.person_id = used.person_id
+            LEFT JOIN (
+                person_organization_role AS por
+                JOIN organization AS o ON o.entity_id = por.organization_id AND o.active
+            ) ON por.person_id = used.person_id AND por.active
+        """
+        params = {'token_hash': token_hash, 'new_token_hash': new_token_hash, 'now': now, 'expires_at': expires_at,
+                  'access_jti': access_jti, 'access_expires_at': access_expires_at}
+
+        with self._transaction() as cursor:
+            cursor.execute(query, params)
+            columns = [column.name for column in cursor.description]
+            rows = cursor.fetchall()
+
+        if not rows:
+            return None
+        identity = dict(zip(columns, rows[0]))
+        identity['memberships'] = {row[-2]: row[-1] for row in rows if row[-2]}
+        del identity['organization_id'], identity['role']
+        return identity
+
+    def revoke_refresh_token_session(self, token_hash: str, spent_only: bool = True) -> List[Tuple[str, datetime]]:
+        """
+        Revoke every token of the session a refresh token belongs to, with the access tokens issued in it.
+        With `spent_only` this only happens for a spent token: one presented again was copied,
+        so its successors are not safe either.
+        Returns the (jti, expires_at) of the access tokens that were revoked, empty when the session was not.
+        """
+        with self._transaction() as cursor:
+            cursor.execute(f"""
+                UPDATE refresh_token SET revoked = true
+                WHERE family_id = (
+                    SELECT family_id FROM refresh_token
+                    WHERE token_hash = %s {'AND used_on IS NOT NULL' if spent_only else ''}
+                ) AND NOT revoked
+                RETURNING access_jti, access_expires_at, person_id
+            """, (token_hash,))
+            return self._revoke_access_tokens(cursor, cursor.fetchall())
+
+    def revoke_refresh_tokens(self, login_method_id: str) -> List[Tuple[str, datetime]]:
+        """
+        Revoke every refresh token issued for a login method with its access tokens, e.g. after its password changed.
+        Returns the (jti, expires_at) of the access tokens that were revoked.
+        """
+        with self._transaction() as cursor:
+            cursor.execute("""
+                UPDATE refresh_token SET revoked = true
+                WHERE login_method_id = %s AND NOT revoked
+                RETURNING access_jti, access_expires_at, person_id
+            """, (login_method_id,))
+            return self._revoke_access_tokens(cursor, cursor.fetchall())
+
+    def _revoke_access_tokens(self, cursor, rows) -> List[Tuple[str, datetime]]:
+        """Revoke the still valid access tokens of (access_jti, access_expires_at, person_id) rows."""
+        now = datetime.utcnow()
+        revoked = [(jti, expires_at, person_id) for jti, expires_at, person_id in rows
+                   if jti and expires_at and expires_at > now]
+        for jti, expires_at, person_id in revoked:
+            self._insert_revoked_token(cursor, jti, person_id, expires_at)
+        return [(jti, expires_at) for jti, expires_at, _ in revoked]
+
+    def _insert_revoked_token(self, cursor, jti: str, person_id: Optional[str], expires_at: datetime):
+        # revoked_on comes from the database clock, which every process polls against
+        cursor.execute("""
+            INSERT INTO revoked_token (jti, person_id, expires_at, revoked_on)
+            VALUES (%s, %s, %s, clock_timestamp() AT TIME ZONE 'utc')
+            ON CONFLICT (jti) DO NOTHING
+        """, (jti, person_id, expires_at))
+
+    def revoke_access_token(self, jti: str, person_id: Optional[str], expires_at: datetime):
+        """Revoke one access token until it expires, dropping revocations of tokens that expired since."""
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM revoked_token WHERE expires_at < %s", (datetime.utcnow(),))
+            self._insert_revoked_token(cursor, jti, person_id, expires_at)
+
+    def get_revoked_tokens(self, revoked_since: Optional[datetime] = None
+                           ) -> Tuple[List[Tuple[str, datetime]], datetime]:
+        """
+        Return the (jti, expires_at) of access tokens that are revoked and not yet expired, only those
+        revoked at or after `revoked_since` when given, and the database time the list was read at.
+        """
+        with self._get_cursor(autocommit=True) as cursor:
+            cursor.execute("SELECT clock_timestamp() AT TIME ZONE 'utc'")
+            read_at = cursor.fetchone()[0]
+            if revoked_since is None:
+                cursor.execute("SELECT jti, expires_at FROM revoked_token WHERE expires_at > %s", (read_at,))
+            else:
+                cursor.execute(
+                    "SELECT jti, expires_at FROM revoked_token WHERE revoked_on >= %s AND expires_at > %s",
+                    (revoked_since, read_at)
+                )
+            return cursor.fetchall(), read_at
+
+    def get_revoked_token_expiry(self, jti: str) -> Optional[datetime]:
+        """Return when a revoked access token expires, or None when it is not revoked."""
+        with self._get_cursor(autocommit=True) as cursor:
+            cursor.execute("SELECT expires_at FROM revoked_token WHERE jti = %s", (jti,))
+            row = cursor.fetchone()
+            return row[0] if row else None
@@ -0,0 +1,285 @@
+import os
+import select
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2 import sql
+
+from common.app_config import config
+from common.app_logger import logger
+from common.helpers.exceptions import ServiceUnavailableError
+
+# Event queued for every subscriber when notifications may have been missed
+# (client buffer overflow, listener reconnect); the client should refetch its state.
+RESYNC_EVENT = 'resync'
+
+
+class Subscription:
+    """
+    Bounded buffer of (channel, payload) notifications for one client.
+
+    When the client falls `max_buffer` events behind, the buffer is replaced by a single
+    RESYNC_EVENT instead of growing, so a slow reader costs a fixed amount of memory.
+    """
+
+    def __init__(self, channel: str, max_buffer: int):
+        self.channel = channel
+        self.max_buffer = max(1, max_buffer)
+        self._events = deque()
+        self._ready = threading.Condition()
+        self.closed = False
+
+    def put(self, event: str, payload: str) -> bool:
+        """Buffer an event; returns False when the buffer overflowed and was replaced by a resync."""
+        with self._ready:
+            overflowed = len(self._events) >= self.max_buffer
+            if overflowed:
+                self._events.clear()
+                self._events.append((RESYNC_EVENT, ''))
+            else:
+                self._events.append((event, payload))
+            self._ready.notify()
+        return not overflowed
+
+    def get(self, timeout: float) -> List[Tuple[str, str]]:
+        """
+        Return every buffered (event, payload), waiting up to `timeout` seconds for the first one.
+        An empty list means the timeout expired.
+        """
+        with self._ready:
+            if not self._events and not self.closed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+
+class NotificationListener:
+    """
+    One LISTEN connection per process, shared by every subscriber.
+
+    A daemon thread, started on the first subscription, owns a dedicated autocommit
+    connection, LISTENs to exactly the channels that currently have subscribers and fans
+    each NOTIFY out to their buffers. The connection is pinged every `keepalive_interval`
+    seconds; after a connection loss it reconnects with backoff and tells every subscriber
+    to resync, since notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, max_clients: int, keepalive_interval: float, **connect_kwargs):
+        self.max_clients = max_clients
+        self.keepalive_interval = keepalive_interval
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._client_count = 0
+        self._thread = None
+        self._closed = False
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+
+        self._connected = False
+        self._listening = 0
+        self._notifications = 0
+        self._delivered = 0
+        self._overflows = 0
+        self._reconnects = 0
+        self._rejected = 0
+
+    def subscribe(self, channel: str, max_buffer: int) -> Subscription:
+        """
+        Start buffering notifications of `channel` for a new client.
+        Raises ServiceUnavailableError when the process already serves `max_clients` clients.
+        """
+        subscription = Subscription(channel, max_buffer)
+        with self._lock:
+            if self._closed:
+                raise ServiceUnavailableError("Notification listener is closed.")
+            if self._client_count >= self.max_clients:
+                self._rejected += 1
+                raise ServiceUnavailableError("Too many event stream clients, try again later.")
+            self._subscribers.setdefault(channel, set()).add(subscription)
+            self._client_count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='notification-listener', daemon=True)
+                self._thread.start()
+        self._wake()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+            self._client_count -= 1
+        subscription.close()
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b'\0')
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wake_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _broadcast(self, event: str, payload: str = ''):
+        with self._lock:
+            subscriptions = [s for subscribers in self._subscribers.values() for s in subscribers]
+        for subscription in subscriptions:
+            subscription.put(event, payload)
+
+    def _dispatch(self, channel: str, payload: str):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(channel, ()))
+        overflows = sum(not subscription.put(channel, payload) for subscription in subscriptions)
+        with self._lock:
+            self._notifications += 1
+            self._delivered += len(subscriptions) - overflows
+            self._overflows += overflows
+
+    def _sync_channels(self, cursor, listening: Set[str]):
+        """LISTEN to newly subscribed channels and UNLISTEN from abandoned ones."""
+        with self._lock:
+            wanted = set(self._subscribers)
+        for channel in wanted - listening:
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        for channel in listening - wanted:
+            cursor.execute(sql.SQL("UNLISTEN {}").format(sql.Identifier(channel)))
+        listening.clear()
+        listening.update(wanted)
+        self._listening = len(wanted)
+
+    def _listen(self, conn):
+        listening = set()
+        last_activity = time.monotonic()
+        with conn.cursor() as cursor:
+            while not self._closed:
+                self._sync_channels(cursor, listening)
+
+                timeout = max(0.0, last_activity + self.keepalive_interval - time.monotonic())
+                readable, _, _ = select.select([conn, self._wake_read], [], [], timeout)
+                if self._wake_read in readable:
+                    self._drain_wakeups()
+                if conn in readable:
+                    conn.poll()
+                    last_activity = time.monotonic()
+                elif not readable:
+                    cursor.execute("SELECT 1")
+                    last_activity = time.monotonic()
+
+                # Notifications also arrive with the results of LISTEN and the keepalive query.
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self._dispatch(notify.channel, notify.payload)
+
+    def _run(self):
+        attempt = 0
+        while not self._closed:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self._connect_kwargs)
+                conn.autocommit = True
+                self._connected = True
+                if attempt:
+                    self._reconnects += 1
+                    # Anything sent while disconnected was lost.
+                    self._broadcast(RESYNC_EVENT)
+                attempt = 0
+                self._listen(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError, OSError) as e:
+                logger.warning(f"Notification listener lost its database connection: {e}")
+            except Exception:
+                logger.exception("Notification listener failed")
+            finally:
+                self._connected = False
+                self._listening = 0
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+            if not self._closed:
+                attempt += 1
+                time.sleep(min(30.0, 0.5 * 2 ** min(attempt, 6)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connected": self._connected,
+                "clients": self._client_count,
+                "max_clients": self.max_clients,
+                "channels": self._listening,
+                "notifications": self._notifications,
+                "delivered": self._delivered,
+                "overflows": self._overflows,
+                "rejected": self._rejected,
+                "reconnects": self._reconnects,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            subscriptions = [s for subscribers in self._subscribers.values() for s in subscribers]
+            self._subscribers.clear()
+            self._client_count = 0
+        for subscription in subscriptions:
+            subscription.close()
+        self._wake()
+
+
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def get_notification_listener() -> NotificationListener:
+    """
+    Return the process-wide notification listener, creating it on first use.
+    A forked child gets its own listener and connection instead of sharing the parent's.
+    """
+    global _listener, _listener_pid
+
+    pid = os.getpid()
+    if _listener is not None and _listener_pid == pid:
+        return _listener
+
+    with _listener_lock:
+        if _listener is None or _listener_pid != pid:
+            _listener = NotificationListener(
+                max_clients=config.TODO_EVENTS_MAX_CLIENTS,
+                keepalive_interval=config.TODO_EVENTS_HEARTBEAT_SECONDS,
+                host=config.POSTGRES_HOST,
+                port=int(config.POSTGRES_PORT),
+                user=config.POSTGRES_USER,
+                password=config.POSTGRES_PASSWORD,
+                database=config.POSTGRES_DB,
+            )
+            _listener_pid = pid
+    return _listener
+
+
+def get_notification_listener_stats() -> Optional[dict]:
+    """Statistics of the process-wide notification listener, or None when this process has not created it."""
+    instance = _listener
+    if instance is None or _listener_pid != os.getpid():
+        return None
+    return instance.stats()
@@ -18,3 +18,21 @@ class OrganizationRepository(BaseRepository):
         with self.adapter:
             results = self.adapter.execute_query(query, params)
             return results
+
+    def get_organizations_validator_by_person_id(self, person_id: str):
+        """
+        Cheap fingerprint of `get_organizations_by_person_id`: the row count and a sum of the
+        organization and role version hashes, which change on every save of either.
+        """
+        query = """
+            SELECT count(*) AS count, coalesce(sum(hashtext(o.version || por.version)), 0) AS version_hash
+            FROM organization AS o
+            JOIN person_organization_role AS por
+            ON o.entity_id = por.organization_id
+            WHERE por.person_id = %s;
+        """
+        params = (person_id,)
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+            return results[0]['count'], results[0]['version_hash']
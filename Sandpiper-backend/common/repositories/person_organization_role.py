@@ -1,6 +1,64 @@
+from typing import Dict, List, Tuple
+
 from common.repositories.base import BaseRepository
 from common.models.person_organization_role import PersonOrganizationRole
 
 
 class PersonOrganizationRoleRepository(BaseRepository):
     MODEL = PersonOrganizationRole
+
+    def get_memberships_by_person_id(self, person_id: str) -> Tuple[int, Dict[str, str]]:
+        """
+        A person's membership version and active roles as {organization_id: role}.
+        Both are read by one statement, so the roles are never newer than the version.
+        """
+        query = """
+            SELECT v.version, por.organization_id, por.role
+            FROM (
+                SELECT coalesce((SELECT version FROM person_membership_version WHERE person_id = %s), 0) AS version
+            ) AS v
+            LEFT JOIN (
+                person_organization_role AS por
+                JOIN organization AS o ON o.entity_id = por.organization_id AND o.active
+            ) ON por.person_id = %s AND por.active;
+        """
+        params = (person_id, person_id)
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+            memberships = {row['organization_id']: row['role'] for row in results if row['organization_id']}
+            return results[0]['version'], memberships
+
+    def get_membership_version(self, person_id: str) -> int:
+        query = "SELECT version FROM person_membership_version WHERE person_id = %s;"
+        params = (person_id,)
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+            return results[0]['version'] if results else 0
+
+    def bump_membership_version(self, person_id: str):
+        """Mark every access token issued to the person so far as having stale memberships."""
+        query = """
+            INSERT INTO person_membership_version (person_id, version) VALUES (%s, 1)
+            ON CONFLICT (person_id) DO UPDATE SET version = person_membership_version.version + 1
+        """
+        self._write(query, (person_id,))
+
+    def get_member_ids(self, organization_id: str) -> List[str]:
+        """Ids of the people with an active role in the organization."""
+        query = "SELECT DISTINCT person_id FROM person_organization_role WHERE organization_id = %s AND active;"
+        params = (organization_id,)
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+            return [row['person_id'] for row in results]
+
+    def bump_organization_membership_versions(self, organization_id: str):
+        """`bump_membership_version` for every person with an active role in the organization, in one statement."""
+        query = """
+            INSERT INTO person_membership_version (person_id, version)
+            SELECT DISTINCT person_id, 1 FROM person_organization_role WHERE organization_id = %s AND active
+            ON CONFLICT (person_id) DO UPDATE SET version = person_membership_version.version + 1
+        """
+        self._write(query, (organization_id,))
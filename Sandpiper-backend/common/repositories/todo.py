@@ -1,10 +1,43 @@
-from typing import List, Optional
-import psycopg2
+import io
+import json
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 
-from common.models import Todo
+from psycopg2.extras import execute_values
+from rococo.models.versioned_model import get_uuid_hex
+
+from common.models import Todo, TodoRow
 from common.repositories.base import BaseRepository
-from common.app_config import get_config
+from common.repositories.connection_pool import get_connection_pool
+from common.repositories.identity_map import get_identity_map
+
+
+TODO_COLUMNS = (
+    'entity_id', 'version', 'previous_version', 'active', 'changed_by_id', 'changed_on',
+    'person_id', 'title', 'description', 'is_completed', 'due_date'
+)
+
+TODO_CHANNEL_PREFIX = 'todo_'
+
+# Identity map key of todos read as TodoRow, kept apart from the Todo models `get_one` returns
+TODO_ROW_KEY = 'todo_row'
+
+
+def todo_channel(person_id: str) -> str:
+    """Name of the NOTIFY channel that announces changes to a person's todos"""
+    return f"{TODO_CHANNEL_PREFIX}{person_id}"
+
+
+def _copy_value(value) -> str:
+    """Render a value for COPY ... FROM STDIN in the default text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
 
 
 class TodoRepository(BaseRepository):
@@ -13,101 +46,152 @@ class TodoRepository(BaseRepository):
     """
     MODEL = Todo
 
-    def _get_db_connection(self):
-        """Get direct database connection"""
-        config = get_config()
-        return psycopg2.connect(
-            host=config.POSTGRES_HOST,
-            port=config.POSTGRES_PORT,
-            user=config.POSTGRES_USER,
-            password=config.POSTGRES_PASSWORD,
-            database=config.POSTGRES_DB
-        )
-
-    def _row_to_todo(self, row) -> Todo:
-        """Convert database row to Todo object"""
-        if not row:
-            return None
-        
-        return Todo(
-            entity_id=row[0],
-            version=row[1],
-            previous_version=row[2],
-            active=row[3],
-            changed_by_id=row[4],
-            changed_on=row[5],
-            person_id=row[6],
-            title=row[7],
-            description=row[8],
-            is_completed=row[9],
-            due_date=row[10]
-        )
-
-    def get_todos_by_person_id(self, person_id: str) -> List[Todo]:
+    def get_todos_by_person_id(self, person_id: str) -> List[TodoRow]:
         """
         Get all todos for a specific person.
         """
         if not person_id:
             return []
         
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self._get_cursor() as cursor:
             cursor.execute("""
                 SELECT entity_id, version, previous_version, active, changed_by_id, changed_on,
                        person_id, title, description, is_completed, due_date
                 FROM todo 
                 WHERE person_id = %s AND active = true
-                ORDER BY changed_on DESC
+                ORDER BY changed_on DESC, entity_id
             """, (person_id,))
             
-            rows = cursor.fetchall()
-            todos = [self._row_to_todo(row) for row in rows]
-            return [todo for todo in todos if todo]  # Filter out None values
-            
-        finally:
-            cursor.close()
-            conn.close()
+            return list(map(TodoRow._make, cursor.fetchall()))
 
-    def get_todos_by_person_id_and_status(self, person_id: str, is_completed: bool) -> List[Todo]:
+    def get_todos_by_person_id_and_status(self, person_id: str, is_completed: bool) -> List[TodoRow]:
         """
         Get todos for a specific person filtered by completion status.
         """
         if not person_id:
             return []
         
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self._get_cursor() as cursor:
             cursor.execute("""
                 SELECT entity_id, version, previous_version, active, changed_by_id, changed_on,
                        person_id, title, description, is_completed, due_date
                 FROM todo 
                 WHERE person_id = %s AND active = true AND is_completed = %s
-                ORDER BY changed_on DESC
+                ORDER BY changed_on DESC, entity_id
             """, (person_id, is_completed))
             
-            rows = cursor.fetchall()
-            todos = [self._row_to_todo(row) for row in rows]
-            return [todo for todo in todos if todo]  # Filter out None values
-            
-        finally:
-            cursor.close()
-            conn.close()
+            return list(map(TodoRow._make, cursor.fetchall()))
+
+    def get_todos_page(self, person_id: str, limit: int, is_completed: Optional[bool] = None,
+                       after: Optional[Tuple[datetime, str]] = None) -> List[TodoRow]:
+        """
+        Get one page of a person's todos using keyset pagination.
+
+        Rows are ordered by (changed_on DESC, entity_id), matching the composite
+        todo index, so every page is a range scan no matter how deep it is.
+        `after` is the (changed_on, entity_id) sort key of the last row of the previous page.
+        """
+        if not person_id:
+            return []
+
+        conditions = ["person_id = %s", "active = true"]
+        params = [person_id]
+
+        if is_completed is not None:
+            conditions.append("is_completed = %s")
+            params.append(is_completed)
+
+        if after is not None:
+            # The redundant `changed_on <= %s` bound lets the planner start the index scan at the cursor.
+            conditions.append("changed_on <= %s AND (changed_on < %s OR entity_id > %s)")
+            params.extend([after[0], after[0], after[1]])
+
+        params.append(limit)
+
+        with self._get_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT entity_id, version, previous_version, active, changed_by_id, changed_on,
+                       person_id, title, description, is_completed, due_date
+                FROM todo
+                WHERE {' AND '.join(conditions)}
+                ORDER BY changed_on DESC, entity_id
+                LIMIT %s
+            """, params)
+
+            return list(map(TodoRow._make, cursor.fetchall()))
+
+    def get_todo_changes(self, person_id: str, limit: int, since: Optional[datetime] = None,
+                         after: Optional[Tuple[datetime, str]] = None,
+                         include_deleted: bool = True) -> List[TodoRow]:
+        """
+        Get a person's todos in the order they last changed, soft-deleted ones included.
+
+        `since` starts at the first change at or after that time, `after` continues strictly after
+        a (changed_on, entity_id) position; without either, the scan starts at the oldest change.
+        Served by the (person_id, changed_on, entity_id) index.
+        """
+        conditions = ["person_id = %s"]
+        params = [person_id]
+
+        if after is not None:
+            conditions.append("(changed_on, entity_id) > (%s, %s)")
+            params.extend(after)
+        elif since is not None:
+            conditions.append("changed_on >= %s")
+            params.append(since)
+
+        if not include_deleted:
+            conditions.append("active = true")
+
+        params.append(limit)
+
+        with self._get_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT entity_id, version, previous_version, active, changed_by_id, changed_on,
+                       person_id, title, description, is_completed, due_date
+                FROM todo
+                WHERE {' AND '.join(conditions)}
+                ORDER BY changed_on, entity_id
+                LIMIT %s
+            """, params)
+
+            return list(map(TodoRow._make, cursor.fetchall()))
+
+    def get_todos_validator(self, person_id: str, is_completed: Optional[bool] = None) -> Tuple[int, int]:
+        """
+        Cheap fingerprint of a person's active todo list: the row count and a sum of version hashes.
+
+        Every write gives a todo a new version, so the fingerprint changes whenever the list
+        returned by `get_todos_by_person_id(_and_status)` would, without fetching it.
+        """
+        conditions = ["person_id = %s", "active = true", "title <> ''"]
+        params = [person_id]
+        if is_completed is not None:
+            conditions.append("is_completed = %s")
+            params.append(is_completed)
+
+        with self._get_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT count(*), coalesce(sum(hashtext(version)), 0)
+                FROM todo
+                WHERE {' AND '.join(conditions)}
+            """, params)
+            return cursor.fetchone()
 
-    def get_todo_by_id(self, entity_id: str) -> Optional[Todo]:
+    def get_todo_by_id(self, entity_id: str) -> Optional[TodoRow]:
         """
         Get a todo by its ID.
         """
         if not entity_id:
             return None
+
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            todo = identity_map.get(TODO_ROW_KEY, {'entity_id': entity_id})
+            if todo is not None:
+                return todo
         
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self._get_cursor() as cursor:
             cursor.execute("""
                 SELECT entity_id, version, previous_version, active, changed_by_id, changed_on,
                        person_id, title, description, is_completed, due_date
@@ -116,11 +200,154 @@ class TodoRepository(BaseRepository):
             """, (entity_id,))
             
             row = cursor.fetchone()
-            return self._row_to_todo(row)
-            
-        finally:
-            cursor.close()
-            conn.close()
+            todo = TodoRow._make(row) if row else None
+
+        if identity_map is not None and todo is not None:
+            identity_map.add(TODO_ROW_KEY, {'entity_id': entity_id}, todo)
+        return todo
+
+    def _update_todo_rows(self, todos: Iterable[TodoRow]):
+        """Record written todos in the request's identity map, in both shapes todos are read in"""
+        identity_map = get_identity_map()
+        if identity_map is None:
+            return
+        for todo in todos:
+            identity_map.evict(self.table_name, todo.entity_id)
+            self._update_identity_map(todo, TODO_ROW_KEY)
+
+    def iter_todo_rows(self, person_id: str, batch_size: int,
+                       include_history: bool = False) -> Iterator[List[tuple]]:
+        """
+        Stream a person's todos from a server-side cursor, `batch_size` rows at a time.
+
+        Rows are tuples in TODO_COLUMNS order. Only the current active todos are returned
+        unless `include_history` is set, in which case every version is returned (deleted
+        todos and the todo_audit copies included) with an extra trailing `is_current` flag,
+        ordered by entity_id and then changed_on.
+
+        The pool connection is held until the generator is exhausted or closed.
+        """
+        if not person_id:
+            return
+
+        columns = ', '.join(TODO_COLUMNS)
+        if include_history:
+            query = f"""
+                SELECT {columns}, true AS is_current FROM todo WHERE person_id = %s
+                UNION ALL
+                SELECT {columns}, false AS is_current FROM todo_audit WHERE person_id = %s
+                ORDER BY entity_id, changed_on, is_current
+            """
+            params = (person_id, person_id)
+        else:
+            query = f"""
+                SELECT {columns} FROM todo
+                WHERE person_id = %s AND active = true
+                ORDER BY changed_on DESC, entity_id
+            """
+            params = (person_id,)
+
+        with get_connection_pool().connection() as conn:
+            # A named cursor keeps the result set on the server; it needs an open transaction.
+            with conn.cursor(name=f"todo_export_{get_uuid_hex()}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    @staticmethod
+    def _notify_person(cursor, person_id: str, count: int):
+        """Announce changed todos on the person's channel; delivered when the transaction commits"""
+        cursor.execute("SELECT pg_notify(%s, %s)", (todo_channel(person_id), json.dumps({'count': count})))
+
+    def _update_owned_todos(self, cursor, person_id: str, changes: List[Dict],
+                            changed_on: datetime, changed_by_id: str, notify: bool = True) -> Dict[str, TodoRow]:
+        """
+        Change many of a person's todos with a single statement.
+
+        `changes` are dicts with the keys entity_id, title, description, is_completed, toggle,
+        due_date and active; a missing or None value leaves the field unchanged. The statement
+        locks the matching rows, copies their current version to todo_audit, then bumps the
+        version and applies the change, so concurrent writers cannot lose each other's updates.
+        Rows that do not exist, are inactive or belong to another person are skipped.
+        With `notify`, the same statement announces the changes on the person's channel.
+
+        Returns a mapping of entity_id to updated todo.
+        """
+        rows = [(
+            change['entity_id'], person_id, change.get('title'), change.get('description'),
+            change.get('is_completed'), bool(change.get('toggle')), change.get('due_date'),
+            change.get('active', True), get_uuid_hex(), changed_on, changed_by_id
+        ) for change in changes]
+
+        updated_rows = execute_values(cursor, f"""
+            WITH v (entity_id, person_id, title, description, is_completed, toggle, due_date,
+                    active, version, changed_on, changed_by_id) AS (
+                VALUES %s
+            ),
+            locked AS (
+                SELECT todo.* FROM todo
+                JOIN v ON v.entity_id = todo.entity_id AND v.person_id = todo.person_id
+                WHERE todo.active = true
+                FOR UPDATE OF todo
+            ),
+            audit AS (
+                INSERT INTO todo_audit SELECT * FROM locked
+            ),
+            updated AS (
+                UPDATE todo AS t SET
+                    title = COALESCE(v.title, l.title),
+                    description = COALESCE(v.description, l.description),
+                    is_completed = CASE WHEN v.toggle THEN NOT l.is_completed
+                                        ELSE COALESCE(v.is_completed, l.is_completed) END,
+                    due_date = COALESCE(v.due_date, l.due_date),
+                    active = v.active,
+                    previous_version = l.version,
+                    version = v.version,
+                    changed_on = v.changed_on,
+                    changed_by_id = v.changed_by_id
+                FROM locked AS l
+                JOIN v ON v.entity_id = l.entity_id
+                WHERE t.entity_id = l.entity_id
+                RETURNING t.entity_id, t.version, t.previous_version, t.active, t.changed_by_id, t.changed_on,
+                          t.person_id, t.title, t.description, t.is_completed, t.due_date
+            ),
+            notified AS (
+                SELECT pg_notify('{TODO_CHANNEL_PREFIX}' || person_id, json_build_object('count', count(*))::text)
+                FROM updated
+                WHERE {'true' if notify else 'false'}
+                GROUP BY person_id
+            )
+            SELECT updated.* FROM updated LEFT JOIN notified ON true
+        """, rows, template="""(%s, %s, %s::varchar, %s::text, %s::boolean, %s::boolean, %s::timestamp,
+                               %s::boolean, %s, %s::timestamp, %s)""",
+            page_size=len(rows), fetch=True)
+        return {row[0]: TodoRow._make(row) for row in updated_rows}
+
+    def update_todo_for_person(self, entity_id: str, person_id: str, title: Optional[str] = None,
+                               description: Optional[str] = None, is_completed: Optional[bool] = None,
+                               due_date: Optional[datetime] = None, toggle: bool = False,
+                               active: bool = True) -> Optional[TodoRow]:
+        """
+        Update, toggle or soft-delete one of a person's todos in a single round trip.
+        Returns None when the todo does not exist, is inactive or belongs to someone else.
+        """
+        if not entity_id or not person_id:
+            return None
+
+        change = {
+            'entity_id': entity_id, 'title': title, 'description': description,
+            'is_completed': is_completed, 'due_date': due_date, 'toggle': toggle, 'active': active
+        }
+        with self._get_cursor(autocommit=True) as cursor:
+            updated = self._update_owned_todos(
+                cursor, person_id, [change], datetime.utcnow(), self.user_id or person_id
+            )
+        self._update_todo_rows(updated.values())
+        return updated.get(entity_id)
 
     def save_todo(self, todo: Todo) -> Todo:
         """
@@ -134,4 +361,99 @@ class TodoRepository(BaseRepository):
         
         # For now, use the original Rococo save method for saving
         # The issue is only with retrieval, not with saving
-        return self.save(todo)
+        saved = self.save(todo)
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.evict(TODO_ROW_KEY, todo.entity_id)
+        with self._get_cursor(autocommit=True) as cursor:
+            self._notify_person(cursor, todo.person_id, 1)
+        return saved
+
+    def apply_batch(self, person_id: str, new_todos: List[Tuple],
+                    changes: List[Dict]) -> Tuple[List[TodoRow], Dict[str, TodoRow]]:
+        """
+        Create and modify many of a person's todos in a single transaction.
+
+        `new_todos` are validated (title, description, is_completed, due_date) tuples, as for
+        `copy_todos`, inserted with one multi-row INSERT; `changes` (see `_update_owned_todos`)
+        are applied with one UPDATE that also writes their audit rows.
+        Listeners get a single notification for the whole batch when it commits.
+
+        Returns the created todos, in the order of `new_todos`, and a mapping of entity_id to updated todo.
+        """
+        changed_by_id = self.user_id or person_id
+        changed_on = datetime.utcnow()
+        created, updated = [], {}
+
+        with self._transaction() as cursor:
+            if new_todos:
+                previous_version = get_uuid_hex(0)
+                rows = [
+                    (get_uuid_hex(), get_uuid_hex(), previous_version, True, changed_by_id, changed_on,
+                     person_id, title, description, bool(is_completed), due_date)
+                    for title, description, is_completed, due_date in new_todos
+                ]
+
+                created_rows = execute_values(cursor, """
+                    INSERT INTO todo (entity_id, version, previous_version, active, changed_by_id, changed_on,
+                                      person_id, title, description, is_completed, due_date)
+                    VALUES %s
+                    RETURNING entity_id, version, previous_version, active, changed_by_id, changed_on,
+                              person_id, title, description, is_completed, due_date
+                """, rows, page_size=len(rows), fetch=True)
+                # RETURNING does not promise the VALUES order
+                created_by_id = {row[0]: TodoRow._make(row) for row in created_rows}
+                created = [created_by_id[row[0]] for row in rows]
+
+            if changes:
+                updated = self._update_owned_todos(cursor, person_id, changes, changed_on, changed_by_id,
+                                                   notify=False)
+
+            if created or updated:
+                self._notify_person(cursor, person_id, len(created) + len(updated))
+
+        self._update_todo_rows(updated.values())
+        return created, updated
+
+    def copy_todos(self, person_id: str, batches: Iterable[List[Tuple]],
+                   on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Insert a stream of new todos for a person with COPY FROM STDIN, one COPY per batch.
+
+        Each row is a validated (title, description, is_completed, due_date) tuple; plain
+        tuples keep the per-row cost far below building a model. Ids and versions are
+        generated here. Every batch is loaded in the same transaction, so an import either
+        lands completely or not at all. New rows have no earlier version, so, as with `save`,
+        nothing is written to todo_audit. Listeners are notified once, when the import commits.
+        `on_batch` is called with the running total after each batch is copied.
+
+        Returns the number of todos inserted.
+        """
+        changed_by_id = self.user_id or person_id
+        # Values shared by every row are rendered once.
+        row_suffix = '\t'.join(map(_copy_value, (
+            get_uuid_hex(0), True, changed_by_id, datetime.utcnow(), person_id
+        )))
+        copy_sql = f"COPY todo ({', '.join(TODO_COLUMNS)}) FROM STDIN"
+        total = 0
+
+        with self._transaction() as cursor:
+            for rows in batches:
+                if not rows:
+                    continue
+                buffer = io.StringIO()
+                for title, description, is_completed, due_date in rows:
+                    buffer.write(f"{get_uuid_hex()}\t{get_uuid_hex()}\t{row_suffix}\t{_copy_value(title)}\t"
+                                 f"{_copy_value(description)}\t{_copy_value(bool(is_completed))}\t"
+                                 f"{_copy_value(due_date)}\n")
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+
+                total += len(rows)
+                if on_batch:
+                    on_batch(total)
+
+            if total:
+                self._notify_person(cursor, person_id, total)
+
+        return total
@@ -0,0 +1,142 @@
+import json
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from common.app_logger import logger
+from common.repositories.connection_pool import get_connection_pool
+
+_current_unit_of_work: ContextVar[Optional['UnitOfWork']] = ContextVar('unit_of_work', default=None)
+
+
+def get_current_unit_of_work() -> Optional['UnitOfWork']:
+    """The unit of work active on this thread, or None."""
+    return _current_unit_of_work.get()
+
+
+def on_commit(callback: Callable[[], None]):
+    """
+    Run `callback` once the current unit of work commits, or right away when there is none.
+    For side effects such as cache invalidation that must not happen for writes that roll back.
+    """
+    unit_of_work = get_current_unit_of_work()
+    if unit_of_work is None:
+        callback()
+    else:
+        unit_of_work.after_commit(callback)
+
+
+class UnitOfWork:
+    """
+    Makes the writes of every repository inside it one transaction on one pooled connection:
+
+        with UnitOfWork():
+            person_service.save_person(person)
+            email_service.save_email(email)
+
+    Model saves and statements sent with `BaseRepository._write` are queued and sent in a single
+    round trip when the block ends, with the audit-table copies of each table batched into one
+    INSERT, then committed. An exception inside the block discards everything. Statements run
+    through `BaseRepository._transaction` join the transaction (after the queue is sent).
+    Reads through the repositories' adapters use other connections, so they do not see writes
+    queued here until the block ends. The connection is only checked out once something is sent,
+    so none is held while models are built. A unit of work started inside another one joins it.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._cursor = None
+        self._token = None
+        self._joined: Optional['UnitOfWork'] = None
+
+        self._audits: Dict[str, List[str]] = {}  # table -> entity ids to copy to its audit table, in order
+        self._statements: List[Tuple[str, tuple]] = []
+        self._queued_entities = set()
+        self._after_commit: List[Callable[[], None]] = []
+
+    def __enter__(self):
+        outer = get_current_unit_of_work()
+        if outer is not None:
+            self._joined = outer
+            return outer
+
+        self._token = _current_unit_of_work.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._joined is not None:
+            return False
+
+        _current_unit_of_work.reset(self._token)
+        committed = False
+        try:
+            if exc_type is None:
+                self.flush()
+                if self._connection is not None:
+                    self._connection.commit()
+                committed = True
+        finally:
+            if self._connection is not None:
+                self._cursor.close()
+                # Rolls back whatever was not committed, and discards a broken connection
+                get_connection_pool().putconn(self._connection)
+                self._connection = self._cursor = None
+
+        if committed:
+            for callback in self._after_commit:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Callback after unit of work commit failed")
+        return False
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = get_connection_pool().getconn()
+            self._cursor = self._connection.cursor()
+
+    @property
+    def cursor(self):
+        """Cursor of the unit of work's connection, with every queued write already sent."""
+        self.flush()
+        self._connect()
+        return self._cursor
+
+    def queue_save(self, table: str, entity_id: str, save_query: Tuple[str, tuple]):
+        """
+        Queue a model save: the current row is copied to `table`_audit, then `save_query` upserts the new one.
+        """
+        entity_id = str(entity_id).replace('-', '')
+        if (table, entity_id) in self._queued_entities:
+            # The audit copy must see the version saved first, so send that one now
+            self.flush()
+        self._queued_entities.add((table, entity_id))
+        self._audits.setdefault(table, []).append(entity_id)
+        self._statements.append(save_query)
+
+    def queue_statement(self, query: str, values: tuple = ()):
+        self._statements.append((query, values))
+
+    def after_commit(self, callback: Callable[[], None]):
+        self._after_commit.append(callback)
+
+    def flush(self):
+        """Send every queued write in one round trip, audit copies first, without committing."""
+        if not self._statements:
+            return
+
+        statements = [
+            (f"INSERT INTO {table}_audit (SELECT * FROM {table} WHERE entity_id = ANY(%s))", (entity_ids,))
+            for table, entity_ids in self._audits.items()
+        ]
+        statements.extend(self._statements)
+        self._audits.clear()
+        self._statements.clear()
+        self._queued_entities.clear()
+
+        self._connect()
+        mogrify = self._cursor.mogrify
+        self._cursor.execute(b";\n".join(
+            # Dicts are stored as JSON, as PostgreSQLAdapter.run_transaction does
+            mogrify(query, [json.dumps(value) if isinstance(value, dict) else value for value in values])
+            for query, values in statements
+        ))
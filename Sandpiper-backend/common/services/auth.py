@@ -1,7 +1,10 @@
+import hashlib
+import secrets
 import time
+from datetime import datetime, timedelta
 
 import jwt
-from werkzeug.security import check_password_hash
+from rococo.models.versioned_model import get_uuid_hex
 
 from common.services import (
     PersonService, EmailService, LoginMethodService, OrganizationService,
@@ -9,41 +12,38 @@ from common.services import (
 )
 from common.models import Person, Email, LoginMethod, Organization, PersonOrganizationRole
 from common.models.login_method import LoginMethodType
-from common.tasks.send_message import MessageSender
+from common.repositories.unit_of_work import UnitOfWork
 from common.app_logger import logger
-from common.services.mailjet_service import MailjetService
 
 from common.helpers.string_utils import urlsafe_base64_encode, force_bytes
 from common.helpers.string_utils import force_str, urlsafe_base64_decode
-from common.helpers.exceptions import InputValidationError, APIException
+from common.helpers.exceptions import InputValidationError, APIException, ServiceUnavailableError
 from common.helpers.auth import generate_access_token
+from common.helpers.password_hasher import get_password_hasher
+from common.helpers.token_revocation import get_token_revocation_list
 
 
 class AuthService:
     def __init__(self, config):
         self.config = config
 
-        self.EMAIL_TRANSMITTER_QUEUE_NAME = config.QUEUE_NAME_PREFIX + config.EMAIL_SERVICE_PROCESSOR_QUEUE_NAME
-        
         self.person_service = PersonService(config)
         self.email_service = EmailService(config)
         self.login_method_service = LoginMethodService(config)
         self.organization_service = OrganizationService(config)
         self.person_organization_role_service = PersonOrganizationRoleService(config)
 
-        self.message_sender = MessageSender()
-        self.mailjet_service = MailjetService()
-
     def signup(self, email, first_name, last_name):
+        existing_email = self.email_service.get_email_by_email_address(email)
+        if existing_email:
+            raise InputValidationError("The email address you provided is already registered.")
+
+        # Hashed after the duplicate check, so rejected signups cost no hashing
         login_method = LoginMethod(
             method_type=LoginMethodType.EMAIL_PASSWORD,
             raw_password=self.config.DEFAULT_USER_PASSWORD
         )
 
-        existing_email = self.email_service.get_email_by_email_address(email)
-        if existing_email:
-            raise InputValidationError("The email address you provided is already registered.")
-
         person = Person(first_name=first_name, last_name=last_name)
 
         email = Email(person_id=person.entity_id, email=email)
@@ -52,25 +52,29 @@ class AuthService:
             name=f"{first_name}'s Organization"
         )
 
-        # Save person and email first to get their entity_ids
-        person = self.person_service.save_person(person)
-        email = self.email_service.save_email(email)
-        
-        # Now set the login_method relationships with the saved entity_ids
-        login_method.person_id = person.entity_id
-        login_method.email_id = email.entity_id
-
-        person_organization_role = PersonOrganizationRole(
-            person_id=person.entity_id,
-            organization_id=organization.entity_id,
-            role="admin"
-        )
+        # One transaction, so a failure part-way leaves no half-created account
+        with UnitOfWork():
+            # Save person and email first to get their entity_ids
+            person = self.person_service.save_person(person)
+            email = self.email_service.save_email(email)
+
+            # Now set the login_method relationships with the saved entity_ids
+            login_method.person_id = person.entity_id
+            login_method.email_id = email.entity_id
+
+            person_organization_role = PersonOrganizationRole(
+                person_id=person.entity_id,
+                organization_id=organization.entity_id,
+                role="admin"
+            )
+
+            login_method = self.login_method_service.save_login_method(login_method)
 
-        login_method = self.login_method_service.save_login_method(login_method)
+            self.organization_service.save_organization(organization)
+            self.person_organization_role_service.save_person_organization_role(person_organization_role)
 
-        self.organization_service.save_organization(organization)
-        self.person_organization_role_service.save_person_organization_role(person_organization_role)
-        self.send_welcome_email(login_method, person, email.email)
+            # Queued in the outbox with the account, so it is sent if and only if the account exists
+            self.send_welcome_email(login_method, person, email.email)
 
     def generate_reset_password_token(self, login_method: LoginMethod, email: str):
         person_id, email_id = login_method.person_id, login_method.email_id
@@ -93,52 +97,150 @@ class AuthService:
         return password_reset_url
 
     def send_welcome_email(self, login_method: LoginMethod, person: Person, email: str):
+        """Queue the welcome email in the outbox; the email outbox relay sends it after the commit."""
         if confirmation_link := self.prepare_password_reset_url(login_method, email):
-            # First try direct Mailjet service
-            recipient_name = f"{person.first_name} {person.last_name}".strip()
-            success = self.mailjet_service.send_welcome_email(
-                to_email=email,
-                confirmation_link=confirmation_link,
-                recipient_name=recipient_name
-            )
-            
-            logger.info(f"Welcome email direct send to {email}: {'Success' if success else 'Failed'}")
+            self.email_service.queue_email({
+                "event": "WELCOME_EMAIL",
+                "data": {
+                    "confirmation_link": confirmation_link,
+                    "recipient_name": f"{person.first_name} {person.last_name}".strip(),
+                },
+                "to_emails": [email],
+            })
+            logger.info(f"Welcome email to {email} queued")
             logger.info(f"Confirmation link: {confirmation_link}")
-            
-            # Fallback to queue if direct send fails
-            if not success:
-                message = {
-                    "event": "WELCOME_EMAIL",
-                    "data": {
-                        "confirmation_link": confirmation_link,
-                        "recipient_name": recipient_name,
-                    },
-                    "to_emails": [email],
-                }
-                self.message_sender.send_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message)
 
     def login_user_by_email_password(self, email: str, password: str):
-        email_obj = self.email_service.get_email_by_email_address(email)
+        """
+        Check an email and password and start a session.
+        The email, login method, person and memberships are read by one query.
 
-        if not email_obj:
+        Returns (access_token, expiry, person, refresh_token, refresh_token_expiry).
+        """
+        identity = self.login_method_service.get_login_identity_by_email(email)
+
+        if not identity:
             raise InputValidationError("Email is not registered.")
-        
-        login_method = self.login_method_service.get_login_method_by_email_id(email_obj.entity_id)
+
+        email_obj, login_method, person, membership_version, memberships = identity
 
         if not login_method:
             raise InputValidationError("Login method not found for this email address.")
         
-        if not check_password_hash(login_method.password, password):
+        password_hasher = get_password_hasher()
+        if not password_hasher.verify(login_method.password, password):
             raise InputValidationError('Incorrect email or password.')
 
-        person = self.person_service.get_person_by_id(login_method.person_id)
+        if password_hasher.needs_rehash(login_method.password):
+            # Upgrade hashes made with older parameters while the plain password is at hand
+            try:
+                login_method = self.login_method_service.update_password(login_method, password_hasher.hash(password))
+            except ServiceUnavailableError as e:
+                logger.warning(f"Skipped rehashing password of login method {login_method.entity_id}: {e}")
 
-        if not person or not email:
+        if not person:
             raise InputValidationError("Could not find complete user profile for this link.")
 
-        access_token, expiry = generate_access_token(login_method, person=person, email=email_obj)
+        jti = get_uuid_hex()
+        access_token, expiry = generate_access_token(
+            login_method, person=person, email=email_obj,
+            memberships=memberships, membership_version=membership_version, jti=jti
+        )
+        refresh_token, refresh_token_expiry = self.issue_refresh_token(login_method, jti, expiry)
+
+        return access_token, expiry, person, refresh_token, refresh_token_expiry
+
+    @staticmethod
+    def _hash_refresh_token(refresh_token: str) -> str:
+        # Refresh tokens are random 256-bit values, so a fast hash is enough to keep them unusable if the table leaks.
+        return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+    def issue_refresh_token(self, login_method: LoginMethod, access_jti: str, access_expiry: float):
+        """
+        Start a session: a refresh token valid for REFRESH_TOKEN_EXPIRE seconds that `refresh_access_token`
+        keeps exchanging for new tokens until REFRESH_SESSION_MAX_AGE has passed since this login.
+        The access token issued with it (`access_jti`, expiring at Unix time `access_expiry`) is revoked with the session.
+
+        Returns the token and its expiry as a Unix timestamp.
+        """
+        now = datetime.utcnow()
+        session_expires_at = now + timedelta(seconds=int(self.config.REFRESH_SESSION_MAX_AGE))
+        expires_at = min(now + timedelta(seconds=int(self.config.REFRESH_TOKEN_EXPIRE)), session_expires_at)
+
+        refresh_token = secrets.token_urlsafe(32)
+        self.login_method_service.create_refresh_token(
+            self._hash_refresh_token(refresh_token), get_uuid_hex(), login_method, now, expires_at, session_expires_at,
+            access_jti, datetime.utcfromtimestamp(access_expiry)
+        )
+        return refresh_token, time.time() + (expires_at - now).total_seconds()
+
+    def refresh_access_token(self, refresh_token: str):
+        """
+        Exchange a refresh token for a new access token and the next refresh token of the session.
+
+        The presented token is spent. Presenting a spent token again revokes its whole session,
+        since either the client or someone who copied the token already holds the successor.
+        No password is checked and only one statement is sent to the database.
+
+        Returns (access_token, expiry, refresh_token, refresh_token_expiry).
+        """
+        now = datetime.utcnow()
+        token_hash = self._hash_refresh_token(refresh_token)
+        new_refresh_token = secrets.token_urlsafe(32)
+        jti = get_uuid_hex()
+        expiry = time.time() + int(self.config.ACCESS_TOKEN_EXPIRE)
+        identity = self.login_method_service.rotate_refresh_token(
+            token_hash, self._hash_refresh_token(new_refresh_token), now,
+            now + timedelta(seconds=int(self.config.REFRESH_TOKEN_EXPIRE)), jti, datetime.utcfromtimestamp(expiry)
+        )
+
+        if not identity:
+            revoked = self.login_method_service.revoke_refresh_token_session(token_hash)
+            if revoked:
+                logger.warning("Spent refresh token presented again, its session was revoked")
+                self._apply_revocations(revoked)
+            raise InputValidationError("Refresh token is invalid or expired.")
 
-        return access_token, expiry
+        login_method = LoginMethod(
+            entity_id=identity['login_method_id'], person_id=identity['person_id'], email_id=identity['email_id']
+        )
+        person = Person(
+            entity_id=identity['person_id'], first_name=identity['first_name'], last_name=identity['last_name']
+        )
+        email = Email(
+            entity_id=identity['email_id'], person_id=identity['person_id'], email=identity['email'],
+            is_verified=identity['is_verified']
+        )
+        access_token, expiry = generate_access_token(
+            login_method, person=person, email=email,
+            memberships=identity['memberships'], membership_version=identity['membership_version'],
+            jti=jti, expiry=expiry
+        )
+
+        refresh_token_expiry = time.time() + (identity['expires_at'] - now).total_seconds()
+        return access_token, expiry, new_refresh_token, refresh_token_expiry
+
+    @staticmethod
+    def _apply_revocations(revoked_access_tokens):
+        # Other processes see the revocations at their next poll, this one right away
+        revocation_list = get_token_revocation_list()
+        for jti, expires_at in revoked_access_tokens:
+            revocation_list.add(jti, expires_at)
+
+    def logout(self, token_claims: dict, refresh_token: str = None):
+        """
+        Revoke the access token with these claims until it expires and, when given, the session of the refresh token.
+        """
+        jti = token_claims.get('jti')
+        if jti:
+            expires_at = datetime.utcfromtimestamp(token_claims['exp'])
+            self.login_method_service.revoke_access_token(jti, token_claims.get('person_id'), expires_at)
+            self._apply_revocations([(jti, expires_at)])
+
+        if refresh_token:
+            self._apply_revocations(self.login_method_service.revoke_refresh_token_session(
+                self._hash_refresh_token(refresh_token), spent_only=False
+            ))
 
     @staticmethod
     def parse_reset_password_token(token, login_method: LoginMethod):
@@ -166,26 +268,17 @@ class AuthService:
         self.send_password_reset_email(login_method, email=email_obj.email)
 
     def send_password_reset_email(self, login_method: LoginMethod, email: str):
+        """Queue the password reset email in the outbox; the email outbox relay sends it."""
         if password_reset_url := self.prepare_password_reset_url(login_method, email):
-            # First try direct Mailjet service
-            success = self.mailjet_service.send_password_reset_email(
-                to_email=email,
-                verify_link=password_reset_url
-            )
-            
-            logger.info(f"Password reset email direct send to {email}: {'Success' if success else 'Failed'}")
+            self.email_service.queue_email({
+                "event": "RESET_PASSWORD",
+                "data": {
+                    "verify_link": password_reset_url,  # Use verify_link to match Mailjet template
+                },
+                "to_emails": [email],
+            })
+            logger.info(f"Password reset email to {email} queued")
             logger.info(f"Password reset link: {password_reset_url}")
-            
-            # Fallback to queue if direct send fails
-            if not success:
-                message = {
-                    "event": "RESET_PASSWORD",
-                    "data": {
-                        "verify_link": password_reset_url,  # Use verify_link to match Mailjet template
-                    },
-                    "to_emails": [email],
-                }
-                self.message_sender.send_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message)
 
     def reset_user_password(self, token: str, uidb64: str, password: str):
         # Create new login method temporarily to validate and generate hashed password in its `password` field.`
@@ -214,9 +307,17 @@ class AuthService:
             raise APIException("Person with email not found.")
 
         login_method = self.login_method_service.update_password(login_method, new_login_method.password)
+        # Sessions started with the old password end with it, including their access tokens
+        self._apply_revocations(self.login_method_service.revoke_refresh_tokens(login_method.entity_id))
 
         email_obj = self.email_service.verify_email(email_obj)
 
-        access_token, expiry = generate_access_token(login_method, person=person_obj, email=email_obj)
+        membership_version, memberships = self.person_organization_role_service.get_memberships(person_obj.entity_id)
+        jti = get_uuid_hex()
+        access_token, expiry = generate_access_token(
+            login_method, person=person_obj, email=email_obj,
+            memberships=memberships, membership_version=membership_version, jti=jti
+        )
+        refresh_token, refresh_token_expiry = self.issue_refresh_token(login_method, jti, expiry)
 
-        return access_token, expiry, person_obj
\ No newline at end of file
+        return access_token, expiry, person_obj, refresh_token, refresh_token_expiry
\ No newline at end of file
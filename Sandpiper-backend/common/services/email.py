@@ -1,3 +1,5 @@
+from typing import Any, Dict, List, Tuple
+
 from common.repositories.factory import RepositoryFactory, RepoType
 from common.models import Email
 
@@ -24,3 +26,23 @@ class EmailService:
     def verify_email(self, email: Email) -> Email:
         email.is_verified = True
         return self.save_email(email)
+
+    def queue_email(self, message: Dict[str, Any]):
+        """
+        Send an email transmitter message ({"event", "data", "to_emails"}) through the outbox,
+        i.e. once the current transaction or unit of work commits.
+        """
+        self.email_repo.add_to_outbox(message['event'], message)
+
+    def claim_outbox_emails(self, limit: int, lease_seconds: float) -> List[Tuple[int, str, Dict[str, Any], int]]:
+        return self.email_repo.claim_outbox_emails(limit, lease_seconds)
+
+    def delete_outbox_emails(self, ids: List[int]):
+        if ids:
+            self.email_repo.delete_outbox_emails(ids)
+
+    def retry_outbox_email(self, email_id: int, delay_seconds: float, error: str):
+        self.email_repo.retry_outbox_email(email_id, delay_seconds, error)
+
+    def fail_outbox_email(self, email_id: int, error: str):
+        self.email_repo.fail_outbox_email(email_id, error)
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
 from common.repositories.factory import RepositoryFactory, RepoType
 from common.models import LoginMethod
 from common.models.login_method import LoginMethodType
@@ -18,6 +21,9 @@ class LoginMethodService:
         login_method = self.login_method_repo.get_one({"email_id": email_id, "method_type": LoginMethodType.EMAIL_PASSWORD})
         return login_method
     
+    def get_login_identity_by_email(self, email_address: str):
+        return self.login_method_repo.get_login_identity_by_email(email_address)
+
     def get_login_method_by_id(self, entity_id: str):
         login_method = self.login_method_repo.get_one({"entity_id": entity_id})
         return login_method
@@ -25,3 +31,30 @@ class LoginMethodService:
     def update_password(self, login_method: LoginMethod, password: str) -> LoginMethod:
         login_method.password = password
         return self.login_method_repo.save(login_method)
+
+    def create_refresh_token(self, token_hash: str, family_id: str, login_method: LoginMethod,
+                             now: datetime, expires_at: datetime, session_expires_at: datetime,
+                             access_jti: str, access_expires_at: datetime):
+        self.login_method_repo.create_refresh_token(token_hash, family_id, login_method, now, expires_at,
+                                                    session_expires_at, access_jti, access_expires_at)
+
+    def rotate_refresh_token(self, token_hash: str, new_token_hash: str, now: datetime, expires_at: datetime,
+                             access_jti: str, access_expires_at: datetime) -> Optional[Dict[str, Any]]:
+        return self.login_method_repo.rotate_refresh_token(token_hash, new_token_hash, now, expires_at,
+                                                           access_jti, access_expires_at)
+
+    def revoke_refresh_token_session(self, token_hash: str, spent_only: bool = True) -> List[Tuple[str, datetime]]:
+        return self.login_method_repo.revoke_refresh_token_session(token_hash, spent_only)
+
+    def revoke_refresh_tokens(self, login_method_id: str) -> List[Tuple[str, datetime]]:
+        return self.login_method_repo.revoke_refresh_tokens(login_method_id)
+
+    def revoke_access_token(self, jti: str, person_id: Optional[str], expires_at: datetime):
+        self.login_method_repo.revoke_access_token(jti, person_id, expires_at)
+
+    def get_revoked_tokens(self, revoked_since: Optional[datetime] = None
+                           ) -> Tuple[List[Tuple[str, datetime]], datetime]:
+        return self.login_method_repo.get_revoked_tokens(revoked_since)
+
+    def get_revoked_token_expiry(self, jti: str) -> Optional[datetime]:
+        return self.login_method_repo.get_revoked_token_expiry(jti)
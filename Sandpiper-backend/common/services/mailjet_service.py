@@ -1,134 +1,211 @@
+import os
+import threading
+
 import requests
-import json
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Any, Optional
 from common.app_config import config
 from common.app_logger import logger
 
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_mailjet_session() -> requests.Session:
+    """
+    Return the process-wide HTTP session for the Mailjet API, creating it on first use.
+    It keeps up to MAILJET_POOL_SIZE connections alive, so emails after the first skip the
+    TCP and TLS handshakes. A forked child opens its own connections.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            session = requests.Session()
+            session.auth = (config.MAILJET_API_KEY, config.MAILJET_API_SECRET)
+            # Not retried here: a send that timed out may have been delivered, callers decide
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.MAILJET_POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, pid
+    return _session
+
 
 class MailjetService:
     """
     Service for sending emails directly via Mailjet API.
     This bypasses the RabbitMQ queue for more reliable email delivery.
     """
-    API_VERSION = "v3.1"
-    BASE_URL = f"https://api.mailjet.com/{API_VERSION}"
-    
+    MAX_MESSAGES_PER_REQUEST = 50  # Mailjet's limit for the Messages of one send call
+
     def __init__(self):
-        self.api_key = config.MAILJET_API_KEY
-        self.api_secret = config.MAILJET_API_SECRET
+        self.base_url = config.MAILJET_API_URL  # the v3.1 API
+        self.timeout = (config.MAILJET_CONNECT_TIMEOUT, config.MAILJET_READ_TIMEOUT)
+        self.batch_size = max(1, min(config.MAILJET_BATCH_SIZE, self.MAX_MESSAGES_PER_REQUEST))
         self.source_email = "sample_project@ecortest.com"
         self.source_name = "Sandpiper"
-        
+
         # Template IDs from config
         self.welcome_template_id = 6410451  # Verify Email template
         self.reset_password_template_id = 6410454  # Reset Password template
-        
-    def _send_email(self, to_email: str, template_id: int, variables: Dict[str, Any], 
-                   subject: str, recipient_name: Optional[str] = None) -> bool:
+
+    def build_message(self, to_email: str, template_id: int, variables: Dict[str, Any],
+                      subject: str, recipient_name: Optional[str] = None) -> Dict[str, Any]:
         """
-        Send an email using Mailjet API.
-        
+        Build one entry of the Messages of a send call.
+
         Args:
             to_email: Recipient email address
             template_id: Mailjet template ID
             variables: Template variables
             subject: Email subject
             recipient_name: Optional recipient name
-            
+
         Returns:
-            bool: True if email was sent successfully, False otherwise
+            dict: The message, for `send_batch`
         """
-        url = f"{self.BASE_URL}/send"
-        
-        # Prepare recipient data
         recipient = {
             "Email": to_email
         }
         if recipient_name:
             recipient["Name"] = recipient_name
-            
-                    # Prepare payload
-        payload = {
-            "Messages": [
-                {
-                    "From": {
-                        "Email": self.source_email,
-                        "Name": self.source_name
-                    },
-                    "To": [recipient],
-                    "TemplateID": template_id,
-                    "TemplateLanguage": True,
-                    "Subject": subject,
-                    "Variables": variables
-                }
-            ]
+
+        return {
+            "From": {
+                "Email": self.source_email,
+                "Name": self.source_name
+            },
+            "To": [recipient],
+            "TemplateID": template_id,
+            "TemplateLanguage": True,
+            "Subject": subject,
+            "Variables": variables
         }
-        
-        # Log the email request (without sensitive data)
-        logger.info(f"Sending email to {to_email} using template {template_id}")
-        
-        logger.info(f"Payload: {payload}")
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Send many messages, up to MAILJET_BATCH_SIZE per API call, over the shared session.
+
+        Args:
+            messages: Messages built with `build_message`
+
+        Returns:
+            list: Whether Mailjet accepted each message, in the order given
+        """
+        results = []
+        for start in range(0, len(messages), self.batch_size):
+            results.extend(self._send_chunk(messages[start:start + self.batch_size]))
+        return results
+
+    def _send_chunk(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        # Recipients and templates only: the variables hold links that must not end up in logs
+        logger.info(f"Sending {len(messages)} emails using templates "
+                    f"{sorted({message['TemplateID'] for message in messages})}")
         try:
-            response = requests.post(
-                url,
-                auth=(self.api_key, self.api_secret),
-                json=payload
+            response = get_mailjet_session().post(
+                f"{self.base_url}/send",
+                json={"Messages": messages},
+                timeout=self.timeout
             )
-            
-            if response.status_code == 200:
-                logger.info(f"Email sent successfully to {to_email}")
-                return True
-            else:
-                logger.error(f"Failed to send email. Status code: {response.status_code}")
-                logger.error(f"Response: {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.exception(f"Exception while sending email: {str(e)}")
-            return False
-    
-    def send_welcome_email(self, to_email: str, confirmation_link: str, recipient_name: str) -> bool:
+        except requests.RequestException as e:
+            logger.error(f"Exception while sending {len(messages)} emails: {e}")
+            return [False] * len(messages)
+
+        # Mailjet answers with the status of every message, in order, also when some failed (400)
+        try:
+            statuses = response.json().get("Messages") or []
+        except ValueError:
+            statuses = []
+        if len(statuses) != len(messages):
+            logger.error(f"Failed to send {len(messages)} emails. Status code: {response.status_code}")
+            logger.debug(f"Response: {response.text}")
+            return [False] * len(messages)
+
+        results = []
+        for message, status in zip(messages, statuses):
+            sent = status.get("Status") == "success"
+            if not sent:
+                recipients = ", ".join(recipient["Email"] for recipient in message["To"])
+                errors = "; ".join(error.get("ErrorMessage", "") for error in status.get("Errors", []))
+                logger.error(f"Failed to send email to {recipients}: {errors}")
+            results.append(sent)
+        logger.info(f"Sent {sum(results)} of {len(messages)} emails")
+        return results
+
+    def _send_email(self, to_email: str, template_id: int, variables: Dict[str, Any],
+                   subject: str, recipient_name: Optional[str] = None) -> bool:
         """
-        Send welcome email with verification link.
-        
+        Send an email using Mailjet API.
+
         Args:
             to_email: Recipient email address
-            confirmation_link: Link for email verification
-            recipient_name: Recipient's name
-            
+            template_id: Mailjet template ID
+            variables: Template variables
+            subject: Email subject
+            recipient_name: Optional recipient name
+
         Returns:
             bool: True if email was sent successfully, False otherwise
         """
+        return self.send_batch([
+            self.build_message(to_email, template_id, variables, subject, recipient_name)
+        ])[0]
+
+    def welcome_message(self, to_email: str, confirmation_link: str, recipient_name: str) -> Dict[str, Any]:
+        """Build the welcome email with verification link, for `send_batch`."""
         variables = {
             "confirmation_link": confirmation_link  # Template 6410451 uses confirmation_link variable
         }
-        
-        return self._send_email(
+
+        return self.build_message(
             to_email=to_email,
             template_id=self.welcome_template_id,
             variables=variables,
             subject="Welcome to Sandpiper",
             recipient_name=recipient_name
         )
-    
+
+    def password_reset_message(self, to_email: str, reset_password_link: str) -> Dict[str, Any]:
+        """Build the password reset email, for `send_batch`."""
+        variables = {
+            "reset_password_link": reset_password_link  # Template 6410454 uses reset_password_link variable
+        }
+
+        return self.build_message(
+            to_email=to_email,
+            template_id=self.reset_password_template_id,
+            variables=variables,
+            subject="Reset your password"
+        )
+
+    def send_welcome_email(self, to_email: str, confirmation_link: str, recipient_name: str) -> bool:
+        """
+        Send welcome email with verification link.
+
+        Args:
+            to_email: Recipient email address
+            confirmation_link: Link for email verification
+            recipient_name: Recipient's name
+
+        Returns:
+            bool: True if email was sent successfully, False otherwise
+        """
+        return self.send_batch([self.welcome_message(to_email, confirmation_link, recipient_name)])[0]
+
     def send_password_reset_email(self, to_email: str, reset_password_link: str) -> bool:
         """
         Send password reset email.
-        
+
         Args:
             to_email: Recipient email address
             reset_password_link: Link for password reset
-            
+
         Returns:
             bool: True if email was sent successfully, False otherwise
         """
-        variables = {
-            "reset_password_link": reset_password_link  # Template 6410454 uses reset_password_link variable
-        }
-        
-        return self._send_email(
-            to_email=to_email,
-            template_id=self.reset_password_template_id,
-            variables=variables,
-            subject="Reset your password"
-        )
+        return self.send_batch([self.password_reset_message(to_email, reset_password_link)])[0]
@@ -1,5 +1,31 @@
+import copy
+from typing import Optional, Tuple
+
+from rococo.models.versioned_model import get_uuid_hex
+
 from common.repositories.factory import RepositoryFactory, RepoType
-from common.models import Organization
+from common.repositories.unit_of_work import on_commit
+from common.models import Organization, PersonOrganizationRole
+from common.helpers.cache import get_cache
+from common.helpers.string_utils import make_etag
+
+ORGANIZATION_MEMBERSHIP_CACHE = 'organization_membership'
+ORGANIZATION_MEMBERSHIP_GENERATION_CACHE = 'organization_membership_generation'
+
+
+def _membership_caches(config):
+    max_entries, ttl = config.ORGANIZATION_MEMBERSHIP_CACHE_MAX_ENTRIES, config.ORGANIZATION_MEMBERSHIP_CACHE_TTL
+    return (get_cache(ORGANIZATION_MEMBERSHIP_CACHE, max_entries, ttl),
+            get_cache(ORGANIZATION_MEMBERSHIP_GENERATION_CACHE, max_entries, ttl))
+
+
+def invalidate_organization_memberships(config, organization_id: str):
+    """
+    Drop every cached membership of an organization once the save of the organization or one of its roles commits.
+    """
+    if config.ORGANIZATION_MEMBERSHIP_CACHE_TTL > 0:
+        _, generations = _membership_caches(config)
+        on_commit(lambda: generations.delete(organization_id))
 
 
 class OrganizationService:
@@ -11,12 +37,63 @@ class OrganizationService:
 
     def save_organization(self, organization: Organization):
         organization = self.organization_repo.save(organization)
+        invalidate_organization_memberships(self.config, organization.entity_id)
+        # Access tokens embed the member's role without checking the organization; make them recheck it
+        from common.services.person_organization_role import PersonOrganizationRoleService
+        PersonOrganizationRoleService(self.config).bump_organization_membership_versions(organization.entity_id)
         return organization
 
     def get_organization_by_id(self, entity_id: str):
         organization = self.organization_repo.get_one({"entity_id": entity_id})
         return organization
 
+    def get_membership(self, person_id: str,
+                       organization_id: str) -> Tuple[Optional[Organization], Optional[PersonOrganizationRole]]:
+        """
+        Get an organization and the person's role in it; each is None when it does not exist.
+
+        Memberships are cached per (person, organization) for ORGANIZATION_MEMBERSHIP_CACHE_TTL
+        seconds. Cache keys include the organization's current generation, which saving the
+        organization or any of its roles replaces, so a membership read while such a write was
+        in flight is never served after it. Only complete memberships are cached, and callers
+        receive their own copies of the models.
+        """
+        caching = self.config.ORGANIZATION_MEMBERSHIP_CACHE_TTL > 0
+
+        if caching:
+            cache, generations = _membership_caches(self.config)
+            generation = generations.get(organization_id)
+            if generation is None:
+                generation = get_uuid_hex()
+                generations.set(organization_id, generation)
+
+            key = f"{person_id}:{organization_id}:{generation}"
+            membership = cache.get(key)
+            if membership is not None:
+                return tuple(map(copy.copy, membership))
+
+        organization = self.get_organization_by_id(organization_id)
+        if not organization:
+            return None, None
+        person_organization_role_repo = self.repository_factory.get_repository(RepoType.PERSON_ORGANIZATION_ROLE)
+        role = person_organization_role_repo.get_one({
+            "person_id": person_id,
+            "organization_id": organization.entity_id
+        })
+        if not role:
+            return organization, None
+
+        if caching:
+            cache.set(key, (copy.copy(organization), copy.copy(role)))
+        return organization, role
+
     def get_organizations_with_roles_by_person(self, person_id: str):
         results = self.organization_repo.get_organizations_by_person_id(person_id)
         return results
+
+    def get_organizations_with_roles_etag(self, person_id: str) -> str:
+        """
+        Entity tag of `get_organizations_with_roles_by_person`, computed without fetching the list.
+        """
+        validator = self.organization_repo.get_organizations_validator_by_person_id(person_id)
+        return make_etag(person_id, *validator)
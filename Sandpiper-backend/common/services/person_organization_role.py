@@ -1,5 +1,12 @@
+from typing import Dict, Optional, Tuple
+
 from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.unit_of_work import on_commit
 from common.models import PersonOrganizationRole
+from common.helpers.cache import get_cache
+from common.services.organization import invalidate_organization_memberships
+
+MEMBERSHIP_VERSION_CACHE = 'membership_version'
 
 
 class PersonOrganizationRoleService:
@@ -11,8 +18,60 @@ class PersonOrganizationRoleService:
 
     def save_person_organization_role(self, person_organization_role: PersonOrganizationRole):
         person_organization_role = self.person_organization_role_repo.save(person_organization_role)
+        invalidate_organization_memberships(self.config, person_organization_role.organization_id)
+        self.person_organization_role_repo.bump_membership_version(person_organization_role.person_id)
+        if self.config.MEMBERSHIP_VERSION_CACHE_TTL > 0:
+            membership_version_cache = self._membership_version_cache()
+            on_commit(lambda: membership_version_cache.delete(person_organization_role.person_id))
         return person_organization_role
 
+    def bump_organization_membership_versions(self, organization_id: str):
+        """
+        Mark the memberships embedded in every member's access tokens as stale, e.g. after the
+        organization was changed or deactivated, so they are checked against the database again.
+        """
+        self.person_organization_role_repo.bump_organization_membership_versions(organization_id)
+        if self.config.MEMBERSHIP_VERSION_CACHE_TTL > 0:
+            member_ids = self.person_organization_role_repo.get_member_ids(organization_id)
+            membership_version_cache = self._membership_version_cache()
+
+            def forget_membership_versions():
+                for person_id in member_ids:
+                    membership_version_cache.delete(person_id)
+
+            on_commit(forget_membership_versions)
+
+    def _membership_version_cache(self):
+        return get_cache(MEMBERSHIP_VERSION_CACHE, self.config.MEMBERSHIP_VERSION_CACHE_MAX_ENTRIES,
+                         self.config.MEMBERSHIP_VERSION_CACHE_TTL)
+
+    def get_memberships(self, person_id: str) -> Tuple[int, Dict[str, str]]:
+        """
+        A person's current membership version and roles as {organization_id: role}, for embedding in access tokens.
+        """
+        return self.person_organization_role_repo.get_memberships_by_person_id(person_id)
+
+    def get_membership_version(self, person_id: str) -> int:
+        """
+        A person's membership version, bumped by every save of one of their roles.
+        Also bumped for every member when their organization is saved.
+        Cached per process for MEMBERSHIP_VERSION_CACHE_TTL seconds.
+        """
+        caching = self.config.MEMBERSHIP_VERSION_CACHE_TTL > 0
+        if caching:
+            version = self._membership_version_cache().get(person_id)
+            if version is not None:
+                return version
+
+        version = self.person_organization_role_repo.get_membership_version(person_id)
+        if caching:
+            self._membership_version_cache().set(person_id, version)
+        return version
+
+    def is_membership_version_current(self, person_id: str, version: Optional[int]) -> bool:
+        """Whether memberships issued at `version` still describe the person's roles."""
+        return version is not None and version == self.get_membership_version(person_id)
+
     def get_roles_by_person_id(self, person_id: str):
         person_organization_roles = self.person_organization_role_repo.get_many({"person_id": person_id})
         
@@ -1,8 +1,39 @@
-from datetime import datetime
-from typing import List, Optional
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Callable, Collection, Dict, Iterator, List, Optional, Tuple
 
-from common.models import Todo
+from common.models import Todo, TodoRow
 from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.notification_listener import Subscription, get_notification_listener
+from common.repositories.todo import TODO_COLUMNS, todo_channel
+from common.helpers.cache import get_cache
+from common.helpers.json_serializer import dumps_todo_rows
+from common.helpers.pagination import (
+    encode_cursor, decode_cursor, encode_watermark, decode_watermark, encode_changes_cursor, decode_changes_cursor
+)
+from common.helpers.string_utils import make_etag
+from rococo.models.versioned_model import get_uuid_hex
+
+
+MAX_BATCH_OPERATIONS = 500
+TITLE_MAX_LENGTH = 255
+DESCRIPTION_MAX_LENGTH = 10000
+EXPORT_FORMATS = ('ndjson', 'csv')
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_BATCH_SIZE = 5000
+MAX_IMPORT_ERRORS_REPORTED = 1000
+TODO_LIST_CACHE = 'todo_list'
+TODO_LIST_GENERATION_CACHE = 'todo_list_generation'
+
+
+def guess_import_format(filename: Optional[str]) -> Optional[str]:
+    """
+    Infer the import format from a file name extension (.csv, .ndjson or .jsonl).
+    """
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
 
 
 class TodoService:
@@ -13,29 +44,155 @@ class TodoService:
         self.config = config
         self.repo_factory = RepositoryFactory(config)
 
-    def get_todos_by_person_id(self, person_id: str) -> List[Todo]:
+    def get_todos_by_person_id(self, person_id: str) -> List[TodoRow]:
         """
         Get all todos for a specific person.
         """
         repo = self.repo_factory.get_repository(RepoType.TODO)
         todos = repo.get_todos_by_person_id(person_id)
         
-        # Filter out todos with missing person_id (data integrity check)
-        valid_todos = [todo for todo in todos if todo.person_id]
+        # Filter out todos with missing person_id or title (data integrity check)
+        valid_todos = [todo for todo in todos if todo.person_id and todo.title]
         return valid_todos
 
-    def get_todos_by_person_id_and_status(self, person_id: str, is_completed: bool) -> List[Todo]:
+    def get_todos_by_person_id_and_status(self, person_id: str, is_completed: bool) -> List[TodoRow]:
         """
         Get todos for a specific person filtered by completion status.
         """
         repo = self.repo_factory.get_repository(RepoType.TODO)
         todos = repo.get_todos_by_person_id_and_status(person_id, is_completed)
         
-        # Filter out todos with missing person_id (data integrity check)
-        valid_todos = [todo for todo in todos if todo.person_id]
+        # Filter out todos with missing person_id or title (data integrity check)
+        valid_todos = [todo for todo in todos if todo.person_id and todo.title]
         return valid_todos
 
-    def get_todo_by_id(self, todo_id: str) -> Optional[Todo]:
+    def _todo_list_caches(self):
+        max_entries, ttl = self.config.TODO_LIST_CACHE_MAX_ENTRIES, self.config.TODO_LIST_CACHE_TTL
+        return get_cache(TODO_LIST_CACHE, max_entries, ttl), get_cache(TODO_LIST_GENERATION_CACHE, max_entries, ttl)
+
+    def get_todos_json(self, person_id: str, is_completed: Optional[bool] = None,
+                       known_etags: Collection[str] = ()) -> Tuple[str, Optional[bytes]]:
+        """
+        Get a person's valid todos, optionally filtered by completion status, as a serialized JSON array.
+
+        Returns the list's entity tag and payload. When the tag is one of `known_etags` the payload
+        is None and, unless it was cached, the list is neither fetched nor serialized.
+
+        Payloads are cached per (person, status) for TODO_LIST_CACHE_TTL seconds. Cache keys include
+        the person's current list generation, which every write replaces, so a list read while
+        a write was in flight can never be served after the write. For the same reason the tag
+        is computed before the list is fetched: a concurrent write can only make it too old.
+        """
+        status = {True: 'completed', False: 'active'}.get(is_completed, 'all')
+        caching = self.config.TODO_LIST_CACHE_TTL > 0
+
+        if caching:
+            cache, generations = self._todo_list_caches()
+            generation = generations.get(person_id)
+            if generation is None:
+                generation = get_uuid_hex()
+                generations.set(person_id, generation)
+
+            key = f"{person_id}:{generation}:{status}"
+            entry = cache.get(key)
+            if entry is not None:
+                etag, payload = entry
+                return etag, None if etag in known_etags else payload
+
+        repo = self.repo_factory.get_repository(RepoType.TODO)
+        etag = make_etag(person_id, status, *repo.get_todos_validator(person_id, is_completed))
+        if etag in known_etags:
+            return etag, None
+
+        payload = dumps_todo_rows(self._get_todos(person_id, is_completed))
+        if caching:
+            cache.set(key, (etag, payload))
+        return etag, payload
+
+    def _get_todos(self, person_id: str, is_completed: Optional[bool]) -> List[TodoRow]:
+        if is_completed is None:
+            return self.get_todos_by_person_id(person_id)
+        return self.get_todos_by_person_id_and_status(person_id, is_completed)
+
+    def invalidate_todo_lists(self, person_id: str):
+        """
+        Drop every cached todo list of a person. Called after each write to their todos.
+        """
+        if self.config.TODO_LIST_CACHE_TTL > 0:
+            _, generations = self._todo_list_caches()
+            generations.delete(person_id)
+
+    def subscribe_to_todo_events(self, person_id: str) -> Subscription:
+        """
+        Start receiving change notifications for a person's todos on this worker's shared listener.
+        Raises ServiceUnavailableError when the worker has no room for another client.
+        """
+        return get_notification_listener().subscribe(todo_channel(person_id), self.config.TODO_EVENTS_CLIENT_BUFFER)
+
+    def unsubscribe_from_todo_events(self, subscription: Subscription):
+        get_notification_listener().unsubscribe(subscription)
+
+    def get_todos_page(self, person_id: str, limit: int, is_completed: Optional[bool] = None,
+                       cursor: Optional[str] = None) -> Tuple[List[TodoRow], Optional[str]]:
+        """
+        Get one page of todos for a specific person, optionally filtered by completion status.
+        Returns the todos and the cursor of the next page (None on the last page).
+        """
+        after = decode_cursor(cursor) if cursor else None
+
+        repo = self.repo_factory.get_repository(RepoType.TODO)
+        # Fetch one extra row to find out whether another page follows.
+        todos = repo.get_todos_page(person_id, limit + 1, is_completed=is_completed, after=after)
+
+        next_cursor = None
+        if len(todos) > limit:
+            todos = todos[:limit]
+            next_cursor = encode_cursor(todos[-1].changed_on, todos[-1].entity_id)
+
+        valid_todos = [todo for todo in todos if todo.person_id and todo.title]
+        return valid_todos, next_cursor
+
+    def get_todo_changes(self, person_id: str, limit: int, since: Optional[str] = None,
+                         cursor: Optional[str] = None) -> Tuple[List[TodoRow], List[str], Optional[str], Optional[str]]:
+        """
+        Get what changed in a person's todos since a watermark, for delta sync.
+
+        Returns the created or updated todos, the ids of the deleted ones, the cursor of the next
+        page (None on the last page) and, on the last page only, the watermark to pass as `since`
+        next time. Without `since` all active todos are returned, as an initial sync.
+
+        Writes stamp changed_on shortly before they commit, so the next watermark lies
+        TODO_SYNC_OVERLAP_SECONDS before the time the sync started. The changes in that window are
+        sent again on the next sync, and clients apply them idempotently by entity_id.
+        """
+        if cursor:
+            after_on, after_id, watermark, include_deleted = decode_changes_cursor(cursor)
+            after, since_on = (after_on, after_id), None
+        else:
+            after, since_on = None, decode_watermark(since) if since else None
+            include_deleted = since_on is not None
+            watermark = datetime.utcnow() - timedelta(seconds=self.config.TODO_SYNC_OVERLAP_SECONDS)
+            if since_on is not None:
+                watermark = max(watermark, since_on)
+
+        repo = self.repo_factory.get_repository(RepoType.TODO)
+        # Fetch one extra row to find out whether another page follows.
+        todos = repo.get_todo_changes(
+            person_id, limit + 1, since=since_on, after=after, include_deleted=include_deleted
+        )
+
+        next_cursor = next_watermark = None
+        if len(todos) > limit:
+            todos = todos[:limit]
+            next_cursor = encode_changes_cursor(todos[-1].changed_on, todos[-1].entity_id, watermark, include_deleted)
+        else:
+            next_watermark = encode_watermark(watermark)
+
+        changed = [todo for todo in todos if todo.active and todo.title]
+        deleted = [todo.entity_id for todo in todos if not todo.active]
+        return changed, deleted, next_cursor, next_watermark
+
+    def get_todo_by_id(self, todo_id: str) -> Optional[TodoRow]:
         """
         Get a todo by its ID.
         """
@@ -71,72 +228,322 @@ class TodoService:
         todo.validate()
         
         repo = self.repo_factory.get_repository(RepoType.TODO)
-        return repo.save_todo(todo)
+        todo = repo.save_todo(todo)
+        self.invalidate_todo_lists(person_id)
+        return todo
 
-    def update_todo(self, todo_id: str, title: Optional[str] = None, 
+    def update_todo(self, todo_id: str, person_id: str, title: Optional[str] = None,
                    description: Optional[str] = None, is_completed: Optional[bool] = None,
-                   due_date: Optional[datetime] = None) -> Optional[Todo]:
+                   due_date: Optional[datetime] = None) -> Optional[TodoRow]:
         """
-        Update an existing todo.
+        Update an existing todo owned by person_id.
+        Returns None if the todo does not exist or belongs to someone else.
         """
+        if title is not None and not title:
+            raise ValueError("title is required")
+
         repo = self.repo_factory.get_repository(RepoType.TODO)
-        todo = repo.get_todo_by_id(todo_id)
-        
-        if not todo:
+        todo = repo.update_todo_for_person(
+            todo_id, person_id, title=title, description=description,
+            is_completed=is_completed, due_date=due_date
+        )
+        if todo:
+            self.invalidate_todo_lists(person_id)
+        return todo
+
+    def delete_todo(self, todo_id: str, person_id: str) -> bool:
+        """
+        Delete a todo owned by person_id (mark as inactive).
+        """
+        repo = self.repo_factory.get_repository(RepoType.TODO)
+        deleted = repo.update_todo_for_person(todo_id, person_id, active=False) is not None
+        if deleted:
+            self.invalidate_todo_lists(person_id)
+        return deleted
+
+    def toggle_todo_completion(self, todo_id: str, person_id: str) -> Optional[TodoRow]:
+        """
+        Toggle the completion status of a todo owned by person_id.
+        Returns None if the todo does not exist or belongs to someone else.
+        """
+        repo = self.repo_factory.get_repository(RepoType.TODO)
+        todo = repo.update_todo_for_person(todo_id, person_id, toggle=True)
+        if todo:
+            self.invalidate_todo_lists(person_id)
+        return todo
+
+    @staticmethod
+    def _parse_batch_due_date(value) -> Optional[datetime]:
+        if not value:
             return None
-            
-        # Ensure the todo has a valid person_id
-        if not todo.person_id:
-            raise ValueError("Cannot update todo with missing person_id")
-            
-        if title is not None:
-            todo.title = title
-            
-        if description is not None:
-            todo.description = description
-            
-        if is_completed is not None:
-            todo.is_completed = is_completed
-            
-        if due_date is not None:
-            todo.due_date = due_date
-            
-        # Validate before saving
-        todo.validate()
-        
-        return repo.save_todo(todo)
+        try:
+            return datetime.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid due date format. Use ISO format (YYYY-MM-DDTHH:MM:SS).")
+
+    @staticmethod
+    def _validate_batch_title(title, required: bool):
+        if title is None and not required:
+            return
+        if not isinstance(title, str) or not title.strip():
+            raise ValueError("title is required")
+        if len(title) > TITLE_MAX_LENGTH:
+            raise ValueError(f"title must be at most {TITLE_MAX_LENGTH} characters")
+
+    @staticmethod
+    def _validate_batch_description(description):
+        if description is None:
+            return
+        if not isinstance(description, str):
+            raise ValueError("description must be a string")
+        if len(description) > DESCRIPTION_MAX_LENGTH:
+            raise ValueError(f"description must be at most {DESCRIPTION_MAX_LENGTH} characters")
 
-    def delete_todo(self, todo_id: str) -> bool:
+    def apply_batch(self, person_id: str, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Delete a todo (mark as inactive).
+        Apply a list of create, update, toggle and delete operations for a person in one transaction.
+
+        Each operation is a dict with an `op` key; update, toggle and delete also need `entity_id`.
+        Invalid operations fail individually without affecting the others.
+        Returns one result per operation, in the same order.
         """
+        if not person_id:
+            raise ValueError("person_id is required")
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise ValueError(f"A batch can contain at most {MAX_BATCH_OPERATIONS} operations.")
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(operations)
+        new_todos, new_todo_indexes = [], []
+        changes, change_indexes = [], []
+        changed_ids = set()
+
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            try:
+                if op == 'create':
+                    self._validate_batch_title(operation.get('title'), required=True)
+                    self._validate_batch_description(operation.get('description'))
+                    new_todos.append((
+                        operation['title'],
+                        operation.get('description'),
+                        False,
+                        self._parse_batch_due_date(operation.get('due_date'))
+                    ))
+                    new_todo_indexes.append(index)
+                    continue
+
+                if op not in ('update', 'toggle', 'delete'):
+                    raise ValueError("op must be one of: create, update, toggle, delete")
+
+                entity_id = operation.get('entity_id')
+                if not entity_id or not isinstance(entity_id, str):
+                    raise ValueError("entity_id is required")
+                if entity_id in changed_ids:
+                    raise ValueError("Todo appears more than once in this batch.")
+
+                change = {'entity_id': entity_id}
+                if op == 'update':
+                    self._validate_batch_title(operation.get('title'), required=False)
+                    self._validate_batch_description(operation.get('description'))
+                    is_completed = operation.get('is_completed')
+                    if is_completed is not None and not isinstance(is_completed, bool):
+                        raise ValueError("is_completed must be a boolean")
+                    change.update(
+                        title=operation.get('title'),
+                        description=operation.get('description'),
+                        is_completed=is_completed,
+                        due_date=self._parse_batch_due_date(operation.get('due_date'))
+                    )
+                elif op == 'toggle':
+                    change['toggle'] = True
+                else:
+                    change['active'] = False
+
+                changed_ids.add(entity_id)
+                changes.append(change)
+                change_indexes.append(index)
+            except ValueError as e:
+                results[index] = {'index': index, 'op': op, 'success': False, 'message': str(e)}
+
         repo = self.repo_factory.get_repository(RepoType.TODO)
-        todo = repo.get_todo_by_id(todo_id)
-        
-        if not todo:
+        created, updated = repo.apply_batch(person_id, new_todos, changes)
+        if created or updated:
+            self.invalidate_todo_lists(person_id)
+
+        for index, todo in zip(new_todo_indexes, created):
+            results[index] = {'index': index, 'op': 'create', 'success': True, 'todo': todo.as_dict()}
+
+        for index, change in zip(change_indexes, changes):
+            op = operations[index]['op']
+            todo = updated.get(change['entity_id'])
+            if not todo:
+                results[index] = {'index': index, 'op': op, 'success': False, 'message': "Todo not found."}
+            elif op == 'delete':
+                results[index] = {'index': index, 'op': op, 'success': True, 'entity_id': todo.entity_id}
+            else:
+                results[index] = {'index': index, 'op': op, 'success': True, 'todo': todo.as_dict()}
+
+        return results
+
+    def export_todos(self, person_id: str, export_format: str = 'ndjson', include_history: bool = False,
+                     batch_size: Optional[int] = None) -> Iterator[str]:
+        """
+        Generate a person's todos as NDJSON lines or CSV rows.
+
+        Each yielded chunk holds one batch of rows, so memory stays flat however many todos
+        the person has. With `include_history` every stored version is exported, each with an
+        `is_current` flag.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+        repo = self.repo_factory.get_repository(RepoType.TODO)
+        batches = repo.iter_todo_rows(
+            person_id, batch_size or self.config.TODO_EXPORT_BATCH_SIZE, include_history=include_history
+        )
+        columns = TODO_COLUMNS + ('is_current',) if include_history else TODO_COLUMNS
+
+        if export_format == 'csv':
+            return self._export_csv(batches, columns)
+        return self._export_ndjson(batches, columns)
+
+    @staticmethod
+    def _export_value(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    def _export_ndjson(self, batches: Iterator[List[tuple]], columns: Tuple[str, ...]) -> Iterator[str]:
+        for rows in batches:
+            yield ''.join(
+                json.dumps(dict(zip(columns, map(self._export_value, row)))) + '\n' for row in rows
+            )
+
+    def _export_csv(self, batches: Iterator[List[tuple]], columns: Tuple[str, ...]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows([map(self._export_value, row) for row in rows])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def _parse_import_bool(value) -> bool:
+        if value is None or isinstance(value, bool):
+            return bool(value)
+        normalized = str(value).strip().lower()
+        if normalized in ('', '0', 'false', 'no', 'n', 'f'):
             return False
-            
-        # Ensure the todo has a valid person_id
-        if not todo.person_id:
-            raise ValueError("Cannot delete todo with missing person_id")
-            
-        todo.active = False
-        repo.save_todo(todo)
-        return True
+        if normalized in ('1', 'true', 'yes', 'y', 't'):
+            return True
+        raise ValueError("is_completed must be a boolean")
+
+    @staticmethod
+    def _read_csv_records(text: io.TextIOBase) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        reader = csv.DictReader(text)
+        if not reader.fieldnames or 'title' not in reader.fieldnames:
+            raise ValueError("CSV header must include a 'title' column.")
+        for row_number, record in enumerate(reader, start=1):
+            yield row_number, record, None
+
+    @staticmethod
+    def _read_ndjson_records(text: io.TextIOBase) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield row_number, None, "Invalid JSON."
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Each line must be a JSON object."
+                continue
+            yield row_number, record, None
+
+    def _import_row(self, person_id: str, record: dict) -> Tuple:
+        title = record.get('title')
+        if isinstance(title, str):
+            title = title.strip()
+        self._validate_batch_title(title, required=True)
+        self._validate_batch_description(record.get('description') or None)
+        Todo.validate_fields(person_id, title)
 
-    def toggle_todo_completion(self, todo_id: str) -> Optional[Todo]:
+        return (
+            title,
+            record.get('description') or None,
+            self._parse_import_bool(record.get('is_completed')),
+            self._parse_batch_due_date(record.get('due_date'))
+        )
+
+    def import_todos(self, person_id: str, stream: BinaryIO, import_format: str = 'csv',
+                     progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, Any]:
         """
-        Toggle the completion status of a todo.
+        Bulk-create todos for a person from a UTF-8 CSV or NDJSON byte stream.
+
+        The upload is parsed and validated row by row and loaded with COPY in batches of
+        IMPORT_BATCH_SIZE, all in one transaction, so memory stays flat for any file size.
+        Invalid rows are skipped and reported; CSV needs a `title` column and may have
+        `description`, `is_completed` and `due_date` columns, NDJSON objects use the same keys.
+        `progress`, if given, is called after every batch with rows_read, imported and failed.
+
+        Returns the number of imported and failed rows and the per-row errors
+        (the first MAX_IMPORT_ERRORS_REPORTED of them).
         """
+        if not person_id:
+            raise ValueError("person_id is required")
+        if import_format not in IMPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        if import_format == 'csv':
+            records = self._read_csv_records(text)
+        else:
+            records = self._read_ndjson_records(text)
+
+        counts = {'rows_read': 0, 'imported': 0, 'failed': 0}
+        errors = []
+
+        def batches() -> Iterator[List[Tuple]]:
+            batch = []
+            for row_number, record, error in records:
+                counts['rows_read'] += 1
+                if error is None:
+                    try:
+                        batch.append(self._import_row(person_id, record))
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    counts['failed'] += 1
+                    if len(errors) < MAX_IMPORT_ERRORS_REPORTED:
+                        errors.append({'row': row_number, 'message': error})
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            yield batch
+
+        def on_batch(imported: int):
+            counts['imported'] = imported
+            if progress:
+                progress(dict(counts))
+
         repo = self.repo_factory.get_repository(RepoType.TODO)
-        todo = repo.get_todo_by_id(todo_id)
-        
-        if not todo:
-            return None
-            
-        # Ensure the todo has a valid person_id
-        if not todo.person_id:
-            raise ValueError("Cannot toggle todo with missing person_id")
-            
-        todo.is_completed = not todo.is_completed
-        return repo.save_todo(todo)
+        try:
+            counts['imported'] = repo.copy_todos(person_id, batches(), on_batch=on_batch)
+        except UnicodeDecodeError:
+            raise ValueError("The upload must be UTF-8 encoded.")
+        except csv.Error as e:
+            raise ValueError(f"Malformed CSV after row {counts['rows_read']}: {e}")
+        finally:
+            text.detach()
+
+        if counts['imported']:
+            self.invalidate_todo_lists(person_id)
+        return {
+            'imported': counts['imported'],
+            'failed': counts['failed'],
+            'errors': errors,
+            'errors_truncated': counts['failed'] > len(errors),
+        }
@@ -0,0 +1,162 @@
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+from common.app_logger import logger
+from common.repositories.email import EMAIL_OUTBOX_CHANNEL
+from common.repositories.notification_listener import get_notification_listener
+from common.services.email import EmailService
+from common.services.mailjet_service import MailjetService
+from common.tasks.send_message import MessageSender
+
+# Seconds to wait for the broker to confirm a message handed to the email transmitter queue
+PUBLISH_TIMEOUT = 60
+
+
+class EmailOutboxRelay:
+    """
+    Sends the emails queued in the email_outbox table.
+
+    Due emails are claimed `batch_size` at a time and sent through Mailjet in as few calls as it
+    allows; recipients Mailjet did not accept, and events it has no template for, are published
+    to the email transmitter queue instead. Sent emails are deleted. An email that could not be
+    sent either way is retried after an exponentially growing, jittered delay, and marked failed
+    after `max_attempts`. Between rounds the relay waits for the NOTIFY sent with every new
+    email, or `poll_interval` seconds for retries that became due.
+
+    Delivery is at least once: an email whose relay dies after sending it is sent again once
+    its claim expires.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.batch_size = config.EMAIL_OUTBOX_BATCH_SIZE
+        self.poll_interval = config.EMAIL_OUTBOX_POLL_SECONDS
+        self.lease_seconds = config.EMAIL_OUTBOX_LEASE_SECONDS
+        self.max_attempts = config.EMAIL_OUTBOX_MAX_ATTEMPTS
+        self.retry_base = config.EMAIL_OUTBOX_RETRY_BASE_SECONDS
+        self.retry_max = config.EMAIL_OUTBOX_RETRY_MAX_SECONDS
+        self.queue_name = config.QUEUE_NAME_PREFIX + config.EMAIL_SERVICE_PROCESSOR_QUEUE_NAME
+
+        self.email_service = EmailService(config)
+        self.mailjet_service = MailjetService()
+        self.message_sender = MessageSender()
+
+        self._stopped = threading.Event()
+        self._subscription = None
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _mailjet_message(self, event: str, to_email: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if event == "WELCOME_EMAIL":
+            return self.mailjet_service.welcome_message(
+                to_email=to_email,
+                confirmation_link=data["confirmation_link"],
+                recipient_name=data.get("recipient_name"),
+            )
+        if event == "RESET_PASSWORD":
+            return self.mailjet_service.password_reset_message(
+                to_email=to_email,
+                reset_password_link=data["verify_link"],
+            )
+        return None
+
+    def deliver(self, messages: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """
+        Send outbox messages: every recipient Mailjet has a template for through one `send_batch`,
+        the rest published to the email transmitter queue together.
+        Returns, for each message, None when it was sent or the error that stopped it.
+        """
+        mailjet_messages, recipients = [], []  # recipients: (message index, email) of each Mailjet message
+        for index, message in enumerate(messages):
+            for to_email in message.get("to_emails", []):
+                mailjet_message = self._mailjet_message(message["event"], to_email, message.get("data", {}))
+                if mailjet_message is not None:
+                    mailjet_messages.append(mailjet_message)
+                    recipients.append((index, to_email))
+
+        accepted = set()
+        if mailjet_messages:
+            accepted = {
+                recipient for recipient, sent in zip(recipients, self.mailjet_service.send_batch(mailjet_messages))
+                if sent
+            }
+
+        errors: List[Optional[Exception]] = [None] * len(messages)
+        published = {}
+        for index, message in enumerate(messages):
+            unsent = [to_email for to_email in message.get("to_emails", []) if (index, to_email) not in accepted]
+            if unsent:
+                try:
+                    published[index] = self.message_sender.send_message(
+                        self.queue_name, {**message, "to_emails": unsent}
+                    )
+                except Exception as e:
+                    errors[index] = e
+
+        for index, future in published.items():
+            try:
+                # Raises when the broker did not confirm it, once the publisher's own retries are used up
+                future.result(timeout=PUBLISH_TIMEOUT)
+            except Exception as e:
+                errors[index] = e
+        return errors
+
+    def retry_delay(self, attempts: int) -> float:
+        """Seconds until the next attempt after `attempts` failed ones."""
+        delay = min(self.retry_max, self.retry_base * 2 ** min(attempts - 1, 32))
+        return delay * random.uniform(0.5, 1.0)
+
+    def relay_batch(self) -> int:
+        """Claim and send one batch of due emails; returns how many were claimed."""
+        claimed = self.email_service.claim_outbox_emails(self.batch_size, self.lease_seconds)
+        if not claimed:
+            return 0
+        sent: List[int] = []
+        errors = self.deliver([message for _, _, message, _ in claimed])
+        for (email_id, event, message, attempts), e in zip(claimed, errors):
+            if e is not None:
+                error = f"{type(e).__name__}: {e}"
+                if attempts >= self.max_attempts:
+                    logger.error(f"Giving up on outbox email {email_id} ({event}) after {attempts} attempts: {error}")
+                    self.email_service.fail_outbox_email(email_id, error)
+                    self.failed += 1
+                else:
+                    delay = self.retry_delay(attempts)
+                    logger.warning(f"Outbox email {email_id} ({event}) failed, retrying in {delay:.0f}s: {error}")
+                    self.email_service.retry_outbox_email(email_id, delay, error)
+                    self.retried += 1
+            else:
+                sent.append(email_id)
+
+        self.email_service.delete_outbox_emails(sent)
+        self.sent += len(sent)
+        logger.info(f"Email outbox relay sent {len(sent)} of {len(claimed)} emails")
+        return len(claimed)
+
+    def run(self):
+        """Relay emails until `stop` is called."""
+        listener = get_notification_listener()
+        self._subscription = listener.subscribe(EMAIL_OUTBOX_CHANNEL, max_buffer=1)
+        logger.info("Email outbox relay started")
+        try:
+            while not self._stopped.is_set():
+                try:
+                    claimed = self.relay_batch()
+                except Exception:
+                    logger.exception("Email outbox relay round failed")
+                    claimed = 0
+                if claimed < self.batch_size:
+                    # A full batch means more may be due; otherwise wait for the next email
+                    self._subscription.get(timeout=self.poll_interval)
+        finally:
+            listener.unsubscribe(self._subscription)
+            logger.info(f"Email outbox relay stopped: {self.sent} sent, {self.retried} retried, {self.failed} failed")
+
+    def stop(self):
+        """Stop after the current round; safe to call from a signal handler."""
+        self._stopped.set()
+        if self._subscription is not None:
+            self._subscription.close()
@@ -0,0 +1,279 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parseaddr
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pika
+from pika.exceptions import AMQPError
+
+from common.app_logger import logger
+from common.services.mailjet_service import MailjetService
+from common.tasks.send_message import get_connection_parameters
+
+# Where the events of the email transmitter are configured when EMAIL_TRANSMITTER_CONFIG_PATH is not set
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[2] / 'services' / 'email_transmitter' / 'config.json'
+
+# Header counting how often a message was tried, carried by the copies republished for a retry
+ATTEMPTS_HEADER = 'x-attempts'
+
+ACK, REJECT, RETRY = 'ack', 'reject', 'retry'
+
+
+def load_email_events(path: str) -> Tuple[Dict[str, Dict[str, Any]], Tuple[str, str]]:
+    """
+    Read the email transmitter config.json: the Mailjet template ID and subject of every event,
+    as {event: {"template_id", "subject"}}, and the (name, address) emails are sent from.
+    """
+    with open(path) as config_file:
+        transmitter_config = json.load(config_file)
+
+    mailjet = next(
+        (configuration for configuration in transmitter_config.get('configurations', [])
+         if configuration.get('provider') == 'mailjet'), {}
+    )
+    events = {
+        event: {'template_id': settings['id']['mailjet'], 'subject': settings.get('subject')}
+        for event, settings in transmitter_config.get('events', {}).items()
+        if 'mailjet' in settings.get('id', {})
+    }
+    return events, parseaddr(mailjet.get('sourceEmail', ''))
+
+
+class _Delivery:
+    __slots__ = ('tag', 'body', 'attempts', 'generation')
+
+    def __init__(self, tag: int, body: bytes, attempts: int, generation: int):
+        self.tag = tag
+        self.body = body
+        self.attempts = attempts
+        self.generation = generation
+
+
+class EmailTransmitter:
+    """
+    Consumes the email transmitter queue and sends its messages ({"event", "data", "to_emails"})
+    with the Mailjet template configured for the event, `data` being the template variables.
+
+    The broker hands over at most `prefetch` unacknowledged messages. They are collected into
+    batches of up to `batch_size`, or whatever arrived within `batch_wait` seconds of the
+    first, and each batch is sent by one of `workers` threads with a single Mailjet bulk call.
+    A message is acknowledged only once Mailjet accepted it for every recipient. Otherwise a
+    copy for the remaining recipients is published to the queue again after a growing delay,
+    then the message is acknowledged; after `max_attempts` it is rejected instead, as are
+    messages that cannot be sent at all (bad JSON, unknown event). Only the thread running
+    `run` touches the connection; workers hand their results back to it.
+
+    On `stop`, consuming stops, the collected messages are sent and the ones being sent are
+    settled, for at most `shutdown_timeout` seconds. Anything unacknowledged after that is
+    redelivered by the broker.
+    """
+
+    def __init__(self, config, connection_factory: Callable[[], Any] = None,
+                 mailjet_service: Optional[MailjetService] = None):
+        self.queue_name = config.QUEUE_NAME_PREFIX + config.EMAIL_SERVICE_PROCESSOR_QUEUE_NAME
+        self.prefetch = max(1, config.EMAIL_TRANSMITTER_PREFETCH)
+        self.workers = max(1, config.EMAIL_TRANSMITTER_WORKERS)
+        self.batch_size = max(1, config.EMAIL_TRANSMITTER_BATCH_SIZE)
+        self.batch_wait = config.EMAIL_TRANSMITTER_BATCH_WAIT_SECONDS
+        self.max_attempts = max(1, config.EMAIL_TRANSMITTER_MAX_ATTEMPTS)
+        self.retry_base = config.EMAIL_TRANSMITTER_RETRY_BASE_SECONDS
+        self.shutdown_timeout = config.EMAIL_TRANSMITTER_SHUTDOWN_TIMEOUT
+
+        self.events, (source_name, source_email) = load_email_events(
+            config.EMAIL_TRANSMITTER_CONFIG_PATH or DEFAULT_CONFIG_PATH
+        )
+        self.mailjet_service = mailjet_service or MailjetService()
+        if source_email:
+            self.mailjet_service.source_email = source_email
+            self.mailjet_service.source_name = source_name or self.mailjet_service.source_name
+
+        self._connection_factory = connection_factory or (lambda: pika.BlockingConnection(get_connection_parameters()))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='email-transmitter')
+        self._connection = None
+        self._channel = None
+        self._consumer_tag = None
+        self._generation = 0  # bumped on every connection; results for an older one are dropped
+        self._batch: List[_Delivery] = []
+        self._batch_started = 0.0
+        self._in_flight = 0  # deliveries of the current connection taken but not yet settled
+        self._stopping = threading.Event()
+
+        self.received = 0
+        self.sent = 0
+        self.retried = 0
+        self.rejected = 0
+        self.batches = 0
+
+    # Connection thread
+
+    def _connect(self):
+        self._connection = self._connection_factory()
+        self._channel = self._connection.channel()
+        # Retry copies are confirmed before the message they replace is acknowledged
+        self._channel.confirm_delivery()
+        self._channel.queue_declare(queue=self.queue_name, durable=True)
+        self._channel.basic_qos(prefetch_count=self.prefetch)
+        self._consumer_tag = self._channel.basic_consume(self.queue_name, self._on_message)
+        self._generation += 1
+        self._batch = []
+        self._in_flight = 0
+
+    def _on_message(self, channel, method, properties, body: bytes):
+        attempts = int(((properties and properties.headers) or {}).get(ATTEMPTS_HEADER, 0))
+        if not self._batch:
+            self._batch_started = time.monotonic()
+        self._batch.append(_Delivery(method.delivery_tag, body, attempts, self._generation))
+        self._in_flight += 1
+        self.received += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        self.batches += 1
+        connection = self._connection
+        future = self._executor.submit(self._send, batch)
+
+        def settle_on_connection_thread(done):
+            try:
+                connection.add_callback_threadsafe(lambda: self._settle(batch, done))
+            except Exception:
+                pass  # the connection is gone, the broker redelivers the batch
+
+        future.add_done_callback(settle_on_connection_thread)
+
+    def _settle(self, batch: List[_Delivery], done):
+        if batch[0].generation != self._generation:
+            return
+        try:
+            results = done.result()
+        except Exception:
+            logger.exception("Sending a batch of emails failed")
+            results = [(RETRY, delivery.body) for delivery in batch]
+
+        for delivery, (outcome, body) in zip(batch, results):
+            if outcome == ACK:
+                self._channel.basic_ack(delivery.tag)
+                self.sent += 1
+                self._in_flight -= 1
+            elif outcome == RETRY and delivery.attempts + 1 < self.max_attempts:
+                delay = self.retry_base * 2 ** delivery.attempts
+                self._connection.call_later(delay, lambda delivery=delivery, body=body: self._retry(delivery, body))
+            else:
+                logger.error(f"Dropping an email transmitter message after {delivery.attempts + 1} attempts: {body[:200]!r}")
+                self._channel.basic_reject(delivery.tag, requeue=False)
+                self.rejected += 1
+                self._in_flight -= 1
+
+    def _retry(self, delivery: _Delivery, body: bytes):
+        """Requeue what is left of a message as a copy with one more attempt, then acknowledge the original."""
+        if delivery.generation != self._generation:
+            return
+        self._channel.basic_publish(
+            exchange='',
+            routing_key=self.queue_name,
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=2, headers={ATTEMPTS_HEADER: delivery.attempts + 1}),
+        )
+        self._channel.basic_ack(delivery.tag)
+        self.retried += 1
+        self._in_flight -= 1
+
+    def _consume(self):
+        deadline = None
+        while True:
+            if self._stopping.is_set():
+                if deadline is None:
+                    deadline = time.monotonic() + self.shutdown_timeout
+                    self._channel.basic_cancel(self._consumer_tag)
+                    self._flush()
+                if not self._in_flight or time.monotonic() >= deadline:
+                    return
+
+            wait = 1.0
+            if self._batch:
+                wait = self._batch_started + self.batch_wait - time.monotonic()
+                if wait <= 0:
+                    self._flush()
+                    wait = 1.0
+            self._connection.process_data_events(time_limit=min(1.0, max(0.0, wait)))
+
+    def run(self):
+        """Consume until `stop` is called, reconnecting with backoff when the broker connection is lost."""
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                self._connect()
+                failures = 0
+                logger.info(f"Email transmitter consuming {self.queue_name}")
+                self._consume()
+            except AMQPError as e:
+                failures += 1
+                delay = min(30.0, 0.5 * 2 ** min(failures, 6))
+                logger.warning(f"Email transmitter lost the broker connection, reconnecting in {delay:.0f}s: {e!r}")
+                self._stopping.wait(delay)
+            finally:
+                self._close()
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"Email transmitter stopped: {self.received} received, {self.sent} sent, "
+                    f"{self.retried} retried, {self.rejected} rejected in {self.batches} batches")
+
+    def _close(self):
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None:
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+
+    def stop(self):
+        """Stop after the messages taken so far are settled; safe to call from a signal handler."""
+        self._stopping.set()
+
+    # Worker threads
+
+    def _send(self, batch: List[_Delivery]) -> List[Tuple[str, bytes]]:
+        """
+        Send a batch with one Mailjet bulk call. Returns, for each delivery, (ACK, body),
+        (REJECT, body) or (RETRY, body of the copy for the recipients still to be sent to).
+        """
+        mailjet_messages, recipients = [], []  # recipients: (delivery index, email) of each Mailjet message
+        parsed: List[Optional[Dict[str, Any]]] = []
+        for index, delivery in enumerate(batch):
+            try:
+                message = json.loads(delivery.body)
+                event = self.events[message['event']]
+                to_emails = list(message['to_emails'])
+                variables = message.get('data') or {}
+            except (ValueError, TypeError, KeyError) as e:
+                logger.error(f"Cannot send email transmitter message: {type(e).__name__}: {e}")
+                parsed.append(None)
+                continue
+            parsed.append(message)
+            for to_email in to_emails:
+                mailjet_messages.append(self.mailjet_service.build_message(
+                    to_email, event['template_id'], variables, event['subject']
+                ))
+                recipients.append((index, to_email))
+
+        unsent: Dict[int, List[str]] = {}
+        for (index, to_email), accepted in zip(recipients, self.mailjet_service.send_batch(mailjet_messages)):
+            if not accepted:
+                unsent.setdefault(index, []).append(to_email)
+
+        results = []
+        for index, (delivery, message) in enumerate(zip(batch, parsed)):
+            if message is None:
+                results.append((REJECT, delivery.body))
+            elif index in unsent:
+                results.append((RETRY, json.dumps({**message, 'to_emails': unsent[index]}).encode()))
+            else:
+                results.append((ACK, delivery.body))
+        return results
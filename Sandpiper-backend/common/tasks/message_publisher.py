@@ -0,0 +1,277 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Optional, Set, Tuple
+
+import pika
+from pika.exchange_type import ExchangeType
+
+from common.app_config import config
+from common.app_logger import logger
+from common.helpers.exceptions import ServiceUnavailableError
+
+
+class _Message:
+    __slots__ = ('queue_name', 'exchange_name', 'body', 'properties', 'declare', 'future', 'attempts')
+
+    def __init__(self, queue_name: str, exchange_name: Optional[str], body: bytes,
+                 properties: pika.BasicProperties, declare: bool):
+        self.queue_name = queue_name
+        self.exchange_name = exchange_name
+        self.body = body
+        self.properties = properties
+        self.declare = declare
+        self.future = Future()
+        self.attempts = 0
+
+
+class MessagePublisher:
+    """
+    Publishes to RabbitMQ from a pool of long-lived connections, so callers never wait for the broker.
+
+    `publish` only appends the message to a buffer of at most `buffer_size` messages and returns
+    a Future. Each of `pool_size` worker threads owns one connection with a confirming channel,
+    takes up to `batch_size` buffered messages at a time and resolves each Future once the broker
+    confirmed the message, declaring queues and exchanges only the first time its connection
+    publishes to them. Connections send heartbeats while idle. After a connection failure the
+    worker reconnects with backoff and publishes the unsent messages again; a message that
+    failed `max_attempts` times, or arrives while the buffer is full, gets an exception instead
+    (ServiceUnavailableError for a full buffer).
+    """
+
+    def __init__(self, parameters: pika.ConnectionParameters, pool_size: int, buffer_size: int, batch_size: int,
+                 max_attempts: int, retry_max_seconds: float,
+                 connection_factory: Callable[[pika.ConnectionParameters], pika.BlockingConnection] = None):
+        self.parameters = parameters
+        self.pool_size = max(1, pool_size)
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_max_seconds = retry_max_seconds
+        self._connection_factory = connection_factory or pika.BlockingConnection
+        # Heartbeats are sent while a worker waits for messages
+        self._idle_wait = max(0.1, (parameters.heartbeat or 60) / 2)
+
+        self._buffer: queue.Queue = queue.Queue(maxsize=max(1, buffer_size))
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+        self._closed = threading.Event()
+
+        self._connected = 0
+        self._published = 0
+        self._failed = 0
+        self._rejected = 0
+        self._retries = 0
+        self._reconnects = 0
+
+    def publish(self, queue_name: str, body: bytes, properties: pika.BasicProperties = None,
+                exchange_name: str = None, declare: bool = True) -> Future:
+        """
+        Buffer a message for `queue_name`, routed through the topic exchange `exchange_name` when given.
+        With `declare`, the durable queue (and exchange) are declared before the first publish.
+        Returns a Future resolved when the broker confirmed the message; never blocks.
+        """
+        if properties is None:
+            properties = pika.BasicProperties(delivery_mode=2)  # Make the message persistent
+        message = _Message(queue_name, exchange_name, body, properties, declare)
+
+        if self._closed.is_set():
+            message.future.set_exception(ServiceUnavailableError("Message publisher is closed."))
+            return message.future
+        self._start()
+        try:
+            self._buffer.put_nowait(message)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"Message buffer full, dropped a message to queue: {queue_name}")
+            message.future.set_exception(ServiceUnavailableError("Too many messages waiting for the broker."))
+        return message.future
+
+    def _start(self):
+        if self._workers:
+            return
+        with self._lock:
+            if not self._workers:
+                self._workers = [
+                    threading.Thread(target=self._run, name=f'message-publisher-{i}', daemon=True)
+                    for i in range(self.pool_size)
+                ]
+                for worker in self._workers:
+                    worker.start()
+
+    def _take(self, pending: Deque[_Message]) -> List[_Message]:
+        """Messages to publish next: unsent ones first, then the buffer, waiting at most `_idle_wait` for one."""
+        batch = [pending.popleft() for _ in range(min(len(pending), self.batch_size))]
+        if not batch:
+            try:
+                batch.append(self._buffer.get(timeout=self._idle_wait))
+            except queue.Empty:
+                return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._buffer.get_nowait())
+            except queue.Empty:
+                break
+        # None is put by `close` to wake waiting workers
+        return [message for message in batch if message is not None]
+
+    @staticmethod
+    def _publish(channel, declared: Set[Tuple[str, str]], message: _Message):
+        exchange_name = message.exchange_name or ""
+        if message.declare and (exchange_name, message.queue_name) not in declared:
+            if exchange_name:
+                channel.exchange_declare(exchange=exchange_name, exchange_type=ExchangeType.topic.value, durable=True)
+            channel.queue_declare(queue=message.queue_name, durable=True)
+            declared.add((exchange_name, message.queue_name))
+        # The channel is in confirm mode: this returns once the broker took the message, and raises if it refused it
+        channel.basic_publish(
+            exchange=exchange_name,
+            routing_key=message.queue_name,
+            body=message.body,
+            properties=message.properties,
+        )
+
+    def _fail(self, message: _Message, error: Exception):
+        with self._lock:
+            self._failed += 1
+        logger.error(f"Could not publish a message to queue {message.queue_name}: {error!r}")
+        message.future.set_exception(error)
+
+    def _run(self):
+        connection = channel = None
+        declared: Set[Tuple[str, str]] = set()
+        pending: Deque[_Message] = deque()
+        failures = 0
+
+        while not (self._closed.is_set() and not pending and self._buffer.empty()):
+            batch = self._take(pending)
+            if not batch:
+                if connection is not None:
+                    try:
+                        connection.process_data_events(time_limit=0)
+                    except Exception:
+                        connection = self._disconnect(connection)
+                continue
+
+            sent = 0
+            try:
+                if connection is None:
+                    connection = self._connection_factory(self.parameters)
+                    with self._lock:
+                        self._connected += 1
+                        self._reconnects += bool(failures)
+                    channel = connection.channel()
+                    channel.confirm_delivery()
+                    declared = set()
+                for message in batch:
+                    self._publish(channel, declared, message)
+                    message.future.set_result(None)
+                    sent += 1
+                failures = 0
+                with self._lock:
+                    self._published += sent
+            except Exception as e:
+                with self._lock:
+                    self._published += sent
+                connection = self._disconnect(connection)
+                failures += 1
+
+                # Every unsent message of the batch used up an attempt, kept in order for the next one
+                retried = 0
+                for message in reversed(batch[sent:]):
+                    message.attempts += 1
+                    if message.attempts >= self.max_attempts:
+                        self._fail(message, e)
+                    else:
+                        pending.appendleft(message)
+                        retried += 1
+                with self._lock:
+                    self._retries += retried
+                if retried:
+                    logger.warning(f"Publishing to the message broker failed, retrying {retried} messages: {e!r}")
+                self._closed.wait(min(self.retry_max_seconds, 0.5 * 2 ** min(failures - 1, 10)))
+
+        self._disconnect(connection)
+
+    def _disconnect(self, connection):
+        if connection is not None:
+            with self._lock:
+                self._connected -= 1
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+        return None
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting messages and give the workers `timeout` seconds to publish the buffered ones."""
+        self._closed.set()
+        for _ in self._workers:
+            try:
+                self._buffer.put_nowait(None)
+            except queue.Full:
+                break  # the workers are busy, not waiting
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self._connected,
+                "pool_size": self.pool_size,
+                "buffered": self._buffer.qsize(),
+                "buffer_size": self._buffer.maxsize,
+                "published": self._published,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "retries": self._retries,
+                "reconnects": self._reconnects,
+            }
+
+
+_publisher = None
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+
+def get_message_publisher() -> MessagePublisher:
+    """
+    Return the process-wide message publisher, creating it on first use.
+    A forked child opens its own connections instead of sharing the parent's.
+    """
+    global _publisher, _publisher_pid
+
+    pid = os.getpid()
+    if _publisher is not None and _publisher_pid == pid:
+        return _publisher
+
+    from common.tasks.send_message import get_connection_parameters
+
+    with _publisher_lock:
+        if _publisher is None or _publisher_pid != pid:
+            _publisher = MessagePublisher(
+                parameters=get_connection_parameters(),
+                pool_size=config.RABBITMQ_PUBLISHER_CONNECTIONS,
+                buffer_size=config.RABBITMQ_PUBLISH_BUFFER_SIZE,
+                batch_size=config.RABBITMQ_PUBLISH_BATCH_SIZE,
+                max_attempts=config.RABBITMQ_PUBLISH_MAX_ATTEMPTS,
+                retry_max_seconds=config.RABBITMQ_PUBLISH_RETRY_MAX_SECONDS,
+            )
+            _publisher_pid = pid
+            # Buffered messages are published before a clean exit, within a bound
+            atexit.register(_publisher.close)
+    return _publisher
+
+
+def get_message_publisher_stats() -> Optional[dict]:
+    """Statistics of the process-wide message publisher, or None when this process has not created it."""
+    instance = _publisher
+    if instance is None or _publisher_pid != os.getpid():
+        return None
+    return instance.stats()
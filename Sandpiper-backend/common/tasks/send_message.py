@@ -1,10 +1,9 @@
 import pika
 import json
-import time
-from pika.exchange_type import ExchangeType
+from concurrent.futures import Future
 
 from common.app_config import config
-from common.app_logger import logger
+from common.tasks.message_publisher import get_message_publisher
 
 
 def get_connection_parameters() -> pika.ConnectionParameters:
@@ -15,56 +14,25 @@ def get_connection_parameters() -> pika.ConnectionParameters:
         credentials=pika.credentials.PlainCredentials(
             username=config.RABBITMQ_USER,
             password=config.RABBITMQ_PASSWORD
-        )
+        ),
+        heartbeat=config.RABBITMQ_HEARTBEAT_SECONDS,
+        blocked_connection_timeout=config.RABBITMQ_BLOCKED_CONNECTION_TIMEOUT,
     )
 
-def establish_connection(parameters: pika.ConnectionParameters, max_retries: int = 10) -> pika.BlockingConnection:
-    retries = 0
-    while retries < max_retries:
-        try:
-            connection = pika.BlockingConnection(parameters)
-            return connection
-        except Exception as e:
-            logger.debug(f"Could not connect to messaging system. Retries {retries}")
-            retries += 1
-            if retries < max_retries:
-                time.sleep(2 ** retries)
-            else:
-                logger.error("Error connecting to RabbitMQ after multiple retries")
-                raise e
 
 class MessageSender:
-    def __init__(self):
-        self.parameters = get_connection_parameters()
+    """
+    Sends JSON messages through the process-wide MessagePublisher; creating one opens nothing.
+    """
 
-    def send_message(self, queue_name: str, data: dict, properties: pika.BasicProperties = None, exchange_name: str = None) -> None:
+    def send_message(self, queue_name: str, data: dict, properties: pika.BasicProperties = None, exchange_name: str = None) -> Future:
         """
-        Sends a message to the specified RabbitMQ queue.
+        Sends a message to the specified RabbitMQ queue without waiting for the broker.
 
         :param queue_name: Name of the RabbitMQ queue to send the message to.
         :param data: The data to send to the queue as a dictionary.
-        :return: None
+        :return: Future resolved once the broker confirmed the message, or failed when it could not be sent.
         """
-        connection = establish_connection(self.parameters)
-
-        with connection:
-            channel = connection.channel()
-
-            if properties is None:
-                properties = pika.BasicProperties(
-                    delivery_mode=2,  # Make the message persistent
-                )
-
-            if exchange_name is None:
-                exchange_name = ""
-            else:
-                channel.exchange_declare(exchange=exchange_name, exchange_type=ExchangeType.topic.value, durable=True)
-
-            channel.queue_declare(queue=queue_name, durable=True)
-            channel.basic_publish(
-                exchange=exchange_name,
-                routing_key=queue_name,
-                body=json.dumps(data).encode(),
-                properties=properties,
-            )
-            logger.info(f"Sent message to queue: {queue_name}")
+        return get_message_publisher().publish(
+            queue_name, json.dumps(data).encode(), properties=properties, exchange_name=exchange_name
+        )
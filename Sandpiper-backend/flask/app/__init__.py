@@ -1,12 +1,11 @@
-from flask import Flask, g, Request
+from flask import Flask, g, Request, request
 from flask_restx import Api
 from flask_cors import CORS
 
 
-from rococo.plugins.pooled_connection import PooledConnectionPlugin
 from rococo.models.versioned_model import ModelValidationError
 
-from common.helpers.exceptions import InputValidationError, APIException
+from common.helpers.exceptions import InputValidationError, APIException, ServiceUnavailableError
 
 from common.app_config import get_config
 from common.utils.version import get_service_version, get_project_name
@@ -42,11 +41,23 @@ def create_app():
 
     api.init_app(app)
 
+    # Load revoked access tokens before the first request; if that fails, requests check the database until a retry succeeds
+    from common.helpers.token_revocation import get_token_revocation_list
+    get_token_revocation_list().refresh()
+
+    # Report the queries the request's identity map saved
+    @app.after_request
+    def report_identity_map(response):
+        identity_map = g.get('identity_map')
+        if identity_map is not None and identity_map.hits:
+            logger.debug(f"{request.method} {request.path}: identity map deduplicated {identity_map.hits} queries")
+            if config.DEBUG:
+                response.headers['X-Identity-Map-Hits'] = str(identity_map.hits)
+        return response
+
     # Add simple CORS support
     CORS(app)
 
-    PooledConnectionPlugin(app, database_type="postgres")
-
     @app.route('/')
     def hello_world():
         return 'Welcome to Sandpiper API.'
@@ -70,4 +81,15 @@ def create_app():
         from app.helpers.response import get_failure_response
         return get_failure_response(message=str(exception))
 
+    @app.errorhandler(ServiceUnavailableError)
+    def handle_service_unavailable_error(exception):
+        from app.helpers.response import get_failure_response
+        return get_failure_response(message=str(exception), status_code=503)
+
+    # Flask-Restx answers 500 for exceptions raised in resources unless it has its own handler
+    # (or exceptions propagate, as in debug and testing), so overload is reported here as well.
+    @api.errorhandler(ServiceUnavailableError)
+    def handle_api_service_unavailable_error(exception):
+        return dict(success=False, message=str(exception)), 503
+
     return app
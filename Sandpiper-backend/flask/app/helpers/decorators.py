@@ -7,12 +7,18 @@ from common.app_logger import logger
 from common.app_config import config
 
 from common.services import OrganizationService, PersonOrganizationRoleService
-from common.helpers.auth import parse_access_token, create_person_from_token, create_email_from_token
+from common.helpers.auth import verify_access_token
+from common.helpers.token_revocation import get_token_revocation_list
 from flask import request, g
 
 
 def login_required():
     def decorator(func):
+        # Inspect the view once, not on every request
+        func_params = signature(func).parameters
+        pass_person = 'person' in func_params
+        pass_email = 'email' in func_params
+
         @wraps(func)
         def wrapper(self, *args, **kwargs):
             if 'Authorization' not in request.headers:
@@ -21,16 +27,20 @@ def login_required():
             data = request.headers['Authorization']
             token = str.replace(str(data), 'Bearer ', '')
             try:
-                parsed_token = parse_access_token(token)
+                verified_token = verify_access_token(token)
 
-                if not parsed_token:
+                if not verified_token:
                     return get_failure_response(message='Access token is invalid', status_code=401)
 
-                person = create_person_from_token(parsed_token)
-                email = create_email_from_token(parsed_token)
+                if get_token_revocation_list().is_revoked(verified_token.claims.get('jti')):
+                    return get_failure_response(message='Access token has been revoked', status_code=401)
+
+                person = verified_token.person()
+                email = verified_token.email()
 
                 g.person = person
                 g.email = email
+                g.token_claims = verified_token.claims
                 g.current_user_id = person.entity_id  # for auditing
 
             except Exception as e:
@@ -38,13 +48,12 @@ def login_required():
                 abort(500)
 
             # handle arguments based on the function parameters
-            func_params = signature(func).parameters
             extra_args = {}
 
-            if 'person' in func_params:
+            if pass_person:
                 extra_args['person'] = person
 
-            if 'email' in func_params:
+            if pass_email:
                 extra_args['email'] = email
 
             return func(self, *args, **kwargs, **extra_args)
@@ -55,7 +64,18 @@ def login_required():
 
 
 def organization_required(with_roles=None):
+    """
+    Authorizes the organization in the x-organization-id header for the person set by login_required.
+
+    Sets g.organization_id and g.organization_role. g.organization and g.role hold the models when
+    the view takes `organization` or `role`, or when the database had to be checked, and None otherwise.
+    """
     def decorator(func):
+        # Inspect the view once, not on every request
+        func_params = signature(func).parameters
+        pass_role = 'role' in func_params
+        pass_organization = 'organization' in func_params
+
         @wraps(func)
         def wrapper(self, *args, **kwargs):
             if 'x-organization-id' not in request.headers:
@@ -66,39 +86,60 @@ def organization_required(with_roles=None):
             if not person:
                 raise Exception("organization_required decorator should be used after login_required decorator.")
 
-            organization_service = OrganizationService(config)
-            person_organization_role_service = PersonOrganizationRoleService(config)
-
             organization_id = request.headers['x-organization-id']
-            organization = organization_service.get_organization_by_id(organization_id)
-            if not organization:
-                return get_failure_response(message='Organization ID is invalid', status_code=403)
-
-            person_organization_role = person_organization_role_service.get_role_of_person_in_organization(
-                person_id=person.entity_id,
-                organization_id=organization.entity_id
-            )
-            if not person_organization_role:
-                return get_failure_response(message="User is not authorized to use this organization.", status_code=401)
+            organization = person_organization_role = role = None
+
+            # Trust the memberships embedded in the access token while the person's membership version is unchanged
+            claims = getattr(g, 'token_claims', None) or {}
+            embedded_memberships = claims.get('organizations')
+            if embedded_memberships is not None:
+                person_organization_role_service = PersonOrganizationRoleService(config)
+                if person_organization_role_service.is_membership_version_current(
+                        person.entity_id, claims.get('membership_version')):
+                    role = embedded_memberships.get(organization_id)
+
+            if role is None:
+                # Stale or missing claims, or not a member: check the database (cached)
+                organization, person_organization_role = OrganizationService(config).get_membership(
+                    person_id=person.entity_id,
+                    organization_id=organization_id
+                )
+                if not organization:
+                    return get_failure_response(message='Organization ID is invalid', status_code=403)
+
+                if not person_organization_role:
+                    return get_failure_response(message="User is not authorized to use this organization.", status_code=401)
+
+                role = person_organization_role.role
 
             # If with_roles is specified, verify the user's role is allowed.
             if with_roles is not None:
-                if person_organization_role.role not in with_roles:
+                if role not in with_roles:
                     return get_failure_response(
                         message="User is not authroized to perform this operation on this organization.",
                         status_code=403
                     )
 
+            # Models are only loaded for views that take them
+            if organization is None and (pass_role or pass_organization):
+                organization, person_organization_role = OrganizationService(config).get_membership(
+                    person_id=person.entity_id,
+                    organization_id=organization_id
+                )
+                if not organization or not person_organization_role:
+                    return get_failure_response(message="User is not authorized to use this organization.", status_code=401)
+
+            g.organization_id = organization_id
+            g.organization_role = role
             g.role = person_organization_role
             g.organization = organization
 
             # handle arguments based on the function parameters
-            func_params = signature(func).parameters
             extra_args = {}
-            if 'role' in func_params:
+            if pass_role:
                 extra_args['role'] = person_organization_role
 
-            if 'organization' in func_params:
+            if pass_organization:
                 extra_args['organization'] = organization
 
             return func(self, *args, **kwargs, **extra_args)
@@ -122,10 +163,14 @@ def token_required(func):
         data = request.headers['Authorization']
         token = str.replace(str(data), 'Bearer ', '')
         try:
-            parsed_token = parse_access_token(token)
+            verified_token = verify_access_token(token)
 
-            if not parsed_token:
+            if not verified_token:
                 return get_failure_response(message='Access token is invalid', status_code=401)
+            parsed_token = verified_token.claims
+
+            if get_token_revocation_list().is_revoked(parsed_token.get('jti')):
+                return get_failure_response(message='Access token has been revoked', status_code=401)
 
             # Set user ID in request object - check for both person_id and person_entity_id
             user_id = parsed_token.get('person_entity_id') or parsed_token.get('person_id')
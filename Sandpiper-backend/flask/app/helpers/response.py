@@ -1,4 +1,4 @@
-from flask import current_app as app
+from flask import current_app as app, request
 from common.helpers.exceptions import InputValidationError
 
 
@@ -49,3 +49,41 @@ def get_failure_response(message, status_code=200):
 def get_success_response(status_code=200, **data):
     response = _get_response(dict(success=True, **data), status_code)
     return response
+
+
+def get_success_response_from_json(status_code=200, **json_fragments):
+    """
+    Like get_success_response, but every value is an already serialized JSON fragment (bytes),
+    e.g. from common.helpers.json_serializer, so large payloads are not encoded twice.
+    """
+    body = b''.join(
+        [b'{"success":true'] +
+        [b',"' + key.encode() + b'":' + fragment for key, fragment in json_fragments.items()] +
+        [b'}']
+    )
+    return app.response_class(response=body, status=status_code, mimetype=app.config['MIME_TYPE'])
+
+
+def get_request_etags():
+    """
+    Entity tags named by the request's If-None-Match header, weak ones included.
+    """
+    return request.if_none_match.as_set(include_weak=True)
+
+
+def is_not_modified(etag):
+    """
+    Whether the request's If-None-Match already names this (weak) entity tag.
+    """
+    return request.if_none_match.contains_weak(etag)
+
+
+def get_not_modified_response(etag):
+    response = app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,18 @@
+revision = "0000000007"
+down_revision = "0000000006"
+
+
+def upgrade(migration):
+    # Serves the todo list and its keyset pagination as an index range scan.
+    # Its leading person_id column makes the single-column index redundant.
+    migration.add_index("todo", "todo_person_id_active_changed_on_entity_id_ind", "person_id, active, changed_on DESC, entity_id")
+    migration.remove_index("todo", "todo_person_id_ind")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.add_index("todo", "todo_person_id_ind", "person_id")
+    migration.remove_index("todo", "todo_person_id_active_changed_on_entity_id_ind")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,15 @@
+revision = "0000000008"
+down_revision = "0000000007"
+
+
+def upgrade(migration):
+    # Lets the history export read one person's audited versions without scanning every audit row.
+    migration.add_index("todo_audit", "todo_audit_person_id_entity_id_ind", "person_id, entity_id")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.remove_index("todo_audit", "todo_audit_person_id_entity_id_ind")
+
+    migration.update_version_table(version=down_revision)
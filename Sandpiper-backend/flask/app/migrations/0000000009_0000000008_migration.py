@@ -0,0 +1,16 @@
+revision = "0000000009"
+down_revision = "0000000008"
+
+
+def upgrade(migration):
+    # Serves GET /todo/changes: a range scan over one person's todos by change time,
+    # soft-deleted rows included, which the active-first list index cannot provide.
+    migration.add_index("todo", "todo_person_id_changed_on_entity_id_ind", "person_id, changed_on, entity_id")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.remove_index("todo", "todo_person_id_changed_on_entity_id_ind")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,23 @@
+revision = "0000000010"
+down_revision = "0000000009"
+
+
+def upgrade(migration):
+    # Per-person counter bumped on every role change. Access tokens carry the value they were
+    # issued with, so organization_required can trust embedded memberships while it matches.
+    migration.create_table(
+        "person_membership_version",
+        """
+            "person_id" varchar(32) NOT NULL,
+            "version" bigint NOT NULL DEFAULT 0,
+            PRIMARY KEY ("person_id")
+        """
+    )
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.drop_table(table_name="person_membership_version")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,35 @@
+revision = "0000000011"
+down_revision = "0000000010"
+
+
+def upgrade(migration):
+    # Rotating refresh tokens. Only a SHA-256 of each token is stored; the primary key makes
+    # POST /auth/refresh a single index lookup. Tokens issued from one login share a family_id,
+    # so reuse of a rotated token can revoke the whole chain.
+    migration.create_table(
+        "refresh_token",
+        """
+            "token_hash" varchar(64) NOT NULL,
+            "family_id" varchar(32) NOT NULL,
+            "login_method_id" varchar(32) NOT NULL,
+            "person_id" varchar(32) NOT NULL,
+            "email_id" varchar(32) NOT NULL,
+            "created_on" timestamp NOT NULL,
+            "expires_at" timestamp NOT NULL,
+            "session_expires_at" timestamp NOT NULL,
+            "used_on" timestamp NULL DEFAULT NULL,
+            "revoked" boolean NOT NULL DEFAULT false,
+            PRIMARY KEY ("token_hash")
+        """
+    )
+    migration.add_index("refresh_token", "refresh_token_family_id_ind", "family_id")
+    migration.add_index("refresh_token", "refresh_token_login_method_id_ind", "login_method_id")
+    migration.add_index("refresh_token", "refresh_token_person_id_ind", "person_id")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.drop_table(table_name="refresh_token")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,34 @@
+revision = "0000000012"
+down_revision = "0000000011"
+
+
+def upgrade(migration):
+    # Revoked access tokens, by their jti claim, kept until the token would have expired anyway.
+    # API processes load the live rows into an in-memory Bloom filter and then poll for rows
+    # revoked since their last poll, so "revoked_on" is indexed.
+    migration.create_table(
+        "revoked_token",
+        """
+            "jti" varchar(32) NOT NULL,
+            "person_id" varchar(32) NULL DEFAULT NULL,
+            "expires_at" timestamp NOT NULL,
+            "revoked_on" timestamp NOT NULL,
+            PRIMARY KEY ("jti")
+        """
+    )
+    migration.add_index("revoked_token", "revoked_token_revoked_on_ind", "revoked_on")
+    migration.add_index("revoked_token", "revoked_token_expires_at_ind", "expires_at")
+
+    # The access token issued alongside each refresh token, so ending a session also revokes it
+    migration.add_column("refresh_token", "access_jti", "varchar(32) NULL DEFAULT NULL")
+    migration.add_column("refresh_token", "access_expires_at", "timestamp NULL DEFAULT NULL")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.drop_column("refresh_token", "access_expires_at")
+    migration.drop_column("refresh_token", "access_jti")
+    migration.drop_table(table_name="revoked_token")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,32 @@
+revision = "0000000013"
+down_revision = "0000000012"
+
+
+def upgrade(migration):
+    # Emails to send, written in the same transaction as the data they are about and delivered
+    # by the email outbox relay (flask/email_outbox_relay.py), which deletes a row once it is sent.
+    # "available_at" is when the next attempt may start; rows that ran out of attempts keep
+    # "failed_on" and "last_error" for inspection and are not retried.
+    migration.create_table(
+        "email_outbox",
+        """
+            "id" bigserial NOT NULL,
+            "event" varchar(64) NOT NULL,
+            "message" jsonb NOT NULL,
+            "created_on" timestamp NOT NULL,
+            "available_at" timestamp NOT NULL,
+            "attempts" integer NOT NULL DEFAULT 0,
+            "last_error" text NULL DEFAULT NULL,
+            "failed_on" timestamp NULL DEFAULT NULL,
+            PRIMARY KEY ("id")
+        """
+    )
+    migration.add_index("email_outbox", "email_outbox_available_at_ind", "available_at")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.drop_table(table_name="email_outbox")
+
+    migration.update_version_table(version=down_revision)
@@ -3,6 +3,7 @@ from app.views.organization import organization_api
 from app.views.person import person_api
 from app.views.todo import todo_api
 from app.views.test import test_api
+from app.views.metrics import metrics_api
 
 def initialize_views(api):
     api.add_namespace(auth_api)
@@ -10,3 +11,4 @@ def initialize_views(api):
     api.add_namespace(person_api)
     api.add_namespace(todo_api)
     api.add_namespace(test_api)
+    api.add_namespace(metrics_api)
@@ -1,8 +1,10 @@
 from flask_restx import Namespace, Resource
-from flask import request
+from flask import request, g
+from app.helpers.decorators import login_required
 from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields
 from common.app_config import config
-from common.services import AuthService, PersonService
+from common.services import AuthService
+from common.helpers.exceptions import InputValidationError
 
 # Create the auth blueprint
 auth_api = Namespace('auth', description="Auth related APIs")
@@ -54,15 +56,59 @@ class Login(Resource):
         validate_required_fields(parsed_body)
 
         auth_service = AuthService(config)
-        access_token, expiry = auth_service.login_user_by_email_password(
+        access_token, expiry, person, refresh_token, refresh_token_expiry = auth_service.login_user_by_email_password(
             parsed_body['email'], 
             parsed_body['password']
         )
 
-        person_service = PersonService(config)
-        person = person_service.get_person_by_email_address(email_address=parsed_body['email'])
+        return get_success_response(person=person.as_dict(), access_token=access_token, expiry=expiry,
+                                    refresh_token=refresh_token, refresh_token_expiry=refresh_token_expiry)
 
-        return get_success_response(person=person.as_dict(), access_token=access_token, expiry=expiry)
+
+@auth_api.route('/refresh', doc=dict(description="Exchange a refresh token for a new access token"))
+class Refresh(Resource):
+    @auth_api.expect(
+        {'type': 'object', 'properties': {
+            'refresh_token': {'type': 'string'}
+        }}
+    )
+    def post(self):
+        """
+        Issue a new access token and rotate the refresh token; the presented refresh token can not be used again
+        """
+        parsed_body = parse_request_body(request, ['refresh_token'])
+        validate_required_fields(parsed_body)
+
+        auth_service = AuthService(config)
+        try:
+            access_token, expiry, refresh_token, refresh_token_expiry = auth_service.refresh_access_token(
+                parsed_body['refresh_token']
+            )
+        except InputValidationError as e:
+            return get_failure_response(message=str(e), status_code=401)
+
+        return get_success_response(access_token=access_token, expiry=expiry,
+                                    refresh_token=refresh_token, refresh_token_expiry=refresh_token_expiry)
+
+
+@auth_api.route('/logout', doc=dict(description="Revoke the access token and, when given, the refresh token's session"))
+class Logout(Resource):
+    @auth_api.expect(
+        {'type': 'object', 'properties': {
+            'refresh_token': {'type': 'string'}
+        }}
+    )
+    @login_required()
+    def post(self):
+        """
+        Revoke the access token of this request; with a refresh_token in the body its whole session ends as well
+        """
+        request_body = request.get_json(silent=True) or {}
+
+        auth_service = AuthService(config)
+        auth_service.logout(g.token_claims, refresh_token=request_body.get('refresh_token'))
+
+        return get_success_response(message="You have been logged out.")
 
 
 @auth_api.route('/forgot_password', doc=dict(description="Send reset password link"))
@@ -97,10 +143,14 @@ class ResetPassword(Resource):
         validate_required_fields(parsed_body)
 
         auth_service = AuthService(config)
-        access_token, expiry, person_obj = auth_service.reset_user_password(token, uidb64, parsed_body.get('password'))
+        access_token, expiry, person_obj, refresh_token, refresh_token_expiry = auth_service.reset_user_password(
+            token, uidb64, parsed_body.get('password')
+        )
         return get_success_response(
             message="Your password has been updated!", 
             access_token=access_token, 
             expiry=expiry,
+            refresh_token=refresh_token,
+            refresh_token_expiry=refresh_token_expiry,
             person=person_obj.as_dict()
         )
@@ -0,0 +1,35 @@
+import hmac
+
+from flask import request
+from flask_restx import Namespace, Resource
+from app.helpers.response import get_success_response, get_failure_response
+from common.app_config import config
+from common.helpers.cache import get_cache_stats
+from common.helpers.password_hasher import get_password_hasher_stats
+from common.helpers.token_revocation import get_token_revocation_stats
+from common.repositories.connection_pool import get_connection_pool_stats
+from common.repositories.notification_listener import get_notification_listener_stats
+from common.tasks.message_publisher import get_message_publisher_stats
+
+# Create the metrics namespace
+metrics_api = Namespace('metrics', description="Runtime metrics of this API process")
+
+
+@metrics_api.route('/')
+class Metrics(Resource):
+    def get(self):
+        """
+        Connection pool, cache, event stream, password hashing, token revocation and message publishing statistics
+        of this worker process. Needs the METRICS_TOKEN in the X-Metrics-Token header; components this process
+        has not started yet are null.
+        """
+        if not config.METRICS_TOKEN:
+            return get_failure_response(message="Not found", status_code=404)
+        if not hmac.compare_digest(request.headers.get('X-Metrics-Token', '').encode(), config.METRICS_TOKEN.encode()):
+            return get_failure_response(message="Invalid metrics token", status_code=401)
+
+        return get_success_response(db_pool=get_connection_pool_stats(), caches=get_cache_stats(),
+                                    notifications=get_notification_listener_stats(),
+                                    password_hasher=get_password_hasher_stats(),
+                                    token_revocation=get_token_revocation_stats(),
+                                    message_publisher=get_message_publisher_stats())
@@ -1,6 +1,7 @@
 from flask_restx import Namespace, Resource
 from flask import request
-from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields
+from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields, \
+    get_not_modified_response, is_not_modified, with_etag
 from common.app_config import config
 from common.services import OrganizationService, PersonService
 from app.helpers.decorators import login_required, organization_required
@@ -15,8 +16,13 @@ class Organizations(Resource):
     @login_required()
     def get(self, person):
         organization_service = OrganizationService(config)
+        # Computed before the list is read, so a concurrent change can only make the tag too old.
+        etag = organization_service.get_organizations_with_roles_etag(person.entity_id)
+        if is_not_modified(etag):
+            return get_not_modified_response(etag)
+
         organizations = organization_service.get_organizations_with_roles_by_person(person.entity_id)
-        return get_success_response(organizations=organizations)
+        return with_etag(get_success_response(organizations=organizations), etag)
 
     @login_required()
     @organization_required(with_roles=["admin"])
@@ -1,9 +1,11 @@
 from flask_restx import Namespace, Resource
 from flask import request
-from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields
+from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields, \
+    get_not_modified_response, is_not_modified, with_etag
 from app.helpers.decorators import login_required, token_required
 from common.app_config import config
 from common.services import PersonService
+from common.helpers.string_utils import make_etag
 
 # Create the person blueprint
 person_api = Namespace('person', description="Person-related APIs")
@@ -14,7 +16,11 @@ class Me(Resource):
     
     @login_required()
     def get(self, person):
-        return get_success_response(person=person)
+        # The person is read from the access token, so these fields are all that can change.
+        etag = make_etag(person.entity_id, person.first_name, person.last_name)
+        if is_not_modified(etag):
+            return get_not_modified_response(etag)
+        return with_etag(get_success_response(person=person), etag)
     
     @token_required
     @person_api.doc(security='Bearer')
@@ -5,6 +5,8 @@ from common.app_config import config
 from common.services import AuthService, PersonService
 from common.models import Person, Email, LoginMethod, Organization, PersonOrganizationRole
 from common.models.login_method import LoginMethodType
+from common.helpers.exceptions import ServiceUnavailableError
+from common.repositories.unit_of_work import UnitOfWork
 from common.services import EmailService, LoginMethodService, OrganizationService, PersonOrganizationRoleService
 
 # Create the test namespace - only available in non-production environments
@@ -46,39 +48,41 @@ class CreateTestUser(Resource):
             if existing_email:
                 return get_failure_response(message="Email address already registered")
 
-            # Create person
-            person = Person(
-                first_name=parsed_body['first_name'], 
-                last_name=parsed_body['last_name']
-            )
-            person = person_service.save_person(person)
+            # Saved in one transaction, so a failure part-way leaves no half-created user
+            with UnitOfWork():
+                # Create person
+                person = Person(
+                    first_name=parsed_body['first_name'], 
+                    last_name=parsed_body['last_name']
+                )
+                person = person_service.save_person(person)
 
-            # Create email
-            email = Email(person_id=person.entity_id, email=parsed_body['email_address'])
-            email = email_service.save_email(email)
+                # Create email
+                email = Email(person_id=person.entity_id, email=parsed_body['email_address'])
+                email = email_service.save_email(email)
 
-            # Create organization
-            organization = Organization(
-                name=f"{parsed_body['first_name']}'s Test Organization"
-            )
-            organization = organization_service.save_organization(organization)
+                # Create organization
+                organization = Organization(
+                    name=f"{parsed_body['first_name']}'s Test Organization"
+                )
+                organization = organization_service.save_organization(organization)
 
-            # Create login method with custom password
-            login_method = LoginMethod(
-                method_type=LoginMethodType.EMAIL_PASSWORD,
-                raw_password=parsed_body['password'],
-                person_id=person.entity_id,
-                email_id=email.entity_id
-            )
-            login_method = login_method_service.save_login_method(login_method)
+                # Create login method with custom password
+                login_method = LoginMethod(
+                    method_type=LoginMethodType.EMAIL_PASSWORD,
+                    raw_password=parsed_body['password'],
+                    person_id=person.entity_id,
+                    email_id=email.entity_id
+                )
+                login_method = login_method_service.save_login_method(login_method)
 
-            # Create person-organization role
-            person_organization_role = PersonOrganizationRole(
-                person_id=person.entity_id,
-                organization_id=organization.entity_id,
-                role="admin"
-            )
-            person_organization_role_service.save_person_organization_role(person_organization_role)
+                # Create person-organization role
+                person_organization_role = PersonOrganizationRole(
+                    person_id=person.entity_id,
+                    organization_id=organization.entity_id,
+                    role="admin"
+                )
+                person_organization_role_service.save_person_organization_role(person_organization_role)
 
             return get_success_response(
                 message="Test user created successfully",
@@ -86,6 +90,8 @@ class CreateTestUser(Resource):
                 email=email.email
             )
 
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             from common.app_logger import logger
             logger.error(f"Error creating test user: {str(e)}")
@@ -102,63 +108,49 @@ class DebugTodos(Resource):
             return get_failure_response(message="Test endpoints not available in production", status_code=404)
         
         try:
-            from common.services import TodoService
-            from common.repositories.factory import RepositoryFactory, RepoType
-            import psycopg2
-            
-            # Get database connection info
-            db_config = config
-            
-            # Connect directly to PostgreSQL
-            conn = psycopg2.connect(
-                host=db_config.POSTGRES_HOST,
-                port=db_config.POSTGRES_PORT,
-                user=db_config.POSTGRES_USER,
-                password=db_config.POSTGRES_PASSWORD,
-                database=db_config.POSTGRES_DB
-            )
+            from common.repositories.connection_pool import get_connection_pool
             
-            cursor = conn.cursor()
+            with get_connection_pool().connection() as conn:
+                cursor = conn.cursor()
             
-            # Check what tables exist
-            cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema='public' AND table_name LIKE '%todo%'")
-            tables = cursor.fetchall()
+                # Check what tables exist
+                cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema='public' AND table_name LIKE '%todo%'")
+                tables = cursor.fetchall()
             
-            # Execute raw SQL to see what's in the database
-            cursor.execute("SELECT entity_id, person_id, title, active, is_completed, changed_on, version FROM todo ORDER BY changed_on DESC LIMIT 10")
-            todo_rows = cursor.fetchall()
+                # Execute raw SQL to see what's in the database
+                cursor.execute("SELECT entity_id, person_id, title, active, is_completed, changed_on, version FROM todo ORDER BY changed_on DESC LIMIT 10")
+                todo_rows = cursor.fetchall()
             
-            # Also check the audit table
-            cursor.execute("SELECT entity_id, person_id, title, active, is_completed, changed_on, version FROM todo_audit ORDER BY changed_on DESC LIMIT 10")
-            audit_rows = cursor.fetchall()
+                # Also check the audit table
+                cursor.execute("SELECT entity_id, person_id, title, active, is_completed, changed_on, version FROM todo_audit ORDER BY changed_on DESC LIMIT 10")
+                audit_rows = cursor.fetchall()
             
-            # Convert to list of dicts
-            result = []
-            for row in todo_rows:
-                result.append({
-                    "entity_id": row[0],
-                    "person_id": row[1], 
-                    "title": row[2],
-                    "active": row[3],
-                    "is_completed": row[4],
-                    "changed_on": str(row[5]),
-                    "version": row[6]
-                })
+                # Convert to list of dicts
+                result = []
+                for row in todo_rows:
+                    result.append({
+                        "entity_id": row[0],
+                        "person_id": row[1], 
+                        "title": row[2],
+                        "active": row[3],
+                        "is_completed": row[4],
+                        "changed_on": str(row[5]),
+                        "version": row[6]
+                    })
             
-            audit_result = []
-            for row in audit_rows:
-                audit_result.append({
-                    "entity_id": row[0],
-                    "person_id": row[1], 
-                    "title": row[2],
-                    "active": row[3],
-                    "is_completed": row[4],
-                    "changed_on": str(row[5]),
-                    "version": row[6]
-                })
+                audit_result = []
+                for row in audit_rows:
+                    audit_result.append({
+                        "entity_id": row[0],
+                        "person_id": row[1], 
+                        "title": row[2],
+                        "active": row[3],
+                        "is_completed": row[4],
+                        "changed_on": str(row[5]),
+                        "version": row[6]
+                    })
             
-            cursor.close()
-            conn.close()
+                cursor.close()
             
             return get_success_response(
                 message="Debug data retrieved",
@@ -1,15 +1,29 @@
+import json
 from datetime import datetime
 from flask_restx import Namespace, Resource, fields
-from flask import request, g
+from flask import request, g, Response, stream_with_context
 
 from app.helpers.decorators import token_required
-from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields
+from app.helpers.response import get_success_response, get_success_response_from_json, get_failure_response, parse_request_body, validate_required_fields, \
+    get_request_etags, get_not_modified_response, is_not_modified, with_etag
 from common.app_config import config
 from common.services import TodoService
+from common.services.todo import MAX_BATCH_OPERATIONS, EXPORT_FORMATS, IMPORT_FORMATS, guess_import_format
+from common.helpers.exceptions import InputValidationError
+from common.helpers.json_serializer import dumps, dumps_todo_rows
+from common.repositories.notification_listener import RESYNC_EVENT
 
 # Create the todo namespace
 todo_api = Namespace('todo', description="Todo related APIs")
 
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+DEFAULT_CHANGES_LIMIT = 200
+MAX_CHANGES_LIMIT = 1000
+MAX_EXPORT_BATCH_SIZE = 10000
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EVENTS_RETRY_MS = 5000  # client reconnect delay announced on /todo/events
+
 # Define models for request/response validation
 todo_model = todo_api.model('Todo', {
     'entity_id': fields.String(description='Todo ID'),
@@ -38,30 +52,42 @@ todo_update_model = todo_api.model('TodoUpdate', {
 class TodoList(Resource):
     @token_required
     @todo_api.doc(security='Bearer')
-    @todo_api.doc(params={'status': 'Filter by completion status (completed, active, all)'})
+    @todo_api.doc(params={
+        'status': 'Filter by completion status (completed, active, all)',
+        'limit': f'Page size (1-{MAX_PAGE_LIMIT}); enables pagination',
+        'cursor': 'Opaque cursor from the previous page\'s next_cursor; enables pagination',
+    })
     def get(self):
         """
-        Get all todos for the current user
+        Get all todos for the current user, or one page of them when `limit` or `cursor` is given
         """
         status = request.args.get('status', 'all')
+        is_completed = {'completed': True, 'active': False}.get(status)
         
         todo_service = TodoService(config)
         
         try:
-            if status == 'completed':
-                todos = todo_service.get_todos_by_person_id_and_status(g.current_user_id, True)
-            elif status == 'active':
-                todos = todo_service.get_todos_by_person_id_and_status(g.current_user_id, False)
-            else:
-                todos = todo_service.get_todos_by_person_id(g.current_user_id)
-            
-            # Filter out any todos with missing data
-            valid_todos = []
-            for todo in todos:
-                if todo.person_id and todo.title:  # Only include valid todos
-                    valid_todos.append(todo)
-            
-            return get_success_response(todos=[todo.as_dict() for todo in valid_todos])
+            if 'limit' in request.args or 'cursor' in request.args:
+                try:
+                    limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+                except ValueError:
+                    return get_failure_response(message="limit must be an integer.")
+                if not 1 <= limit <= MAX_PAGE_LIMIT:
+                    return get_failure_response(message=f"limit must be between 1 and {MAX_PAGE_LIMIT}.")
+
+                todos, next_cursor = todo_service.get_todos_page(
+                    g.current_user_id, limit, is_completed=is_completed, cursor=request.args.get('cursor')
+                )
+                return get_success_response_from_json(todos=dumps_todo_rows(todos), next_cursor=dumps(next_cursor))
+
+            etag, payload = todo_service.get_todos_json(
+                g.current_user_id, is_completed, known_etags=get_request_etags()
+            )
+            if payload is None:
+                return get_not_modified_response(etag)
+            return with_etag(get_success_response_from_json(todos=payload), etag)
+        except InputValidationError as e:
+            return get_failure_response(message=str(e))
         except Exception as e:
             from common.app_logger import logger
             logger.error(f"Error fetching todos: {str(e)}")
@@ -104,6 +130,225 @@ class TodoList(Resource):
             return get_failure_response(message="Failed to create todo")
 
 
+todo_batch_model = todo_api.model('TodoBatch', {
+    'operations': fields.List(fields.Raw, required=True, description=(
+        'Operations to apply in one transaction, e.g. {"op": "create", "title": "..."}, '
+        '{"op": "update", "entity_id": "...", "title": "..."}, '
+        '{"op": "toggle", "entity_id": "..."} or {"op": "delete", "entity_id": "..."}'
+    ))
+})
+
+
+@todo_api.route('/batch')
+class TodoBatch(Resource):
+    @token_required
+    @todo_api.doc(security='Bearer')
+    @todo_api.expect(todo_batch_model)
+    def post(self):
+        """
+        Apply many create, update, toggle and delete operations in a single transaction
+        """
+        try:
+            parsed_body = parse_request_body(request, ['operations'])
+            operations = parsed_body['operations']
+
+            if not isinstance(operations, list) or not operations:
+                return get_failure_response(message="'operations' must be a non-empty list.")
+            if len(operations) > MAX_BATCH_OPERATIONS:
+                return get_failure_response(
+                    message=f"A batch can contain at most {MAX_BATCH_OPERATIONS} operations."
+                )
+
+            todo_service = TodoService(config)
+            results = todo_service.apply_batch(g.current_user_id, operations)
+
+            failed = sum(1 for result in results if not result['success'])
+            return get_success_response(results=results, failed=failed)
+        except (ValueError, InputValidationError) as e:
+            return get_failure_response(message=str(e))
+        except Exception as e:
+            from common.app_logger import logger
+            logger.error(f"Error applying todo batch: {str(e)}")
+            return get_failure_response(message="Failed to apply todo batch")
+
+
+@todo_api.route('/changes')
+class TodoChanges(Resource):
+    @token_required
+    @todo_api.doc(security='Bearer')
+    @todo_api.doc(params={
+        'since': 'Watermark returned by the previous sync; omit for an initial sync of all active todos',
+        'cursor': "next_cursor of the previous page when a sync spans several pages",
+        'limit': f'Maximum changes per page (1-{MAX_CHANGES_LIMIT})',
+    })
+    def get(self):
+        """
+        Get the todos created, updated or deleted since a watermark
+
+        Pages are followed with `cursor` until a page returns `watermark`, which is passed as
+        `since` on the next sync. Changes shortly before a watermark are sent again, so apply
+        `todos` and `deleted` idempotently by entity_id; deletions of unknown todos can be ignored.
+        """
+        try:
+            try:
+                limit = int(request.args.get('limit', DEFAULT_CHANGES_LIMIT))
+            except ValueError:
+                return get_failure_response(message="limit must be an integer.")
+            if not 1 <= limit <= MAX_CHANGES_LIMIT:
+                return get_failure_response(message=f"limit must be between 1 and {MAX_CHANGES_LIMIT}.")
+
+            todo_service = TodoService(config)
+            todos, deleted, next_cursor, watermark = todo_service.get_todo_changes(
+                g.current_user_id, limit, since=request.args.get('since'), cursor=request.args.get('cursor')
+            )
+            return get_success_response_from_json(
+                todos=dumps_todo_rows(todos), deleted=dumps(deleted),
+                next_cursor=dumps(next_cursor), watermark=dumps(watermark)
+            )
+        except InputValidationError as e:
+            return get_failure_response(message=str(e))
+        except Exception as e:
+            from common.app_logger import logger
+            logger.error(f"Error fetching todo changes: {str(e)}")
+            return get_failure_response(message="Failed to fetch todo changes")
+
+
+@todo_api.route('/export')
+class TodoExport(Resource):
+    @token_required
+    @todo_api.doc(security='Bearer')
+    @todo_api.doc(params={
+        'format': f"Output format ({', '.join(EXPORT_FORMATS)}), defaults to ndjson",
+        'include_history': 'Also export deleted todos and every audited version (true/false)',
+        'batch_size': f'Rows fetched per database round trip (1-{MAX_EXPORT_BATCH_SIZE})',
+    })
+    def get(self):
+        """
+        Stream all todos of the current user as NDJSON or CSV
+        """
+        export_format = request.args.get('format', 'ndjson').lower()
+        include_history = request.args.get('include_history', 'false').lower() in ('true', '1', 'yes')
+
+        try:
+            batch_size = request.args.get('batch_size', type=int)
+            if batch_size is not None and not 1 <= batch_size <= MAX_EXPORT_BATCH_SIZE:
+                return get_failure_response(message=f"batch_size must be between 1 and {MAX_EXPORT_BATCH_SIZE}.")
+
+            todo_service = TodoService(config)
+            chunks = todo_service.export_todos(
+                g.current_user_id, export_format, include_history=include_history, batch_size=batch_size
+            )
+        except ValueError as e:
+            return get_failure_response(message=str(e))
+
+        filename = f"todos{'-history' if include_history else ''}.{export_format}"
+        return Response(
+            stream_with_context(chunks),
+            mimetype=EXPORT_MIMETYPES[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+        )
+
+
+def _todo_event_stream(subscription, heartbeat_seconds: float):
+    """
+    Render a subscription as server-sent events. Notifications that arrive together are coalesced
+    into one `todos_changed` event, and a comment line is sent whenever the stream is otherwise idle.
+    """
+    yield f"retry: {EVENTS_RETRY_MS}\n: connected\n\n"
+    while not subscription.closed:
+        events = subscription.get(heartbeat_seconds)
+        if not events:
+            yield ": heartbeat\n\n"
+            continue
+
+        if any(event == RESYNC_EVENT for event, _ in events):
+            yield f"event: {RESYNC_EVENT}\ndata: {{}}\n\n"
+            continue
+
+        count = 0
+        for _, payload in events:
+            try:
+                count += int(json.loads(payload).get('count', 1))
+            except (ValueError, TypeError, AttributeError):
+                count += 1
+        yield f"event: todos_changed\ndata: {json.dumps({'count': count})}\n\n"
+
+
+@todo_api.route('/events')
+class TodoEvents(Resource):
+    @token_required
+    @todo_api.doc(security='Bearer')
+    def get(self):
+        """
+        Stream change notifications for the current user's todos as server-sent events
+
+        Each `todos_changed` event carries the number of todos written since the previous event;
+        fetch them with /todo/changes. A `resync` event means notifications were lost and the
+        list should be refetched. Fetch once after connecting, as changes made before the
+        stream opened are not announced.
+        """
+        todo_service = TodoService(config)
+        subscription = todo_service.subscribe_to_todo_events(g.current_user_id)
+
+        response = Response(
+            _todo_event_stream(subscription, config.TODO_EVENTS_HEARTBEAT_SECONDS),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+        response.call_on_close(lambda: todo_service.unsubscribe_from_todo_events(subscription))
+        return response
+
+
+@todo_api.route('/import')
+class TodoImport(Resource):
+    @token_required
+    @todo_api.doc(security='Bearer')
+    @todo_api.doc(params={
+        'file': {'in': 'formData', 'type': 'file', 'description': 'CSV or NDJSON file; the raw request body is used when omitted'},
+        'format': f"Upload format ({', '.join(IMPORT_FORMATS)}); inferred from the file name when omitted",
+    })
+    def post(self):
+        """
+        Bulk-create todos for the current user from a CSV or NDJSON upload
+        """
+        from common.app_logger import logger
+
+        upload = request.files.get('file')
+        if upload is not None:
+            stream = upload.stream
+            import_format = request.args.get('format') or guess_import_format(upload.filename) or 'csv'
+        else:
+            stream = request.stream
+            import_format = request.args.get('format', 'csv')
+
+        def log_progress(counts):
+            logger.info(f"Todo import for {g.current_user_id}: {counts}")
+
+        try:
+            todo_service = TodoService(config)
+            report = todo_service.import_todos(
+                g.current_user_id, stream, import_format.lower(), progress=log_progress
+            )
+            return get_success_response(**report)
+        except ValueError as e:
+            return get_failure_response(message=str(e))
+        except Exception as e:
+            logger.error(f"Error importing todos: {str(e)}")
+            return get_failure_response(message="Failed to import todos")
+
+
+def _todo_write_failure(todo_service, todo_id, action):
+    """
+    Explain why a single-statement write matched no row. Only runs on the failure path.
+    """
+    todo = todo_service.get_todo_by_id(todo_id)
+    if not todo:
+        return get_failure_response(message="Todo not found.")
+    if not todo.person_id:
+        return get_failure_response(message="Todo data is corrupted (missing person_id).")
+    return get_failure_response(message=f"You don't have permission to {action} this todo.")
+
+
 @todo_api.route('/<string:todo_id>')
 class TodoItem(Resource):
     @token_required
@@ -122,16 +367,19 @@ class TodoItem(Resource):
                 return get_failure_response(message="Todo not found.")
             
             # Debug logging
-            logger.info(f"Todo person_id: {todo.person_id}, current_user_id: {g.current_user_id}")
-            logger.info(f"Todo data: {todo.as_dict()}")
+            logger.debug("Todo person_id: %s, current_user_id: %s", todo.person_id, g.current_user_id)
+            logger.debug("Todo data: %s", todo)
                 
             if not todo.person_id:
                 return get_failure_response(message="Todo data is corrupted (missing person_id).")
                 
             if todo.person_id != g.current_user_id:
                 return get_failure_response(message="You don't have permission to access this todo.")
-                
-            return get_success_response(todo=todo.as_dict())
+
+            # Every write gives the todo a new version.
+            if is_not_modified(todo.version):
+                return get_not_modified_response(todo.version)
+            return with_etag(get_success_response(todo=todo.as_dict()), todo.version)
         except Exception as e:
             logger.error(f"Error fetching todo: {str(e)}")
             return get_failure_response(message="Failed to fetch todo")
@@ -144,18 +392,6 @@ class TodoItem(Resource):
         Update a specific todo
         """
         try:
-            todo_service = TodoService(config)
-            todo = todo_service.get_todo_by_id(todo_id)
-            
-            if not todo:
-                return get_failure_response(message="Todo not found.")
-                
-            if not todo.person_id:
-                return get_failure_response(message="Todo data is corrupted (missing person_id).")
-                
-            if todo.person_id != g.current_user_id:
-                return get_failure_response(message="You don't have permission to update this todo.")
-            
             parsed_body = parse_request_body(request, ['title', 'description', 'is_completed', 'due_date'])
             
             # Parse due_date if provided
@@ -166,14 +402,19 @@ class TodoItem(Resource):
                 except (ValueError, TypeError):
                     return get_failure_response(message="Invalid due date format. Use ISO format (YYYY-MM-DDTHH:MM:SS).")
             
+            todo_service = TodoService(config)
             updated_todo = todo_service.update_todo(
                 todo_id=todo_id,
+                person_id=g.current_user_id,
                 title=parsed_body.get('title'),
                 description=parsed_body.get('description'),
                 is_completed=parsed_body.get('is_completed'),
                 due_date=due_date
             )
             
+            if not updated_todo:
+                return _todo_write_failure(todo_service, todo_id, "update")
+            
             return get_success_response(todo=updated_todo.as_dict(), message="Todo updated successfully.")
         except ValueError as e:
             return get_failure_response(message=str(e))
@@ -190,23 +431,12 @@ class TodoItem(Resource):
         """
         try:
             todo_service = TodoService(config)
-            todo = todo_service.get_todo_by_id(todo_id)
+            success = todo_service.delete_todo(todo_id, person_id=g.current_user_id)
             
-            if not todo:
-                return get_failure_response(message="Todo not found.")
-                
-            if not todo.person_id:
-                return get_failure_response(message="Todo data is corrupted (missing person_id).")
-                
-            if todo.person_id != g.current_user_id:
-                return get_failure_response(message="You don't have permission to delete this todo.")
-            
-            success = todo_service.delete_todo(todo_id)
+            if not success:
+                return _todo_write_failure(todo_service, todo_id, "delete")
             
-            if success:
-                return get_success_response(message="Todo deleted successfully.")
-            else:
-                return get_failure_response(message="Failed to delete todo.")
+            return get_success_response(message="Todo deleted successfully.")
         except ValueError as e:
             return get_failure_response(message=str(e))
         except Exception as e:
@@ -225,18 +455,10 @@ class TodoToggle(Resource):
         """
         try:
             todo_service = TodoService(config)
-            todo = todo_service.get_todo_by_id(todo_id)
-            
-            if not todo:
-                return get_failure_response(message="Todo not found.")
-                
-            if not todo.person_id:
-                return get_failure_response(message="Todo data is corrupted (missing person_id).")
-                
-            if todo.person_id != g.current_user_id:
-                return get_failure_response(message="You don't have permission to update this todo.")
+            updated_todo = todo_service.toggle_todo_completion(todo_id, person_id=g.current_user_id)
             
-            updated_todo = todo_service.toggle_todo_completion(todo_id)
+            if not updated_todo:
+                return _todo_write_failure(todo_service, todo_id, "update")
             
             return get_success_response(
                 todo=updated_todo.as_dict(), 
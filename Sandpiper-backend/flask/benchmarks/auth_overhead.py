@@ -0,0 +1,97 @@
+"""
+Micro-benchmark of the per-request cost of the authentication decorators.
+
+Compares the previous path (jwt.decode with HMAC verification, Person and Email models built
+from the claims and inspect.signature on every call) with the current decorators, with the
+verified-token cache disabled and enabled. Needs no database: the revocation list is empty and
+never polls (see benchmarks.revocation_overhead for its cost). Run from the flask directory:
+
+    python -m benchmarks.auth_overhead [requests]
+"""
+import os
+import sys
+import time
+from inspect import signature
+
+import jwt
+from flask import Flask, g
+
+import common.helpers.token_revocation as token_revocation
+from app.helpers.decorators import login_required, token_required
+from benchmarks.revocation_overhead import preloaded_revocation_list
+from common.app_config import config
+from common.helpers.auth import create_email_from_token, create_person_from_token, generate_access_token
+from common.models import Email, LoginMethod, Person
+
+
+class View:
+    @login_required()
+    def login_view(self, person, email):
+        return person
+
+    @token_required
+    def token_view(self):
+        return g.current_user_id
+
+
+def previous_login_required(view, token):
+    """The work login_required used to do for every request."""
+    def func(self, person, email):
+        return person
+
+    decoded = jwt.decode(token, config.AUTH_JWT_SECRET, algorithms=['HS256'])
+    person = create_person_from_token(decoded)
+    email = create_email_from_token(decoded)
+    g.person, g.email, g.current_user_id = person, email, person.entity_id
+    func_params = signature(func).parameters
+    extra_args = {name: value for name, value in (('person', person), ('email', email)) if name in func_params}
+    return func(view, **extra_args)
+
+
+def previous_token_required(view, token):
+    """The work token_required used to do for every request."""
+    decoded = jwt.decode(token, config.AUTH_JWT_SECRET, algorithms=['HS256'])
+    g.current_user_id = decoded.get('person_entity_id') or decoded.get('person_id')
+    return g.current_user_id
+
+
+def measure(function, requests):
+    function()  # warm up, fills the cache when enabled
+    started = time.perf_counter()
+    for _ in range(requests):
+        function()
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    person = Person(first_name='Bench', last_name='Mark')
+    email = Email(person_id=person.entity_id, email='bench@example.com', is_verified=True)
+    login_method = LoginMethod(person_id=person.entity_id, email_id=email.entity_id, method_type='email-password')
+    token, _ = generate_access_token(login_method, person=person, email=email)
+
+    token_revocation._revocation_list, token_revocation._revocation_list_pid = preloaded_revocation_list([]), os.getpid()
+
+    app = Flask(__name__)
+    view = View()
+    cache_entries = config.ACCESS_TOKEN_CACHE_MAX_ENTRIES
+    cases = [
+        ("login_required (previous)", lambda: previous_login_required(view, token), cache_entries),
+        ("login_required, no cache", view.login_view, 0),
+        ("login_required, cached", view.login_view, cache_entries or 10000),
+        ("token_required (previous)", lambda: previous_token_required(view, token), cache_entries),
+        ("token_required, no cache", view.token_view, 0),
+        ("token_required, cached", view.token_view, cache_entries or 10000),
+    ]
+
+    print(f"{requests} requests per case")
+    print(f"{'path':<30}{'us/request':>12}")
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+        for name, function, max_entries in cases:
+            config.ACCESS_TOKEN_CACHE_MAX_ENTRIES = max_entries
+            print(f"{name:<30}{measure(function, requests):>12.1f}")
+    config.ACCESS_TOKEN_CACHE_MAX_ENTRIES = cache_entries
+
+
+if __name__ == "__main__":
+    main()
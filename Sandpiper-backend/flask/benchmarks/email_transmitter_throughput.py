@@ -0,0 +1,180 @@
+"""
+Throughput benchmark of the email transmitter consumer against an in-memory broker stand-in
+and a local fake Mailjet send API.
+
+Queues `emails` welcome emails, then consumes them with EmailTransmitter once per (workers,
+batch size) case, timed until the last one was acknowledged; workers 1 and batch size 1 is one
+Mailjet call per email, one at a time. The fake broker honours the prefetch limit and delivers from
+the consumer's own thread, as pika's BlockingConnection does; the fake Mailjet answers every
+message with success after `latency_ms` milliseconds. Run from the flask directory:
+
+    python -m benchmarks.email_transmitter_throughput [emails] [latency_ms]
+"""
+import heapq
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from benchmarks.mailjet_throughput import FakeMailjetServer
+from common.app_config import config
+
+
+class FakeChannel:
+    def __init__(self, broker: "FakeBroker"):
+        self.broker = broker
+        self.prefetch = 0
+        self.consumer = None
+        self.unacked = {}
+        self.delivery_tags = itertools.count(1)
+
+    def confirm_delivery(self):
+        pass
+
+    def queue_declare(self, queue, durable=False):
+        pass
+
+    def basic_qos(self, prefetch_count=0):
+        self.prefetch = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback):
+        self.consumer = on_message_callback
+        return "consumer-1"
+
+    def basic_cancel(self, consumer_tag):
+        self.consumer = None
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.broker.messages.append((body, properties))
+
+    def basic_ack(self, delivery_tag):
+        del self.unacked[delivery_tag]
+        self.broker.acked += 1
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        body, properties = self.unacked.pop(delivery_tag)
+        if requeue:
+            self.broker.messages.appendleft((body, properties))
+        else:
+            self.broker.rejected += 1
+
+    def deliver(self) -> int:
+        delivered = 0
+        while self.consumer and self.broker.messages and (not self.prefetch or len(self.unacked) < self.prefetch):
+            body, properties = self.broker.messages.popleft()
+            tag = next(self.delivery_tags)
+            self.unacked[tag] = (body, properties)
+            self.consumer(self, SimpleNamespace(delivery_tag=tag), properties, body)
+            delivered += 1
+        return delivered
+
+
+class FakeConnection:
+    """The part of pika.BlockingConnection the transmitter uses, backed by a FakeBroker."""
+
+    def __init__(self, broker: "FakeBroker"):
+        self.is_open = True
+        self._channel = FakeChannel(broker)
+        self._callbacks = queue.Queue()
+        self._timers = []
+        self._timer_ids = itertools.count()
+
+    def channel(self):
+        return self._channel
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.put(callback)
+
+    def call_later(self, delay, callback):
+        heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_ids), callback))
+
+    def process_data_events(self, time_limit=0):
+        # As pika's, returns once it dispatched something, or after `time_limit` seconds
+        deadline = time.monotonic() + time_limit
+        while True:
+            received = self._channel.deliver()
+            if self._timers and self._timers[0][0] <= time.monotonic():
+                heapq.heappop(self._timers)[2]()
+                return
+            try:
+                self._callbacks.get_nowait()()
+                return
+            except queue.Empty:
+                if received:
+                    return
+            wait = deadline - time.monotonic()
+            if self._timers:
+                wait = min(wait, self._timers[0][0] - time.monotonic())
+            if wait <= 0:
+                return
+            try:
+                self._callbacks.get(timeout=wait)()
+                return
+            except queue.Empty:
+                pass
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeBroker:
+    """One in-memory queue; acknowledged and rejected messages are counted."""
+
+    def __init__(self):
+        self.messages = deque()
+        self.acked = self.rejected = 0
+
+    def connect(self) -> FakeConnection:
+        return FakeConnection(self)
+
+
+def main():
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+
+    server = FakeMailjetServer(latency_ms / 1000)
+    config.MAILJET_API_URL = server.url
+    config.EMAIL_TRANSMITTER_BATCH_WAIT_SECONDS = 0.05
+    from common.tasks.email_transmitter import EmailTransmitter
+
+    print(f"{emails} emails, {latency_ms:g} ms per Mailjet call")
+    print(f"{'workers':>8}{'batch size':>12}{'emails/s':>10}{'Mailjet calls':>15}")
+    for workers, batch_size in ((1, 1), (4, 1), (1, 50), (4, 50)):
+        config.EMAIL_TRANSMITTER_WORKERS = workers
+        config.EMAIL_TRANSMITTER_BATCH_SIZE = batch_size
+        config.EMAIL_TRANSMITTER_PREFETCH = workers * batch_size * 2
+
+        broker = FakeBroker()
+        for i in range(emails):
+            broker.messages.append((json.dumps({
+                "event": "WELCOME_EMAIL",
+                "to_emails": [f"user{i}@example.com"],
+                "data": {"confirmation_link": f"https://example.com/confirm/{i}", "recipient_name": f"User {i}"},
+            }).encode(), None))
+        transmitter = EmailTransmitter(config, connection_factory=broker.connect)
+
+        finished = []
+
+        def stop_when_done():
+            while broker.acked + broker.rejected < emails:
+                time.sleep(0.001)
+            finished.append(time.perf_counter())
+            transmitter.stop()
+
+        server.reset()
+        started = time.perf_counter()
+        threading.Thread(target=stop_when_done, daemon=True).start()
+        transmitter.run()
+        elapsed = finished[0] - started
+        assert broker.acked == emails, (broker.acked, broker.rejected)
+        print(f"{workers:>8}{batch_size:>12}{emails / elapsed:>10.0f}{server.calls:>15}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput benchmark of MailjetService against a local fake Mailjet send API.
+
+Sends `emails` welcome emails three ways: one requests.post per email without a session (how
+MailjetService sent them before), one call per email over the shared keep-alive session, and
+send_batch, which packs MAILJET_BATCH_SIZE messages per call. The fake server answers every
+message with success after `latency_ms` milliseconds, standing in for the network round trip
+and Mailjet's own processing, and counts the connections it accepted. It speaks plain HTTP,
+so the TLS handshakes a new connection to Mailjet costs are not included. Run from the flask
+directory:
+
+    python -m benchmarks.mailjet_throughput [emails] [latency_ms]
+"""
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from common.app_config import config
+
+
+class FakeMailjetHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as Mailjet
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this, delayed ACKs stall every keep-alive call
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.calls += 1
+            self.server.messages += len(payload["Messages"])
+        body = json.dumps({"Messages": [
+            {"Status": "success", "To": [{"Email": recipient["Email"]} for recipient in message["To"]]}
+            for message in payload["Messages"]
+        ]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMailjetServer(ThreadingHTTPServer):
+    """Mailjet v3.1 send API stand-in on localhost that accepts every message."""
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), FakeMailjetHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v3.1"
+
+    def reset(self):
+        self.connections = self.calls = self.messages = 0
+
+
+def main():
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+
+    server = FakeMailjetServer(latency_ms / 1000)
+    config.MAILJET_API_URL = server.url
+    from common.services.mailjet_service import MailjetService
+    mailjet_service = MailjetService()
+
+    messages = [
+        mailjet_service.welcome_message(f"user{i}@example.com", f"https://example.com/confirm/{i}", f"User {i}")
+        for i in range(emails)
+    ]
+
+    def without_session():
+        for message in messages:
+            requests.post(f"{server.url}/send", auth=(config.MAILJET_API_KEY, config.MAILJET_API_SECRET),
+                          json={"Messages": [message]})
+
+    def one_per_call():
+        for message in messages:
+            assert mailjet_service.send_batch([message]) == [True]
+
+    def batched():
+        assert all(mailjet_service.send_batch(messages))
+
+    print(f"{emails} emails, {latency_ms:g} ms per API call, {mailjet_service.batch_size} messages per batch")
+    print(f"{'case':<32}{'emails/s':>10}{'calls':>8}{'new connections':>17}")
+    for name, function in (
+        ("requests.post per email", without_session),
+        ("shared session, one per call", one_per_call),
+        ("send_batch", batched),
+    ):
+        server.reset()
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<32}{emails / elapsed:>10.0f}{server.calls:>8}{server.connections:>17}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark of the access token revocation check done by login_required and token_required.
+
+Measures TokenRevocationList.is_revoked for tokens that are not revoked (the common case,
+answered by the Bloom filter alone), for revoked tokens (answered by the exact set), and the
+decorators with and without the check, with a filter holding `revoked` revocations. The
+verified-token cache is enabled, as in production. Needs no database: the list is filled in
+memory and never polls. Run from the flask directory:
+
+    python -m benchmarks.revocation_overhead [requests] [revoked]
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Flask, g
+
+import common.helpers.token_revocation as token_revocation
+from app.helpers.decorators import login_required, token_required
+from common.app_config import config
+from common.helpers.auth import generate_access_token
+from common.helpers.token_revocation import BloomFilter, TokenRevocationList
+from common.models import Email, LoginMethod, Person
+
+
+class View:
+    @login_required()
+    def login_view(self, person, email):
+        return person
+
+    @token_required
+    def token_view(self):
+        return g.current_user_id
+
+
+def preloaded_revocation_list(jtis):
+    """A revocation list holding `jtis`, loaded the way a full load does, that never polls the database."""
+    revocation_list = TokenRevocationList(
+        capacity=max(config.REVOKED_TOKEN_FILTER_CAPACITY, 2 * len(jtis)),
+        error_rate=config.REVOKED_TOKEN_FILTER_ERROR_RATE,
+        refresh_interval=float('inf'),
+    )
+    bloom = BloomFilter(revocation_list.capacity, revocation_list.error_rate)
+    for jti in jtis:
+        bloom.add(jti)
+    revocation_list._bloom = bloom
+    revocation_list._next_refresh = float('inf')
+    return revocation_list
+
+
+def measure(function, requests):
+    function()  # warm up
+    started = time.perf_counter()
+    for _ in range(requests):
+        function()
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    revoked = int(sys.argv[2]) if len(sys.argv) > 2 else config.REVOKED_TOKEN_FILTER_CAPACITY // 2
+
+    revoked_jtis = [uuid.uuid4().hex for _ in range(revoked)]
+    revocation_list = preloaded_revocation_list(revoked_jtis)
+    revoked_jti = revoked_jtis[0]
+    revocation_list.add(revoked_jti, datetime.utcnow() + timedelta(hours=1))
+
+    # Valid tokens that hit the filter by chance are confirmed against the database once; count them instead
+    valid_jtis = [uuid.uuid4().hex for _ in range(requests)]
+    false_positives = sum(jti in revocation_list._bloom for jti in valid_jtis)
+
+    person = Person(first_name='Bench', last_name='Mark')
+    email = Email(person_id=person.entity_id, email='bench@example.com', is_verified=True)
+    login_method = LoginMethod(person_id=person.entity_id, email_id=email.entity_id, method_type='email-password')
+    token, _ = generate_access_token(login_method, person=person, email=email)
+    config.ACCESS_TOKEN_CACHE_MAX_ENTRIES = config.ACCESS_TOKEN_CACHE_MAX_ENTRIES or 10000
+
+    no_revocations = preloaded_revocation_list([])
+    no_revocations.is_revoked = lambda jti: False
+    app = Flask(__name__)
+    view = View()
+
+    stats = revocation_list.stats()
+    print(f"{requests} requests per case, {revoked} revoked tokens in a {stats['filter_bytes'] // 1024} KiB filter, "
+          f"{false_positives} of {requests} valid tokens would be confirmed against the database")
+    print(f"{'path':<40}{'us/request':>12}")
+    cases = [
+        ("is_revoked, valid token", lambda: revocation_list.is_revoked(valid_jtis[1])),
+        ("is_revoked, revoked token", lambda: revocation_list.is_revoked(revoked_jti)),
+    ]
+    for name, function in cases:
+        print(f"{name:<40}{measure(function, requests):>12.2f}")
+
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+        for label, installed in (("without check", no_revocations), ("with check", revocation_list)):
+            token_revocation._revocation_list, token_revocation._revocation_list_pid = installed, os.getpid()
+            print(f"{'login_required, ' + label:<40}{measure(view.login_view, requests):>12.2f}")
+            print(f"{'token_required, ' + label:<40}{measure(view.token_view, requests):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of turning todo cursor rows into a JSON list response body.
+
+Compares the previous path (a rococo Todo model per row, Todo.as_dict, then the Flask JSON
+provider) with TodoRow + Todo.as_dict-equivalent dicts and with the precompiled row serializer,
+with and without orjson. Needs no database. Run from the flask directory:
+
+    python -m benchmarks.todo_serialization [rows]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from common.helpers import json_serializer
+from common.models import Todo, TodoRow
+
+
+def make_rows(count):
+    now = datetime.utcnow()
+    return [
+        (
+            f"{i:032x}", f"{i + 1:032x}", f"{i + 2:032x}", True, "f" * 32, now - timedelta(seconds=i),
+            "e" * 32, f"Todo number {i}", None if i % 3 else f"Description of todo {i}",
+            bool(i % 2), None if i % 4 else now + timedelta(days=i)
+        )
+        for i in range(count)
+    ]
+
+
+def model_as_dict(app, rows):
+    todos = [Todo(**dict(zip(TodoRow._fields, row))) for row in rows]
+    return app.json.dumps({'success': True, 'todos': [todo.as_dict() for todo in todos]}).encode()
+
+
+def todo_row_as_dict(app, rows):
+    todos = list(map(TodoRow._make, rows))
+    return app.json.dumps({'success': True, 'todos': [todo.as_dict() for todo in todos]}).encode()
+
+
+def row_serializer(app, rows):
+    return b'{"success":true,"todos":' + json_serializer.dumps_todo_rows(list(map(TodoRow._make, rows))) + b'}'
+
+
+def measure(function, app, rows, repeat):
+    function(app, rows)  # warm up
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(app, rows)
+    per_row_us = (time.perf_counter() - started) / repeat / len(rows) * 1e6
+
+    tracemalloc.start()
+    function(app, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return per_row_us, peak / len(rows)
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = max(1, 20000 // row_count)
+    rows = make_rows(row_count)
+    app = Flask(__name__)
+
+    orjson = json_serializer.orjson
+    cases = [
+        ("rococo Todo + as_dict", model_as_dict, orjson),
+        ("TodoRow + as_dict", todo_row_as_dict, orjson),
+        ("row serializer (stdlib)", row_serializer, None),
+    ]
+    if orjson is not None:
+        cases.append(("row serializer (orjson)", row_serializer, orjson))
+
+    print(f"{row_count} rows, {repeat} repetitions")
+    print(f"{'path':<28}{'us/row':>10}{'peak allocated B/row':>22}")
+    with app.app_context():
+        for name, function, encoder in cases:
+            json_serializer.orjson = encoder
+            per_row_us, peak_per_row = measure(function, app, rows, repeat)
+            print(f"{name:<28}{per_row_us:>10.2f}{peak_per_row:>22.0f}")
+    json_serializer.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ echo Done db stuff
 python3 version.py
 if [ "$APP_ENV" == "production" ] || [ "$APP_ENV" == "test" ]
 then
-    waitress-serve --port=5000 --call 'main:create_app'
+    # Every open /todo/events stream holds one of these threads; keep TODO_EVENTS_MAX_CLIENTS below it.
+    waitress-serve --port=5000 --threads="${WAITRESS_THREADS:-32}" --call 'main:create_app'
 else
     python3 main.py
 fi
\ No newline at end of file
@@ -0,0 +1,29 @@
+import argparse
+import signal
+import sys
+
+
+def main():
+    from common.app_config import config
+    from common.tasks.email_outbox_relay import EmailOutboxRelay
+
+    parser = argparse.ArgumentParser(description="Send the emails queued in the email outbox.")
+    parser.add_argument('--once', action='store_true', help="send the emails that are due now, then exit")
+    args = parser.parse_args()
+
+    relay = EmailOutboxRelay(config)
+
+    if args.once:
+        while relay.relay_batch() == relay.batch_size:
+            pass
+        print(f"{relay.sent} sent, {relay.retried} retried, {relay.failed} failed", file=sys.stderr)
+        return 0
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: relay.stop())
+    relay.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import signal
+import sys
+
+
+def main():
+    from common.app_config import config
+    from common.tasks.email_transmitter import EmailTransmitter
+
+    transmitter = EmailTransmitter(config)
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: transmitter.stop())
+    transmitter.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
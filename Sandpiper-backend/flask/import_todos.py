@@ -0,0 +1,54 @@
+import argparse
+import json
+import sys
+import time
+
+
+def main():
+    from common.app_config import config
+    from common.services import PersonService, TodoService
+    from common.services.todo import IMPORT_FORMATS, guess_import_format
+
+    parser = argparse.ArgumentParser(description="Bulk import todos for a person from a CSV or NDJSON file.")
+    parser.add_argument('person_id', help="entity_id of the person who will own the todos")
+    parser.add_argument('path', help="file to import, or - for standard input")
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help="defaults to the file extension, then csv")
+    parser.add_argument('--errors', help="write the per-row error report to this file as NDJSON")
+    args = parser.parse_args()
+
+    if not PersonService(config).get_person_by_id(args.person_id):
+        parser.error(f"No person with id {args.person_id}.")
+
+    import_format = args.format or guess_import_format(args.path) or 'csv'
+    started = time.perf_counter()
+
+    def print_progress(counts):
+        elapsed = time.perf_counter() - started
+        print(f"{counts['rows_read']} rows read, {counts['imported']} imported, {counts['failed']} failed "
+              f"({counts['rows_read'] / elapsed:.0f} rows/s)", file=sys.stderr)
+
+    todo_service = TodoService(config)
+    if args.path == '-':
+        report = todo_service.import_todos(args.person_id, sys.stdin.buffer, import_format, progress=print_progress)
+    else:
+        with open(args.path, 'rb') as stream:
+            report = todo_service.import_todos(args.person_id, stream, import_format, progress=print_progress)
+
+    elapsed = time.perf_counter() - started
+    print(f"Imported {report['imported']} todos, {report['failed']} rows failed, in {elapsed:.2f}s.", file=sys.stderr)
+
+    if args.errors:
+        with open(args.errors, 'w') as errors_file:
+            for error in report['errors']:
+                errors_file.write(json.dumps(error) + '\n')
+    else:
+        for error in report['errors']:
+            print(f"row {error['row']}: {error['message']}", file=sys.stderr)
+    if report['errors_truncated']:
+        print(f"Only the first {len(report['errors'])} errors are reported.", file=sys.stderr)
+
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())